@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the subset of the Ragie API used by scripts/ragie_sync.py.
+
+Keeps documents, partitions and instructions in memory, paginates listings with
+opaque cursors, advances document status towards `ready` as it is polled, and can
+inject latency plus 429/5xx responses for load and retry testing.
+
+Usage examples:
+  python3 scripts/ragie_fake_server.py --port 8765
+  python3 scripts/ragie_fake_server.py --port 8765 --latency-ms 40 --error-rate 0.05
+  RAGIE_API_KEY=dev python3 scripts/ragie_sync.py --partition shared_docs --base-url http://127.0.0.1:8765
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+STATUS_PROGRESSION = [
+    "pending",
+    "partitioning",
+    "partitioned",
+    "refined",
+    "chunked",
+    "indexed",
+    "summary_indexed",
+    "keyword_indexed",
+    "ready",
+]
+
+
+@dataclass
+class FakeRagieConfig:
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 0.0
+    polls_to_ready: int = 2
+    fail_refs: tuple[str, ...] = ()
+    delete_lag_seconds: float = 0.0
+    seed: int | None = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+class FakeRagieState:
+    """In-memory documents, partitions and instructions guarded by one lock."""
+
+    def __init__(self, config: FakeRagieConfig) -> None:
+        self.config = config
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+        self.documents: dict[str, dict[str, Any]] = {}
+        self.partitions: dict[str, dict[str, Any]] = {}
+        self.instructions: dict[str, dict[str, Any]] = {}
+        self.request_log: list[tuple[str, str]] = []
+
+    def new_document(self, *, partition: str, body: dict[str, Any]) -> dict[str, Any]:
+        doc_id = str(uuid.uuid4())
+        now = _now()
+        doc = {
+            "id": doc_id,
+            "name": body.get("name") or doc_id,
+            "external_id": body.get("external_id"),
+            "partition": partition,
+            "metadata": dict(body.get("metadata") or {}),
+            "status": "pending",
+            "created_at": now,
+            "updated_at": now,
+            "data": body.get("data", ""),
+            "_polls": 0,
+        }
+        self.documents[doc_id] = doc
+        return doc
+
+    def reindex(self, doc: dict[str, Any]) -> None:
+        doc["status"] = "pending"
+        doc["_polls"] = 0
+        doc["updated_at"] = _now()
+
+    def purge(self) -> None:
+        """Drop documents whose asynchronous deletion has finished."""
+        now = time.monotonic()
+        for doc_id in [doc_id for doc_id, doc in self.documents.items() if doc.get("_purge_at", now + 1) <= now]:
+            del self.documents[doc_id]
+
+    def advance(self, doc: dict[str, Any]) -> None:
+        if doc["status"] in {"ready", "failed"}:
+            return
+        doc["_polls"] += 1
+        ref = str((doc.get("metadata") or {}).get("docs_ref") or "")
+        if ref and ref in self.config.fail_refs:
+            doc["status"] = "failed"
+            doc["errors"] = [f"injected failure for {ref}"]
+            return
+        steps = max(1, self.config.polls_to_ready)
+        index = min(len(STATUS_PROGRESSION) - 1, doc["_polls"] * (len(STATUS_PROGRESSION) - 1) // steps)
+        doc["status"] = STATUS_PROGRESSION[index]
+
+
+def public_document(doc: dict[str, Any]) -> dict[str, Any]:
+    return {key: value for key, value in doc.items() if not key.startswith("_") and key != "data"}
+
+
+def paginate(items: list[dict[str, Any]], query: dict[str, list[str]], key: str) -> dict[str, Any]:
+    page_size = max(1, min(100, int((query.get("page_size") or ["100"])[0])))
+    start = int((query.get("cursor") or ["0"])[0] or 0)
+    page = items[start : start + page_size]
+    next_cursor = str(start + page_size) if start + page_size < len(items) else None
+    return {key: page, "pagination": {"next_cursor": next_cursor, "total_count": len(items)}}
+
+
+class FakeRagieHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without TCP_NODELAY, Nagle plus the
+    # client's delayed ACK stalls every keep-alive response by ~40ms.
+    disable_nagle_algorithm = True
+    server: FakeRagieServer
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _send(self, status: int, body: Any, headers: dict[str, str] | None = None) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def _dispatch(self) -> None:
+        state = self.server.state
+        config = state.config
+        body = self._body()
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if config.latency_ms or config.latency_jitter_ms:
+            time.sleep(max(0.0, config.latency_ms + state.random.uniform(0, config.latency_jitter_ms)) / 1000)
+
+        with state.lock:
+            state.request_log.append((self.command, url.path))
+            roll = state.random.random()
+        if not (self.headers.get("Authorization") or "").startswith("Bearer "):
+            self._send(401, {"detail": "Missing bearer token"})
+            return
+        if roll < config.throttle_rate:
+            headers = {"Retry-After": str(config.retry_after)} if config.retry_after else {}
+            self._send(429, {"detail": "Rate limit exceeded"}, headers)
+            return
+        if roll < config.throttle_rate + config.error_rate:
+            self._send(503, {"detail": "Injected server error"})
+            return
+
+        for method, pattern, handler in ROUTES:
+            if method != self.command:
+                continue
+            match = re.fullmatch(pattern, url.path)
+            if match:
+                with state.lock:
+                    state.purge()
+                    status, response = handler(self, state, body, query, *match.groups())
+                self._send(status, response)
+                return
+        self._send(404, {"detail": f"No route for {self.command} {url.path}"})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+    @property
+    def partition(self) -> str:
+        return self.headers.get("partition") or "default"
+
+
+def _list_documents(handler, state, body, query):
+    docs = [public_document(doc) for doc in state.documents.values() if doc["partition"] == handler.partition]
+    return 200, paginate(docs, query, "documents")
+
+
+def _create_document_raw(handler, state, body, query):
+    doc = state.new_document(partition=str(body.get("partition") or handler.partition), body=body)
+    return 201, public_document(doc)
+
+
+def _get_document(handler, state, body, query, doc_id):
+    doc = state.documents.get(doc_id)
+    if doc is None or doc["partition"] != handler.partition:
+        return 404, {"detail": "Document not found"}
+    state.advance(doc)
+    return 200, public_document(doc)
+
+
+def _update_document_raw(handler, state, body, query, doc_id):
+    doc = state.documents.get(doc_id)
+    if doc is None or doc["partition"] != handler.partition:
+        return 404, {"detail": "Document not found"}
+    # Like Ragie, a raw update takes only `data`; metadata changes go through PATCH /metadata.
+    doc["data"] = body.get("data", "")
+    state.reindex(doc)
+    return 200, {"document_id": doc_id, "status": doc["status"]}
+
+
+def _patch_metadata(handler, state, body, query, doc_id):
+    doc = state.documents.get(doc_id)
+    if doc is None or doc["partition"] != handler.partition:
+        return 404, {"detail": "Document not found"}
+    for key, value in (body.get("metadata") or {}).items():
+        if value is None:
+            doc["metadata"].pop(key, None)
+        else:
+            doc["metadata"][key] = value
+    doc["updated_at"] = _now()
+    return 200, doc["metadata"]
+
+
+def _delete_document(handler, state, body, query, doc_id):
+    doc = state.documents.get(doc_id)
+    if doc is None or doc["partition"] != handler.partition:
+        return 404, {"detail": "Document not found"}
+    if (query.get("async") or [""])[0] == "true" and state.config.delete_lag_seconds > 0:
+        # Like Ragie, an async delete leaves the document listed (as "deleting") for a while.
+        doc["status"] = "deleting"
+        doc.setdefault("_purge_at", time.monotonic() + state.config.delete_lag_seconds)
+    else:
+        del state.documents[doc_id]
+    return 200, {"status": "deleting"}
+
+
+def _list_entities(handler, state, body, query, doc_id):
+    doc = state.documents.get(doc_id)
+    if doc is None or doc["partition"] != handler.partition:
+        return 404, {"detail": "Document not found"}
+    return 200, paginate([], query, "entities")
+
+
+def _list_partitions(handler, state, body, query):
+    return 200, paginate(list(state.partitions.values()), query, "partitions")
+
+
+def _create_partition(handler, state, body, query):
+    name = str(body.get("name") or "")
+    if name in state.partitions:
+        return 409, {"detail": "Partition already exists"}
+    state.partitions[name] = {
+        "name": name,
+        "description": body.get("description"),
+        "metadata_schema": body.get("metadata_schema"),
+        "context_aware": False,
+        "is_default": False,
+    }
+    return 201, state.partitions[name]
+
+
+def _get_partition(handler, state, body, query, name):
+    partition = state.partitions.get(name)
+    if partition is None:
+        return 404, {"detail": "Partition not found"}
+    return 200, partition
+
+
+def _patch_partition(handler, state, body, query, name):
+    partition = state.partitions.get(name)
+    if partition is None:
+        return 404, {"detail": "Partition not found"}
+    editable = {"context_aware", "description", "metadata_schema"}
+    partition.update({key: value for key, value in body.items() if key in editable})
+    return 200, partition
+
+
+def _list_instructions(handler, state, body, query):
+    return 200, list(state.instructions.values())
+
+
+def _create_instruction(handler, state, body, query):
+    instruction = dict(body, id=str(uuid.uuid4()))
+    state.instructions[instruction["id"]] = instruction
+    return 201, instruction
+
+
+def _update_instruction(handler, state, body, query, instruction_id):
+    instruction = state.instructions.get(instruction_id)
+    if instruction is None:
+        return 404, {"detail": "Instruction not found"}
+    instruction["active"] = bool(body.get("active"))
+    return 200, instruction
+
+
+ROUTES = [
+    ("GET", r"/documents", _list_documents),
+    ("POST", r"/documents/raw", _create_document_raw),
+    ("GET", r"/documents/([^/]+)", _get_document),
+    ("PUT", r"/documents/([^/]+)/raw", _update_document_raw),
+    ("PATCH", r"/documents/([^/]+)/metadata", _patch_metadata),
+    ("DELETE", r"/documents/([^/]+)", _delete_document),
+    ("GET", r"/documents/([^/]+)/entities", _list_entities),
+    ("GET", r"/partitions", _list_partitions),
+    ("POST", r"/partitions", _create_partition),
+    ("GET", r"/partitions/([^/]+)", _get_partition),
+    ("PATCH", r"/partitions/([^/]+)", _patch_partition),
+    ("GET", r"/instructions", _list_instructions),
+    ("POST", r"/instructions", _create_instruction),
+    ("PUT", r"/instructions/([^/]+)", _update_instruction),
+]
+
+
+class FakeRagieServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], config: FakeRagieConfig | None = None) -> None:
+        super().__init__(address, FakeRagieHandler)
+        self.state = FakeRagieState(config or FakeRagieConfig())
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start_background(self) -> FakeRagieServer:
+        threading.Thread(target=self.serve_forever, name="fake-ragie", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Ragie API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind (0 = pick a free port)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fixed latency added to every response")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0, help="Uniform random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--polls-to-ready", type=int, default=2, help="Status polls before a document is ready")
+    parser.add_argument("--fail-ref", action="append", default=[], help="docs_ref whose ingestion should fail")
+    parser.add_argument(
+        "--delete-lag-seconds", type=float, default=0.0, help="How long async-deleted docs stay listed as deleting"
+    )
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for latency/error injection")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    config = FakeRagieConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        polls_to_ready=args.polls_to_ready,
+        fail_refs=tuple(args.fail_ref),
+        delete_lag_seconds=args.delete_lag_seconds,
+        seed=args.seed,
+    )
+    server = FakeRagieServer((args.host, args.port), config)
+    print(f"[INFO] Fake Ragie API listening on {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
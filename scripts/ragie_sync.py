@@ -11,28 +11,54 @@ Behavior:
 
 Usage examples:
   python3 scripts/ragie_sync.py --partition shared_docs
+  python3 scripts/ragie_sync.py --all-partitions
+  python3 scripts/ragie_sync.py --partitions shared_docs,tenant_acme
   python3 scripts/ragie_sync.py --partition tenant_acme --doc-ref onboarding/getting-started/intro-to-sm --dry-run
+  python3 scripts/ragie_sync.py --partition shared_docs --base-url http://127.0.0.1:8765  # scripts/ragie_fake_server.py
+  python3 scripts/ragie_sync.py --partition tenant_acme --watch
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
+import bisect
+import contextvars
+import copy
+import functools
 import hashlib
+import http.client
 import json
+import math
+import multiprocessing
 import os
+import random
 import re
+import ssl
+import subprocess
+import threading
 import time
-from dataclasses import dataclass
-from pathlib import Path
+from collections.abc import AsyncIterator, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path, PurePosixPath
 from typing import Any
-from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode
-from urllib.request import Request, urlopen
+from urllib.parse import urlencode, urlsplit
 
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
 DOCS_JSON = REPO_ROOT / "docs.json"
 ENV_FILE = REPO_ROOT / ".env"
+DEFAULT_STATE_DIR = REPO_ROOT / ".ragie-sync" / "state"
+DEFAULT_CACHE_DIR = REPO_ROOT / ".ragie-sync" / "cache"
+# Repo path of this script; a change to it can change every doc's normalization or metadata.
+SYNC_SCRIPT_PATH = Path(__file__).resolve().relative_to(REPO_ROOT).as_posix()
+# Digest of this script's source. Cached normalizations made by any other revision of it are discarded.
+SYNC_SCRIPT_DIGEST = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
+TAXONOMY_VERSION = "v1"
 
 MANAGED_METADATA_KEYS = {
     "source",
@@ -55,9 +81,29 @@ MANAGED_METADATA_KEYS = {
     "topic_tags",
     "frontmatter_tags",
     "taxonomy_source",
+    "metadata_fingerprint",
 }
+# Managed keys that change on every push without the doc changing; they ride along when a doc
+# is written for another reason but never trigger a metadata patch by themselves.
+DEFAULT_VOLATILE_METADATA_KEYS = frozenset({"commit_sha"})
 
 TERMINAL_FAILURE_STATUSES = {"failed"}
+# Ragie's ingestion pipeline in order; used to poll documents more often as they near `ready`.
+INGESTION_STAGES = (
+    "pending",
+    "partitioning",
+    "partitioned",
+    "refined",
+    "chunked",
+    "indexed",
+    "summary_indexed",
+    "keyword_indexed",
+    "ready",
+)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Longest Retry-After hint honoured; a longer one is capped so a single 429 cannot stall a run for hours.
+MAX_RETRY_AFTER_SECONDS = 60.0
 
 SURFACE_ENUM = [
     "query_snippets",
@@ -234,19 +280,106 @@ class SyncError(RuntimeError):
     """Raised for sync/runtime failures."""
 
 
-@dataclass(frozen=True)
+class RagieAPIError(SyncError):
+    """A non-retryable HTTP error response from the Ragie API."""
+
+    def __init__(self, message: str, *, status: int) -> None:
+        super().__init__(message)
+        self.status = status
+
+
 class LocalDoc:
-    ref: str
-    path: Path
-    name: str
-    external_id: str
-    content: str
-    content_hash: str
-    metadata: dict[str, Any]
+    """One local page: identity, content hash and metadata fingerprint.
+
+    Docs from build_local_docs carry a LocalDocLoader instead of their content and metadata,
+    so the unchanged majority of a large tree costs a few strings each. Content is
+    rematerialized on every access (it is only read when writing); metadata is rebuilt on
+    first access and kept. Docs built with explicit content and metadata (plan files, tests)
+    simply hold them.
+    """
+
+    __slots__ = (
+        "ref",
+        "path",
+        "name",
+        "external_id",
+        "content_hash",
+        "cache_key",
+        "_fingerprint",
+        "_content",
+        "_metadata",
+        "_loader",
+    )
+
+    def __init__(
+        self,
+        *,
+        ref: str,
+        path: Path,
+        name: str,
+        external_id: str,
+        content_hash: str,
+        content: str | None = None,
+        metadata: dict[str, Any] | None = None,
+        metadata_fingerprint: str = "",
+        cache_key: str = "",
+        loader: LocalDocLoader | None = None,
+    ) -> None:
+        if loader is None and (content is None or metadata is None):
+            raise ValueError(f"LocalDoc {ref!r} needs content and metadata, or a loader")
+        self.ref = ref
+        self.path = path
+        self.name = name
+        self.external_id = external_id
+        self.content_hash = content_hash
+        self.cache_key = cache_key
+        self._fingerprint = metadata_fingerprint
+        self._content = content
+        self._metadata = metadata
+        self._loader = loader
+
+    @property
+    def content(self) -> str:
+        if self._content is not None:
+            return self._content
+        assert self._loader is not None
+        return self._loader.normalized(self).content
+
+    @property
+    def metadata(self) -> dict[str, Any]:
+        if self._metadata is None:
+            assert self._loader is not None
+            self._metadata = self._loader.metadata(self.ref, self._loader.normalized(self))
+        return self._metadata
+
+    @property
+    def metadata_fingerprint(self) -> str:
+        if self._metadata is not None:
+            return str(self._metadata.get("metadata_fingerprint") or "")
+        return self._fingerprint
+
+    def _identity(self) -> tuple[Any, ...]:
+        return (self.ref, self.path, self.name, self.external_id, self.content_hash, self.metadata_fingerprint)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, LocalDoc):
+            return NotImplemented
+        return self._identity() == other._identity()
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"LocalDoc(ref={self.ref!r}, external_id={self.external_id!r}, content_hash={self.content_hash!r})"
+
+
+_LOG_LOCK = threading.Lock()
+# Set per partition when several partitions sync in one process, so interleaved lines stay attributable.
+_LOG_PREFIX: contextvars.ContextVar[str] = contextvars.ContextVar("ragie_sync_log_prefix", default="")
 
 
 def log(message: str) -> None:
-    print(message)
+    with _LOG_LOCK:
+        print(_LOG_PREFIX.get() + message, flush=True)
 
 
 def load_local_env(path: Path) -> None:
@@ -368,6 +501,30 @@ def discover_tenant_refs(tenant_slug: str) -> list[str]:
     return sorted(refs)
 
 
+def discover_tenant_slugs() -> list[str]:
+    """Tenant slugs with docs under /tenants: <slug>/ subdirectories and top-level <slug>.md(x) pages."""
+    tenants_dir = REPO_ROOT / "tenants"
+    if not tenants_dir.is_dir():
+        return []
+
+    slugs: set[str] = set()
+    for path in tenants_dir.iterdir():
+        if path.is_dir():
+            has_docs = any(
+                child.is_file() and child.suffix.lower() in {".md", ".mdx"} for child in path.rglob("*")
+            )
+            slug = path.name.lower() if has_docs else ""
+        elif path.is_file() and path.suffix.lower() in {".md", ".mdx"}:
+            slug = path.stem.lower()
+            if slug in {"readme", "review"}:
+                continue
+        else:
+            continue
+        if re.fullmatch(r"[a-z0-9_-]+", slug):
+            slugs.add(slug)
+    return sorted(slugs)
+
+
 def scope_refs_for_partition(
     *,
     refs: list[str],
@@ -389,6 +546,465 @@ def scope_refs_for_partition(
     return scoped
 
 
+def build_external_id(*, repo_name: str, partition: str, ref: str) -> str:
+    return f"repo:{repo_name}|partition:{partition}|ref:{ref}"
+
+
+def sync_state_path(state_dir: Path, partition: str) -> Path:
+    return state_dir / f"{partition}.json"
+
+
+def sync_journal_path(state_dir: Path, partition: str) -> Path:
+    return state_dir / f"{partition}.journal.jsonl"
+
+
+def load_sync_state(path: Path) -> dict[str, Any]:
+    if not path.exists():
+        return {}
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as err:
+        log(f"[WARN] Ignoring unreadable sync state {path}: {err}")
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def write_json_atomic(path: Path, payload: Any, *, indent: int | None = 2) -> None:
+    write_text_atomic(path, json.dumps(payload, indent=indent, sort_keys=True) + "\n")
+
+
+def write_sync_state(path: Path, state: dict[str, Any]) -> None:
+    """Atomically replace the sync state file."""
+    write_json_atomic(path, state)
+
+
+def run_git(*args: str) -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", *args],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    except OSError:
+        return None
+    if completed.returncode != 0:
+        return None
+    return completed.stdout
+
+
+def current_git_commit() -> str:
+    return (run_git("rev-parse", "HEAD") or "").strip()
+
+
+def git_changed_paths(base_commit: str) -> tuple[set[str], set[str]] | None:
+    """Paths changed/added and removed between base_commit and the working tree.
+
+    Returns None when the base commit is not available locally (e.g. a shallow clone).
+    """
+    if run_git("cat-file", "-e", f"{base_commit}^{{commit}}") is None:
+        return None
+
+    diff = run_git("diff", "--name-status", "--no-renames", base_commit, "--")
+    untracked = run_git("ls-files", "--others", "--exclude-standard")
+    if diff is None or untracked is None:
+        return None
+
+    changed: set[str] = {line.strip() for line in untracked.splitlines() if line.strip()}
+    removed: set[str] = set()
+    for line in diff.splitlines():
+        status, _, path = line.partition("\t")
+        if not path:
+            continue
+        if status.startswith("D"):
+            removed.add(path)
+        else:
+            changed.add(path)
+    return changed, removed
+
+
+def refs_for_paths(paths: set[str]) -> set[str]:
+    refs: set[str] = set()
+    for raw_path in paths:
+        path = PurePosixPath(raw_path)
+        if path.suffix.lower() not in {".md", ".mdx"}:
+            continue
+        ref = str(path.with_suffix(""))
+        refs.add(ref)
+        if path.stem == "index":
+            refs.add(str(path.parent))
+    return refs
+
+
+def load_docs_refs_at(commit: str) -> list[str] | None:
+    raw = run_git("show", f"{commit}:docs.json")
+    if raw is None:
+        return None
+    refs: set[str] = set()
+    extract_page_refs(json.loads(raw), refs)
+    return sorted(refs)
+
+
+MDX_IMPORT = re.compile(r"^[ \t]*import\s+(?P<clause>[^;'\"]+?)\s+from\s+['\"](?P<target>[^'\"]+)['\"]", flags=re.M)
+CODE_FENCE_BLOCK = re.compile(r"```[\s\S]*?```")
+
+
+def resolve_import_target(importer: str, target: str) -> str | None:
+    """Repo-relative path of an MDX import ('/snippets/x.mdx' or './x.mdx'); None for packages."""
+    if PurePosixPath(target).suffix.lower() not in {".md", ".mdx"}:
+        return None
+    if target.startswith("/"):
+        resolved = PurePosixPath(target.lstrip("/"))
+    elif target.startswith("."):
+        resolved = PurePosixPath(importer).parent / target
+    else:
+        return None
+    parts: list[str] = []
+    for part in resolved.parts:
+        if part == "..":
+            if not parts:
+                return None
+            parts.pop()
+        elif part != ".":
+            parts.append(part)
+    return "/".join(parts)
+
+
+def parse_mdx_imports(importer: str, text: str) -> dict[str, str]:
+    """{imported file: default component name, or "" for named/namespace imports}; code samples are ignored."""
+    imports: dict[str, str] = {}
+    for match in MDX_IMPORT.finditer(CODE_FENCE_BLOCK.sub("", text)):
+        target = resolve_import_target(importer, match.group("target"))
+        if target is None:
+            continue
+        default = match.group("clause").split(",", 1)[0].strip()
+        imports[target] = default if re.fullmatch(r"[A-Za-z_$][\w$]*", default) else ""
+    return imports
+
+
+def inline_snippet_components(text: str, components: dict[str, str]) -> str:
+    """Replace <Name /> and <Name>...</Name> with each imported snippet's body, outside code fences."""
+    if not components:
+        return text
+    names = "|".join(re.escape(name) for name in sorted(components, key=len, reverse=True))
+    element = re.compile(rf"<({names})\b[^>]*?/>|<({names})\b[^>]*>[\s\S]*?</\2\s*>")
+
+    def replace(match: re.Match[str]) -> str:
+        return "\n" + components[match.group(1) or match.group(2)] + "\n"
+
+    segments = re.split(r"(```[\s\S]*?```)", text)
+    return "".join(segment if segment.startswith("```") else element.sub(replace, segment) for segment in segments)
+
+
+class ImportGraph:
+    """MDX import edges between repo files (posix paths relative to REPO_ROOT), with the reverse index.
+
+    Pages are added with their text; imported snippets are read from disk on first use.
+    """
+
+    def __init__(self) -> None:
+        self.imports: dict[str, dict[str, str]] = {}
+        self.importers: dict[str, set[str]] = {}
+        self.sources: dict[str, str | None] = {}
+
+    @classmethod
+    def from_imports(cls, imports: dict[str, dict[str, str]]) -> ImportGraph:
+        """Graph over edges saved from an earlier run. It has no sources, so it only serves dependents()."""
+        graph = cls()
+        for path, targets in imports.items():
+            graph.imports[path] = dict(targets)
+            for target in targets:
+                graph.importers.setdefault(target, set()).add(path)
+        return graph
+
+    def discard(self, path: str) -> None:
+        """Forget `path`'s own imports (not the files importing it), so it is re-read when added again."""
+        for target in self.imports.pop(path, {}):
+            importers = self.importers.get(target)
+            if importers is not None:
+                importers.discard(path)
+                if not importers:
+                    del self.importers[target]
+        self.sources.pop(path, None)
+
+    def add(self, path: str, text: str | None) -> None:
+        pending = [(path, text)]
+        while pending:
+            current, current_text = pending.pop()
+            if current in self.imports:
+                continue
+            self.sources[current] = current_text
+            self.imports[current] = parse_mdx_imports(current, current_text) if current_text is not None else {}
+            for target in self.imports[current]:
+                self.importers.setdefault(target, set()).add(current)
+                if target not in self.imports:
+                    file_path = REPO_ROOT / target
+                    pending.append((target, decode_doc_source(file_path.read_bytes()) if file_path.is_file() else None))
+
+    def dependencies(self, path: str) -> list[str]:
+        """Every file `path` imports, directly or transitively."""
+        seen: set[str] = set()
+        stack = list(self.imports.get(path, {}))
+        while stack:
+            current = stack.pop()
+            if current in seen or current == path:
+                continue
+            seen.add(current)
+            stack.extend(self.imports.get(current, {}))
+        return sorted(seen)
+
+    def dependents(self, paths: set[str]) -> set[str]:
+        """Every file that imports one of `paths`, directly or transitively."""
+        seen: set[str] = set()
+        stack = [importer for path in paths for importer in self.importers.get(path, ())]
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            stack.extend(self.importers.get(current, ()))
+        return seen
+
+    def components(self, path: str, _stack: tuple[str, ...] = ()) -> dict[str, str]:
+        """{component name: snippet body with its own snippets inlined} for the default imports of `path`."""
+        expanded: dict[str, str] = {}
+        for target, name in self.imports.get(path, {}).items():
+            source = self.sources.get(target)
+            if not name or source is None or target in _stack or target == path:
+                continue
+            _, body = parse_frontmatter(source)
+            expanded[name] = inline_snippet_components(body.strip(), self.components(target, _stack + (path,)))
+        return expanded
+
+    def fingerprint(self, path: str) -> bytes:
+        """Bytes identifying the contents of everything `path` imports, for cache keys (empty without imports)."""
+        dependencies = self.dependencies(path)
+        if not dependencies:
+            return b""
+        digest = hashlib.sha256()
+        for dependency in dependencies:
+            source = self.sources.get(dependency)
+            digest.update(dependency.encode("utf-8") + b"\0" + (source or "\0missing").encode("utf-8") + b"\0")
+        return b"\0imports:" + digest.digest()
+
+
+def build_import_graph(refs: list[str]) -> tuple[ImportGraph, dict[str, str]]:
+    """Import graph over the pages of `refs`, plus {page path: ref}."""
+    graph = ImportGraph()
+    return graph, update_import_graph(graph, refs, changed_paths=set(), removed_paths=set())
+
+
+def update_import_graph(
+    graph: ImportGraph,
+    refs: list[str],
+    *,
+    changed_paths: set[str],
+    removed_paths: set[str],
+) -> dict[str, str]:
+    """Bring a graph of earlier import edges up to date in place and return {page path: ref}.
+
+    Only changed files and pages of `refs` the graph has not seen yet are read.
+    """
+    touched = {path for path in changed_paths | removed_paths if PurePosixPath(path).suffix.lower() in {".md", ".mdx"}}
+    for path in touched:
+        graph.discard(path)
+
+    ref_by_path: dict[str, str] = {}
+    for ref in refs:
+        path = resolve_ref_path(ref)
+        if path is None:
+            continue
+        rel_path = path.relative_to(REPO_ROOT).as_posix()
+        ref_by_path[rel_path] = ref
+        if rel_path not in graph.imports:
+            graph.add(rel_path, decode_doc_source(path.read_bytes()))
+
+    # Changed snippets whose importers did not change are not reached from a page re-read above.
+    for path in sorted(touched - set(graph.imports)):
+        if path in graph.importers:
+            file_path = REPO_ROOT / path
+            graph.add(path, decode_doc_source(file_path.read_bytes()) if file_path.is_file() else None)
+    return ref_by_path
+
+
+def load_import_graph(state: dict[str, Any], *, commit: str) -> ImportGraph | None:
+    """Import edges the state file saved for `commit`, if any."""
+    saved = state.get("import_graph")
+    if not commit or not isinstance(saved, dict) or saved.get("commit") != commit:
+        return None
+    imports = saved.get("imports")
+    if not isinstance(imports, dict):
+        return None
+    return ImportGraph.from_imports(imports)
+
+
+@dataclass(frozen=True)
+class IncrementalScope:
+    base_commit: str
+    changed_refs: frozenset[str]
+    removed_refs: frozenset[str]
+
+
+@dataclass(frozen=True)
+class TreeChanges:
+    """Repo paths a --watch cycle saw change, plus the docs.json refs from before it when the nav changed."""
+
+    changed_paths: frozenset[str]
+    removed_paths: frozenset[str]
+    previous_refs: tuple[str, ...] | None = None
+
+
+WATCH_SKIP_DIRS = frozenset({"node_modules"})
+
+
+class DocsTreeWatcher:
+    """Polls the repo's pages and snippets (.md/.mdx) and docs.json for changes.
+
+    Files are compared by (mtime, size), so a pass over a docs tree is a few thousand stat
+    calls; inotify would need a non-stdlib binding and only works on Linux.
+    """
+
+    def __init__(self, root: Path, *, interval: float, debounce: float) -> None:
+        self.root = root
+        self.interval = interval
+        self.debounce = debounce
+        self._files = self.snapshot()
+
+    def snapshot(self) -> dict[str, tuple[int, int]]:
+        files: dict[str, tuple[int, int]] = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".") and name not in WATCH_SKIP_DIRS]
+            rel_dir = Path(dirpath).relative_to(self.root)
+            for filename in filenames:
+                rel_path = (rel_dir / filename).as_posix()
+                if PurePosixPath(filename).suffix.lower() not in {".md", ".mdx"} and rel_path != "docs.json":
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                files[rel_path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def wait(self, stop: threading.Event | None = None) -> tuple[set[str], set[str]] | None:
+        """(changed, removed) paths once a burst of changes has been quiet for `debounce` seconds.
+
+        Returns None when `stop` is set.
+        """
+        stop = stop or threading.Event()
+        while True:
+            current = self._files
+            changed_at: float | None = None
+            while changed_at is None or time.monotonic() - changed_at < self.debounce:
+                if stop.wait(self.interval if changed_at is None else min(self.interval, self.debounce)):
+                    return None
+                latest = self.snapshot()
+                if latest != current:
+                    current, changed_at = latest, time.monotonic()
+
+            previous, self._files = self._files, current
+            changed = {path for path, stat in current.items() if previous.get(path) != stat}
+            removed = set(previous) - set(current)
+            if changed or removed:
+                return changed, removed
+
+
+def resolve_incremental_scope(
+    *,
+    base_commit: str,
+    refs: list[str],
+    partition: str,
+    graph: ImportGraph | None = None,
+) -> IncrementalScope | None:
+    """Limit a sync to refs whose files changed since base_commit.
+
+    Navigation changes in docs.json are diffed as ref sets so pages added to or
+    dropped from the nav are picked up without touching their files. A change to
+    this script may touch every doc, so it returns None (full reconciliation).
+    `graph` is passed on to scope_for_changed_paths.
+    """
+    diff = git_changed_paths(base_commit)
+    if diff is None:
+        log(f"[WARN] Last synced commit {base_commit} is not available locally; falling back to full reconciliation")
+        return None
+    changed_paths, removed_paths = diff
+    if SYNC_SCRIPT_PATH in changed_paths:
+        log(f"[INFO] {SYNC_SCRIPT_PATH} changed since {base_commit}; falling back to full reconciliation")
+        return None
+
+    previous_refs: list[str] | None = None
+    if tenant_slug_from_partition(partition) is None and "docs.json" in changed_paths:
+        previous_refs = load_docs_refs_at(base_commit)
+        if previous_refs is None:
+            log(f"[WARN] Could not read docs.json at {base_commit}; falling back to full reconciliation")
+            return None
+
+    return scope_for_changed_paths(
+        base=base_commit,
+        changed_paths=changed_paths,
+        removed_paths=removed_paths,
+        refs=refs,
+        partition=partition,
+        previous_refs=previous_refs,
+        graph=graph,
+    )
+
+
+def scope_for_changed_paths(
+    *,
+    base: str,
+    changed_paths: set[str],
+    removed_paths: set[str],
+    refs: list[str],
+    partition: str,
+    previous_refs: list[str] | None = None,
+    graph: ImportGraph | None = None,
+) -> IncrementalScope:
+    """Scope of a partition's refs for changed/removed repo paths; previous_refs is the docs.json nav before them.
+
+    `graph`, the import edges as of `base`, is updated in place from the changed files; without
+    one, every page is read when a page or snippet changed.
+    """
+    scoped = set(refs)
+    changed_refs = refs_for_paths(changed_paths) & scoped
+    removed_refs = {
+        ref for ref in refs_for_paths(removed_paths) if ref not in scoped or resolve_ref_path(ref) is None
+    }
+
+    # Pages that (transitively) import a changed snippet render differently even though their own file did not change.
+    touched_docs = {
+        path for path in changed_paths | removed_paths if PurePosixPath(path).suffix.lower() in {".md", ".mdx"}
+    }
+    if graph is not None:
+        ref_by_path = update_import_graph(graph, refs, changed_paths=changed_paths, removed_paths=removed_paths)
+    elif touched_docs:
+        graph, ref_by_path = build_import_graph(refs)
+    if touched_docs:
+        dependent_refs = {ref_by_path[path] for path in graph.dependents(touched_docs) if path in ref_by_path}
+        if dependent_refs - changed_refs:
+            log(f"[INFO] Snippet changes affect {len(dependent_refs - changed_refs)} importing page(s)")
+        changed_refs |= dependent_refs
+
+    if tenant_slug_from_partition(partition) is None and previous_refs is not None:
+        previous_scoped = {ref for ref in previous_refs if extract_tenant_slug_from_ref(ref) is None}
+        changed_refs |= scoped - previous_scoped
+        removed_refs |= previous_scoped - scoped
+
+    return IncrementalScope(
+        base_commit=base,
+        changed_refs=frozenset(changed_refs),
+        removed_refs=frozenset(removed_refs - changed_refs),
+    )
+
+
 def _strip_wrapping_quotes(value: str) -> str:
     raw = value.strip()
     if (raw.startswith('"') and raw.endswith('"')) or (raw.startswith("'") and raw.endswith("'")):
@@ -466,6 +1082,12 @@ def parse_frontmatter(text: str) -> tuple[dict[str, Any], str]:
     return fm, body
 
 
+CALLOUT_PATTERNS = [
+    (label, re.compile(rf"<{label}\b[^>]*>([\s\S]*?)</{label}>", flags=re.I))
+    for label in ("Info", "Tip", "Note", "Warning")
+]
+
+
 def _strip_inline_tags(text: str) -> str:
     text = re.sub(r"\{\s*/\*.*?\*/\s*\}", "", text, flags=re.S)
     text = re.sub(r"</?[A-Za-z][^>]*>", "", text)
@@ -479,23 +1101,20 @@ def _collapse_spaces(text: str) -> str:
     return text.strip()
 
 
-def normalize_doc_text(raw_text: str, fallback_title: str) -> tuple[str, dict[str, Any]]:
-    frontmatter, body = parse_frontmatter(raw_text)
-
-    title = frontmatter.get("title") or fallback_title
-    description = frontmatter.get("description") or ""
+def _collapse_whitespace(text: str) -> str:
+    """Same result as _collapse_spaces using str.replace, which skips the per-space regex matches."""
+    text = text.replace("\t", " ")
+    while "  " in text:
+        text = text.replace("  ", " ")
+    while "\n\n\n" in text:
+        text = text.replace("\n\n\n", "\n\n")
+    return text.strip()
 
-    body = body.replace("\r\n", "\n").replace("\r", "\n")
 
+def _render_mdx_body_regex(body: str) -> str:
+    """The original regex chain, kept as the reference for the tokenizer's golden test and benchmark."""
     segments = re.split(r"(```[\s\S]*?```)", body)
 
-    callouts = {
-        "Info": "Info",
-        "Tip": "Tip",
-        "Note": "Note",
-        "Warning": "Warning",
-    }
-
     processed: list[str] = []
     for segment in segments:
         if not segment:
@@ -507,8 +1126,7 @@ def normalize_doc_text(raw_text: str, fallback_title: str) -> tuple[str, dict[st
         part = segment
         part = re.sub(r"(?m)^\s*(import|export)\s+.+$", "", part)
 
-        for tag, label in callouts.items():
-            pattern = re.compile(rf"<{tag}\b[^>]*>([\s\S]*?)</{tag}>", flags=re.I)
+        for label, pattern in CALLOUT_PATTERNS:
 
             def repl(match: re.Match[str], label: str = label) -> str:
                 inner = _strip_inline_tags(match.group(1))
@@ -520,8 +1138,154 @@ def normalize_doc_text(raw_text: str, fallback_title: str) -> tuple[str, dict[st
         part = _strip_inline_tags(part)
         processed.append(part)
 
-    normalized_body = "".join(processed)
-    normalized_body = _collapse_spaces(normalized_body)
+    return _collapse_spaces("".join(processed))
+
+
+# Callout components rendered as "<Label>: <text>". When callouts nest, an inner callout
+# keeps its label only if it comes earlier in this tuple than the one around it.
+CALLOUT_LABELS = ("Info", "Tip", "Note", "Warning")
+_CALLOUT_OPEN = re.compile(r"<(Info|Tip|Note|Warning)\b[^>]*>", flags=re.I)
+_CALLOUT_CLOSE = {label: re.compile(rf"</{label}>", flags=re.I) for label in CALLOUT_LABELS}
+_MDX_TOKEN_START = re.compile(r"[<{]")
+_MDX_STATEMENT_START = re.compile(r"^[ \t]*(?:import|export)\s", flags=re.M)
+_MDX_TAG_START = re.compile(r"</?[A-Za-z]")
+_MDX_STATEMENT = re.compile(r"[ \t]*(?:import|export)\s+.+")
+_MDX_COMMENT_OPEN = re.compile(r"\{\s*/\*")
+_MDX_EXPRESSION = re.compile(r"\{\s*[A-Za-z_][^{}\n]*\}")
+
+
+class _MDXScanner:
+    """Linear-time renderer for the prose between code fences of one MDX document.
+
+    Drops import/export lines, JSX comments, tags and `{expression}`s and turns callouts
+    into labelled paragraphs, producing what the legacy regex chain produced. Lookups
+    for the next `>` / `*/` / closing callout tag are cached so that unbalanced input
+    cannot trigger rescans of the rest of the document.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self._next: dict[Any, int] = {}
+        # Line starts that may open an import/export statement; usually none, so skip the scan.
+        self._statements: list[int] = (
+            [match.start() for match in _MDX_STATEMENT_START.finditer(text)]
+            if "import" in text or "export" in text
+            else []
+        )
+
+    def _find(self, key: Any, pos: int, finder: Any) -> int:
+        cached = self._next.get(key)
+        if cached is not None and (cached == -1 or cached >= pos):
+            return cached
+        found = finder(pos)
+        self._next[key] = found
+        return found
+
+    def _find_close(self, label: str, pos: int) -> int:
+        def finder(start: int) -> int:
+            match = _CALLOUT_CLOSE[label].search(self.text, start)
+            return match.start() if match else -1
+
+        return self._find(label, pos, finder)
+
+    def _comment_end(self, pos: int) -> int:
+        """End of a `{/* ... */}` comment starting at pos, or -1."""
+        opener = _MDX_COMMENT_OPEN.match(self.text, pos)
+        if not opener:
+            return -1
+        text = self.text
+        search_from = opener.end()
+        while True:
+            close = self._find("*/", search_from, lambda start: text.find("*/", start))
+            if close == -1:
+                return -1
+            end = close + 2
+            while end < len(text) and text[end].isspace():
+                end += 1
+            if end < len(text) and text[end] == "}":
+                return end + 1
+            search_from = close + 1
+
+    def render(self, start: int, end: int, labels: tuple[str, ...] = CALLOUT_LABELS) -> str:
+        text = self.text
+        out: list[str] = []
+        pos = start
+        statements = self._statements
+        next_statement = bisect.bisect_left(statements, pos)
+        while pos < end:
+            while next_statement < len(statements) and statements[next_statement] < pos:
+                next_statement += 1
+            statement_at = statements[next_statement] if next_statement < len(statements) else end
+            match = _MDX_TOKEN_START.search(text, pos, min(statement_at, end))
+            at = match.start() if match else min(statement_at, end)
+            out.append(text[pos:at])
+            if at >= end:
+                break
+            char = text[at]
+
+            if char == "{":
+                skip_to = self._comment_end(at)
+                if skip_to == -1 or skip_to > end:
+                    expression = _MDX_EXPRESSION.match(text, at, end)
+                    skip_to = expression.end() if expression else -1
+            elif char == "<":
+                skip_to = -1
+                if _MDX_TAG_START.match(text, at, end):
+                    gt = self._find(">", at, lambda start: text.find(">", start))
+                    if gt != -1 and gt < end:
+                        skip_to = gt + 1
+                        callout = _CALLOUT_OPEN.match(text, at, skip_to)
+                        label = ""
+                        if callout:
+                            label = next((name for name in labels if name.lower() == callout.group(1).lower()), "")
+                        close = self._find_close(label, skip_to) if label else -1
+                        if label and close != -1 and close < end:
+                            inner = _collapse_whitespace(
+                                self.render(skip_to, close, labels[: labels.index(label)])
+                            )
+                            out.append(f"{label}: {inner}" if inner else label)
+                            skip_to = close + len(label) + 3
+            else:
+                statement = _MDX_STATEMENT.match(text, at, end)
+                skip_to = statement.end() if statement else -1
+
+            if skip_to == -1:
+                out.append(char)
+                pos = at + 1
+            else:
+                pos = skip_to
+        return "".join(out)
+
+
+def _render_mdx_body(body: str) -> str:
+    scanner = _MDXScanner(body)
+    processed: list[str] = []
+    pos = 0
+    while pos < len(body):
+        fence = body.find("```", pos)
+        fence_end = body.find("```", fence + 3) if fence != -1 else -1
+        if fence_end == -1:
+            # Like the regex split, an unpaired fence opening the remaining text keeps it verbatim.
+            processed.append(body[pos:] if fence == pos else scanner.render(pos, len(body)))
+            break
+        processed.append(scanner.render(pos, fence))
+        processed.append(body[fence : fence_end + 3])
+        pos = fence_end + 3
+    return _collapse_whitespace("".join(processed))
+
+
+def _normalize_doc_text_with(
+    raw_text: str,
+    fallback_title: str,
+    render_body: Any,
+) -> tuple[str, dict[str, Any]]:
+    frontmatter, body = parse_frontmatter(raw_text)
+
+    title = frontmatter.get("title") or fallback_title
+    description = frontmatter.get("description") or ""
+
+    body = body.replace("\r\n", "\n").replace("\r", "\n")
+    normalized_body = render_body(body)
 
     preamble_parts = [f"# {title}"]
     if description:
@@ -537,6 +1301,14 @@ def normalize_doc_text(raw_text: str, fallback_title: str) -> tuple[str, dict[st
     return full_text, normalized_fm
 
 
+def normalize_doc_text(raw_text: str, fallback_title: str) -> tuple[str, dict[str, Any]]:
+    return _normalize_doc_text_with(raw_text, fallback_title, _render_mdx_body)
+
+
+def _normalize_doc_text_regex(raw_text: str, fallback_title: str) -> tuple[str, dict[str, Any]]:
+    return _normalize_doc_text_with(raw_text, fallback_title, _render_mdx_body_regex)
+
+
 def sha256_text(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
@@ -651,7 +1423,7 @@ def derive_taxonomy(
         topic_tags.add("how_to")
 
     return {
-        "taxonomy_version": "v1",
+        "taxonomy_version": TAXONOMY_VERSION,
         "doc_domain": doc_domain,
         "doc_subdomain": doc_subdomain,
         "content_type": content_type,
@@ -663,6 +1435,538 @@ def derive_taxonomy(
     }
 
 
+def parse_retry_after(value: str | None, *, max_delay: float = MAX_RETRY_AFTER_SECONDS) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds from now, capped at max_delay.
+
+    Unparseable and non-finite values return None, so callers fall back to plain backoff.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_at = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        return None
+    return min(max(0.0, seconds), max_delay)
+
+
+def backoff_delay(attempt: int, base_delay: float, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, never shorter than a server Retry-After hint."""
+    delay = random.uniform(0, base_delay * (2**attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class AdaptiveRateLimiter:
+    """Token bucket shared by every request of a client, with AIMD rate control.
+
+    The rate is cut multiplicatively on each 429 and grows back additively after
+    `increase_after` consecutive successes, up to `max_rate`. A Retry-After hint
+    pauses all callers until it expires. `reserve()` is thread-safe and never blocks;
+    AsyncRagieClient shares it through the RagieClient its worker threads drive.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_rate: float,
+        min_rate: float = 0.5,
+        burst: float | None = None,
+        decrease_factor: float = 0.5,
+        increase_step: float | None = None,
+        increase_after: int = 10,
+        clock: Any = time.monotonic,
+    ) -> None:
+        if max_rate <= 0:
+            raise SyncError("Rate limit must be positive")
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.burst = burst if burst is not None else max(1.0, max_rate)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step if increase_step is not None else max(0.1, max_rate / 20)
+        self.increase_after = increase_after
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._rate = max_rate
+        self._tokens = self.burst
+        self._updated_at = clock()
+        self._blocked_until = 0.0
+        self._success_streak = 0
+
+        self.requests = 0
+        self.throttle_count = 0
+        self.waited_seconds = 0.0
+
+    @property
+    def rate(self) -> float:
+        with self._lock:
+            return self._rate
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller must wait before sending."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self._rate, self._blocked_until - now)
+            self.requests += 1
+            self.waited_seconds += wait
+            return wait
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._success_streak += 1
+            if self._success_streak >= self.increase_after and self._rate < self.max_rate:
+                self._rate = min(self.max_rate, self._rate + self.increase_step)
+                self._success_streak = 0
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        with self._lock:
+            self.throttle_count += 1
+            self._success_streak = 0
+            self._rate = max(self.min_rate, self._rate * self.decrease_factor)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, self._clock() + retry_after)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "rate": round(self._rate, 3),
+                "max_rate": self.max_rate,
+                "requests": self.requests,
+                "throttled": self.throttle_count,
+                "waited_seconds": round(self.waited_seconds, 3),
+            }
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def path_template(path: str) -> str:
+    """API path with its document/partition/instruction id replaced by {id}, for grouping metrics."""
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    if len(parts) >= 2 and parts[1] != "raw":
+        parts[1] = "{id}"
+    return "/" + "/".join(parts)
+
+
+def _quantile(ordered: list[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted, non-empty list."""
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    bytes_sent: int = 0
+    bytes_received: int = 0
+    seconds: list[float] = field(default_factory=list)
+    # One count per LATENCY_BUCKETS upper bound, plus a final overflow bucket.
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+
+class SyncMetrics:
+    """Phase timers, per-endpoint request latency histograms and partition outcomes for one run.
+
+    Shared by every client, thread and event loop of the run; all updates take a lock.
+    """
+
+    def __init__(self, *, clock: Any = time.monotonic) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = clock()
+        self.started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.phases: dict[tuple[str, str], list[float]] = {}
+        self.endpoints: dict[tuple[str, str], EndpointStats] = {}
+        self.partitions: dict[str, dict[str, Any]] = {}
+
+    @contextmanager
+    def phase(self, name: str, *, partition: str = "") -> Any:
+        started = self._clock()
+        try:
+            yield
+        finally:
+            elapsed = self._clock() - started
+            with self._lock:
+                totals = self.phases.setdefault((partition, name), [0.0, 0])
+                totals[0] += elapsed
+                totals[1] += 1
+
+    def observe_request(
+        self,
+        method: str,
+        path: str,
+        *,
+        status: int,
+        seconds: float,
+        bytes_sent: int,
+        bytes_received: int,
+    ) -> None:
+        """Record one HTTP attempt; status 0 means no response (network error)."""
+        with self._lock:
+            stats = self.endpoints.setdefault((method, path_template(path)), EndpointStats())
+            stats.requests += 1
+            stats.errors += status == 0 or status >= 400
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.seconds.append(seconds)
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def observe_retry(self, method: str, path: str) -> None:
+        with self._lock:
+            self.endpoints.setdefault((method, path_template(path)), EndpointStats()).retries += 1
+
+    def record_partition(
+        self,
+        partition: str,
+        *,
+        status: str,
+        seconds: float,
+        counts: dict[str, int],
+        time_to_ready: dict[str, float],
+        deletes: dict[str, Any] | None = None,
+    ) -> None:
+        with self._lock:
+            self.partitions[partition] = {
+                "status": status,
+                "seconds": round(seconds, 3),
+                **counts,
+                "time_to_ready": sorted(time_to_ready.values()),
+                "deletes": deletes,
+            }
+
+    def report(self, *, exit_code: int) -> dict[str, Any]:
+        with self._lock:
+            duration = self._clock() - self._started
+            endpoints = []
+            for (method, path), stats in sorted(self.endpoints.items()):
+                latencies = sorted(stats.seconds) or [0.0]
+                endpoints.append(
+                    {
+                        "method": method,
+                        "path": path,
+                        "requests": stats.requests,
+                        "errors": stats.errors,
+                        "retries": stats.retries,
+                        "bytes_sent": stats.bytes_sent,
+                        "bytes_received": stats.bytes_received,
+                        "seconds_sum": round(sum(latencies), 4),
+                        "p50": round(_quantile(latencies, 0.5), 4),
+                        "p90": round(_quantile(latencies, 0.9), 4),
+                        "p99": round(_quantile(latencies, 0.99), 4),
+                        "max": round(latencies[-1], 4),
+                        "buckets": dict(zip([*map(str, LATENCY_BUCKETS), "+Inf"], stats.buckets)),
+                    }
+                )
+            partitions = {}
+            for partition, outcome in sorted(self.partitions.items()):
+                timings = outcome["time_to_ready"]
+                partitions[partition] = {
+                    **outcome,
+                    "time_to_ready": {
+                        "docs": len(timings),
+                        "p50": round(_quantile(timings, 0.5), 3) if timings else None,
+                        "p90": round(_quantile(timings, 0.9), 3) if timings else None,
+                        "max": round(timings[-1], 3) if timings else None,
+                    },
+                }
+            written = sum(
+                outcome.get(key, 0)
+                for outcome in self.partitions.values()
+                for key in ("created", "updated", "patched", "deleted")
+            )
+            return {
+                "started_at": self.started_at,
+                "duration_seconds": round(duration, 3),
+                "exit_code": exit_code,
+                "phases": [
+                    {"partition": partition, "phase": name, "seconds": round(seconds, 4), "count": int(count)}
+                    for (partition, name), (seconds, count) in sorted(self.phases.items())
+                ],
+                "requests": {
+                    "total": sum(stats.requests for stats in self.endpoints.values()),
+                    "errors": sum(stats.errors for stats in self.endpoints.values()),
+                    "retries": sum(stats.retries for stats in self.endpoints.values()),
+                    "bytes_sent": sum(stats.bytes_sent for stats in self.endpoints.values()),
+                    "bytes_received": sum(stats.bytes_received for stats in self.endpoints.values()),
+                    "endpoints": endpoints,
+                },
+                "partitions": partitions,
+                "throughput": {
+                    "writes": written,
+                    "writes_per_second": round(written / duration, 3) if duration else 0.0,
+                },
+            }
+
+    def prometheus(self, *, exit_code: int) -> str:
+        """The report in Prometheus text format, for node_exporter's textfile collector."""
+        report = self.report(exit_code=exit_code)
+        endpoints = report["requests"]["endpoints"]
+        lines: list[str] = []
+
+        def header(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP ragie_sync_{name} {help_text}")
+            lines.append(f"# TYPE ragie_sync_{name} {kind}")
+
+        def sample(name: str, value: float, **labels: str) -> None:
+            label_text = ",".join(f'{key}="{_prometheus_escape(str(val))}"' for key, val in labels.items())
+            lines.append(f"ragie_sync_{name}{{{label_text}}} {value}" if labels else f"ragie_sync_{name} {value}")
+
+        header("last_run_timestamp_seconds", "gauge", "Unix time the last run finished.")
+        sample("last_run_timestamp_seconds", round(time.time(), 3))
+        header("run_duration_seconds", "gauge", "Wall time of the last run.")
+        sample("run_duration_seconds", report["duration_seconds"])
+        header("run_success", "gauge", "1 if the last run exited 0.")
+        sample("run_success", int(exit_code == 0))
+
+        header("phase_seconds", "gauge", "Wall time spent in each phase of the last run.")
+        for phase in report["phases"]:
+            sample("phase_seconds", phase["seconds"], partition=phase["partition"], phase=phase["phase"])
+
+        header("request_duration_seconds", "histogram", "Ragie API request latency in the last run.")
+        for endpoint in endpoints:
+            labels = {"method": endpoint["method"], "path": endpoint["path"]}
+            cumulative = 0
+            for bound, count in endpoint["buckets"].items():
+                cumulative += count
+                sample("request_duration_seconds_bucket", cumulative, **labels, le=bound)
+            sample("request_duration_seconds_sum", endpoint["seconds_sum"], **labels)
+            sample("request_duration_seconds_count", endpoint["requests"], **labels)
+
+        for key, help_text in (
+            ("errors", "Ragie API requests answered with an error or not answered, in the last run."),
+            ("retries", "Ragie API requests retried in the last run."),
+            ("bytes_sent", "Request body bytes sent to the Ragie API in the last run."),
+            ("bytes_received", "Response body bytes received from the Ragie API in the last run."),
+        ):
+            header(f"request_{key}", "gauge", help_text)
+            for endpoint in endpoints:
+                sample(f"request_{key}", endpoint[key], method=endpoint["method"], path=endpoint["path"])
+
+        header("time_to_ready_seconds", "gauge", "Seconds from write to ready for docs written in the last run.")
+        for partition, outcome in report["partitions"].items():
+            for stat in ("p50", "p90", "max"):
+                if outcome["time_to_ready"][stat] is not None:
+                    sample("time_to_ready_seconds", outcome["time_to_ready"][stat], partition=partition, stat=stat)
+        header("deletes_per_second", "gauge", "Delete stage throughput in the last run.")
+        for partition, outcome in report["partitions"].items():
+            if (outcome.get("deletes") or {}).get("per_second") is not None:
+                sample("deletes_per_second", outcome["deletes"]["per_second"], partition=partition)
+        header("deletes_unconfirmed", "gauge", "Deleted docs still listed by the --verify-deletes pass.")
+        for partition, outcome in report["partitions"].items():
+            if (outcome.get("deletes") or {}).get("verified"):
+                sample("deletes_unconfirmed", outcome["deletes"]["unconfirmed"], partition=partition)
+        header("documents_written", "gauge", "Documents written in the last run.")
+        for partition, outcome in report["partitions"].items():
+            for kind in ("created", "updated", "patched", "deleted"):
+                sample("documents_written", outcome.get(kind, 0), partition=partition, kind=kind)
+        return "\n".join(lines) + "\n"
+
+
+def _prometheus_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_METRICS: contextvars.ContextVar[SyncMetrics | None] = contextvars.ContextVar("ragie_sync_metrics", default=None)
+
+
+def timed_phase(name: str, *, partition: str = "") -> Any:
+    """Time a block as a phase of the current run's metrics (a no-op when metrics are off)."""
+    metrics = _METRICS.get()
+    return metrics.phase(name, partition=partition) if metrics is not None else nullcontext()
+
+
+def observe_response(
+    rate_limiter: AdaptiveRateLimiter | None,
+    status: int,
+    retry_after_header: str | None,
+) -> float | None:
+    """Feed a response status to the rate limiter; returns the Retry-After hint for 429s."""
+    if status == 429:
+        retry_after = parse_retry_after(retry_after_header)
+        if rate_limiter is not None:
+            rate_limiter.on_throttle(retry_after)
+        return retry_after
+    if status < 400 and rate_limiter is not None:
+        rate_limiter.on_success()
+    return None
+
+
+class HTTPConnectionPool:
+    """Thread-safe pool of persistent (keep-alive) HTTP/1.1 connections to one origin.
+
+    At most `maxsize` connections are open at once; callers beyond that block until a
+    connection is checked back in. Connections the server closed while idle are
+    transparently replaced once before the error is surfaced to the caller.
+    """
+
+    def __init__(self, base_url: str, *, timeout: float, maxsize: int) -> None:
+        parsed = urlsplit(base_url)
+        if parsed.scheme not in {"http", "https"} or not parsed.hostname:
+            raise SyncError(f"Unsupported Ragie base URL '{base_url}'")
+
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.base_path = parsed.path.rstrip("/")
+        self.timeout = timeout
+        self.maxsize = max(1, maxsize)
+        self.connections_opened = 0
+
+        self._ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxsize)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        with self._lock:
+            self.connections_opened += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host,
+                self.port,
+                timeout=self.timeout,
+                context=self._ssl_context,
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _checkout(self) -> tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self._new_connection(), False
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.append(conn)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: bytes | None,
+        headers: dict[str, str],
+    ) -> tuple[int, http.client.HTTPMessage, bytes]:
+        with self._slots:
+            conn, reused = self._checkout()
+            while True:
+                try:
+                    conn.request(method, self.base_path + path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    raw = response.read()
+                except (BrokenPipeError, ConnectionResetError, http.client.RemoteDisconnected):
+                    conn.close()
+                    if not reused:
+                        raise
+                    # The server dropped an idle keep-alive connection; retry once on a fresh one.
+                    conn, reused = self._new_connection(), False
+                    continue
+                except BaseException:
+                    conn.close()
+                    raise
+
+                if response.will_close:
+                    conn.close()
+                else:
+                    self._checkin(conn)
+                return response.status, response.headers, raw
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _prepare_request(
+    *,
+    api_key: str,
+    path: str,
+    query: dict[str, Any] | None,
+    partition: str | None,
+    json_body: dict[str, Any] | None,
+) -> tuple[str, dict[str, str], bytes | None]:
+    request_path = path
+    if query:
+        clean_query = {k: v for k, v in query.items() if v is not None}
+        query_str = urlencode(clean_query)
+        if query_str:
+            request_path = f"{path}?{query_str}"
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Accept": "application/json",
+    }
+    if partition:
+        headers["partition"] = partition
+
+    payload: bytes | None = None
+    if json_body is not None:
+        payload = json.dumps(json_body).encode("utf-8")
+        headers["Content-Type"] = "application/json"
+
+    return request_path, headers, payload
+
+
+def _decode_response(content_type: str, raw: bytes) -> Any:
+    if "application/json" in content_type:
+        if not raw:
+            return {}
+        return json.loads(raw.decode("utf-8"))
+    return raw
+
+
+def _observe_attempt(
+    metrics: SyncMetrics | None,
+    method: str,
+    path: str,
+    status: int,
+    started: float,
+    payload: bytes | None,
+    raw: bytes,
+) -> None:
+    if metrics is not None:
+        metrics.observe_request(
+            method,
+            path,
+            status=status,
+            seconds=time.perf_counter() - started,
+            bytes_sent=len(payload or b""),
+            bytes_received=len(raw),
+        )
+
+
+def _error_detail(raw: bytes) -> str:
+    detail = raw.decode("utf-8", errors="ignore")
+    try:
+        parsed = json.loads(detail)
+        if isinstance(parsed, dict) and parsed.get("detail"):
+            detail = str(parsed["detail"])
+    except json.JSONDecodeError:
+        pass
+    return detail
+
+
 class RagieClient:
     def __init__(
         self,
@@ -672,12 +1976,28 @@ class RagieClient:
         timeout: int,
         max_retries: int,
         retry_base_delay: float,
+        pool_size: int = 8,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+        metrics: SyncMetrics | None = None,
     ) -> None:
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
         self.timeout = timeout
         self.max_retries = max_retries
         self.retry_base_delay = retry_base_delay
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.pool_size = pool_size
+        self._pool = HTTPConnectionPool(self.base_url, timeout=timeout, maxsize=pool_size)
+
+    def close(self) -> None:
+        self._pool.close()
+
+    def __enter__(self) -> RagieClient:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
 
     def _request(
         self,
@@ -688,85 +2008,76 @@ class RagieClient:
         partition: str | None = None,
         json_body: dict[str, Any] | None = None,
     ) -> Any:
-        if query:
-            clean_query = {k: v for k, v in query.items() if v is not None}
-            query_str = urlencode(clean_query)
-            url = f"{self.base_url}{path}?{query_str}" if query_str else f"{self.base_url}{path}"
-        else:
-            url = f"{self.base_url}{path}"
-
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Accept": "application/json",
-        }
-        if partition:
-            headers["partition"] = partition
-
-        payload: bytes | None = None
-        if json_body is not None:
-            payload = json.dumps(json_body).encode("utf-8")
-            headers["Content-Type"] = "application/json"
-
-        req = Request(url=url, data=payload, method=method, headers=headers)
+        request_path, headers, payload = _prepare_request(
+            api_key=self.api_key,
+            path=path,
+            query=query,
+            partition=partition,
+            json_body=json_body,
+        )
 
         for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            started = time.perf_counter()
             try:
-                with urlopen(req, timeout=self.timeout) as response:
-                    raw = response.read()
-                    content_type = response.headers.get("Content-Type", "")
-                    if "application/json" in content_type:
-                        if not raw:
-                            return {}
-                        return json.loads(raw.decode("utf-8"))
-                    return raw
-            except HTTPError as err:
-                status = err.code
-                raw = err.read().decode("utf-8", errors="ignore")
-                detail = raw
-                try:
-                    parsed = json.loads(raw)
-                    if isinstance(parsed, dict) and parsed.get("detail"):
-                        detail = str(parsed["detail"])
-                except json.JSONDecodeError:
-                    pass
-
-                if status in {429, 500, 502, 503, 504} and attempt < self.max_retries:
-                    sleep_for = self.retry_base_delay * (2**attempt)
-                    time.sleep(sleep_for)
-                    continue
-
-                raise SyncError(f"Ragie API error {status} for {method} {path}: {detail}") from err
-            except URLError as err:
+                status, response_headers, raw = self._pool.request(
+                    method,
+                    request_path,
+                    body=payload,
+                    headers=headers,
+                )
+            except (OSError, http.client.HTTPException) as err:
+                _observe_attempt(self.metrics, method, path, 0, started, payload, b"")
                 if attempt < self.max_retries:
-                    sleep_for = self.retry_base_delay * (2**attempt)
-                    time.sleep(sleep_for)
+                    if self.metrics is not None:
+                        self.metrics.observe_retry(method, path)
+                    time.sleep(backoff_delay(attempt, self.retry_base_delay))
                     continue
                 raise SyncError(f"Network error for {method} {path}: {err}") from err
+            _observe_attempt(self.metrics, method, path, status, started, payload, raw)
+
+            retry_after = observe_response(self.rate_limiter, status, response_headers.get("Retry-After"))
+            if status >= 400:
+                if status in RETRYABLE_STATUSES and attempt < self.max_retries:
+                    if self.metrics is not None:
+                        self.metrics.observe_retry(method, path)
+                    time.sleep(backoff_delay(attempt, self.retry_base_delay, retry_after))
+                    continue
+                raise RagieAPIError(
+                    f"Ragie API error {status} for {method} {path}: {_error_detail(raw)}", status=status
+                )
+
+            return _decode_response(response_headers.get("Content-Type", ""), raw)
 
         raise SyncError(f"Exhausted retries for {method} {path}")
 
-    def list_documents(self, partition: str) -> list[dict[str, Any]]:
-        docs: list[dict[str, Any]] = []
+    def documents_page(self, partition: str, cursor: str | None) -> tuple[list[dict[str, Any]], str | None]:
+        """One page of the partition's documents, each slimmed by slim_remote_doc, and the next cursor."""
+        response = self._request(
+            "GET",
+            "/documents",
+            query={"page_size": 100, "cursor": cursor},
+            partition=partition,
+        )
+        page_docs = response.get("documents", [])
+        if not isinstance(page_docs, list):
+            raise SyncError("Unexpected /documents response shape: missing documents[]")
+        pagination = response.get("pagination", {}) or {}
+        return [slim_remote_doc(doc) for doc in page_docs], pagination.get("next_cursor") or None
+
+    def iter_documents(self, partition: str) -> Iterator[dict[str, Any]]:
+        """Stream the partition's documents page by page, each slimmed by slim_remote_doc."""
         cursor: str | None = None
 
         while True:
-            response = self._request(
-                "GET",
-                "/documents",
-                query={"page_size": 100, "cursor": cursor},
-                partition=partition,
-            )
-            page_docs = response.get("documents", [])
-            if not isinstance(page_docs, list):
-                raise SyncError("Unexpected /documents response shape: missing documents[]")
-            docs.extend(page_docs)
-
-            pagination = response.get("pagination", {}) or {}
-            cursor = pagination.get("next_cursor")
+            page_docs, cursor = self.documents_page(partition, cursor)
+            yield from page_docs
             if not cursor:
                 break
 
-        return docs
+    def list_documents(self, partition: str) -> list[dict[str, Any]]:
+        return list(self.iter_documents(partition))
 
     def create_document_raw(
         self,
@@ -913,20 +2224,320 @@ class RagieClient:
         )
 
 
-def build_local_docs(
-    *,
-    refs: list[str],
-    partition: str,
+class AsyncRagieClient:
+    """asyncio front end for RagieClient, for the calls the async sync path makes.
+
+    This is not non-blocking I/O: each request runs RagieClient's own code (request building,
+    keep-alive pool, retries and errors) on a worker thread, so concurrency is capped at the
+    client's pool size (--pool-size) however many coroutines are waiting. Pass `client` to share
+    an existing RagieClient and its connection pool; a borrowed client is left open on close.
+    """
+
+    def __init__(self, *, client: RagieClient | None = None, pool_size: int = 8, **options: Any) -> None:
+        self._owns_client = client is None
+        self._client = client if client is not None else RagieClient(pool_size=pool_size, **options)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, self._client.pool_size), thread_name_prefix="ragie-async"
+        )
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._owns_client:
+            self._client.close()
+
+    async def __aenter__(self) -> AsyncRagieClient:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def _call(self, method: Any, *args: Any, **kwargs: Any) -> Any:
+        # Like asyncio.to_thread, but on this client's executor so concurrency follows pool_size.
+        call = functools.partial(contextvars.copy_context().run, method, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def iter_documents(self, partition: str) -> AsyncIterator[dict[str, Any]]:
+        cursor: str | None = None
+
+        while True:
+            page_docs, cursor = await self._call(self._client.documents_page, partition, cursor)
+            for doc in page_docs:
+                yield doc
+            if not cursor:
+                break
+
+    async def list_documents(self, partition: str) -> list[dict[str, Any]]:
+        return [doc async for doc in self.iter_documents(partition)]
+
+    async def list_partitions(self) -> list[dict[str, Any]]:
+        return await self._call(self._client.list_partitions)
+
+    async def get_partition(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.get_partition, **kwargs)
+
+    async def create_partition(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.create_partition, **kwargs)
+
+    async def update_partition(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.update_partition, **kwargs)
+
+    async def list_instructions(self) -> list[dict[str, Any]]:
+        return await self._call(self._client.list_instructions)
+
+    async def create_instruction(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.create_instruction, **kwargs)
+
+    async def update_instruction_active(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.update_instruction_active, **kwargs)
+
+    async def create_document_raw(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.create_document_raw, **kwargs)
+
+    async def update_document_raw(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.update_document_raw, **kwargs)
+
+    async def patch_document_metadata(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.patch_document_metadata, **kwargs)
+
+    async def get_document(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.get_document, **kwargs)
+
+    async def delete_document(self, **kwargs: Any) -> dict[str, Any]:
+        return await self._call(self._client.delete_document, **kwargs)
+
+
+@dataclass(frozen=True)
+class NormalizedDoc:
+    content: str
+    content_hash: str
+    frontmatter: dict[str, Any]
+    taxonomy: dict[str, Any]
+
+
+def decode_doc_source(raw: bytes) -> str:
+    """Decode page bytes the way Path.read_text does (UTF-8, bad bytes dropped, universal newlines)."""
+    return raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def normalize_doc_source(raw_text: str, ref: str) -> NormalizedDoc:
+    """Normalize and taxonomize one page; safe to run in a worker process."""
+    fallback_title = ref.rsplit("/", 1)[-1].replace("-", " ").strip().title() or ref
+    content, fm = normalize_doc_text(raw_text, fallback_title)
+    taxonomy = derive_taxonomy(
+        ref=ref,
+        title=fm.get("title", fallback_title),
+        description=fm.get("description", ""),
+        frontmatter_tags=fm.get("tags", []),
+    )
+    return NormalizedDoc(content=content, content_hash=sha256_text(content), frontmatter=fm, taxonomy=taxonomy)
+
+
+def normalize_doc_sources(sources: list[tuple[str, str]], *, jobs: int = 1) -> list[NormalizedDoc]:
+    """normalize_doc_source over (ref, raw text) pairs, in order; jobs > 1 fans out to a process pool."""
+    if jobs <= 1 or len(sources) < 2:
+        return [normalize_doc_source(raw_text, ref) for ref, raw_text in sources]
+
+    workers = min(jobs, len(sources))
+    # spawn, not fork: partitions may be prepared from several threads at once.
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(
+            pool.map(
+                normalize_doc_source,
+                [raw_text for _, raw_text in sources],
+                [ref for ref, _ in sources],
+                chunksize=max(1, len(sources) // (workers * 4)),
+            )
+        )
+
+
+class NormalizationCache:
+    """Normalized pages keyed by a digest of their raw bytes, stored in one JSON file with LRU eviction.
+
+    The digest also covers the ref, since fallback titles and taxonomy depend on it. The whole
+    file is discarded when this script (SYNC_SCRIPT_DIGEST) or TAXONOMY_VERSION changes. Entries
+    are copied in and out, so callers never share their dicts with the cache.
+    """
+
+    FILENAME = "normalized-docs.json"
+
+    def __init__(self, cache_dir: Path, *, max_bytes: int) -> None:
+        self.path = cache_dir / self.FILENAME
+        self.max_bytes = max_bytes
+        self.version = f"source:{SYNC_SCRIPT_DIGEST}|taxonomy:{TAXONOMY_VERSION}"
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        try:
+            payload = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return
+        if isinstance(payload, dict) and payload.get("version") == self.version:
+            entries = payload.get("entries")
+            if isinstance(entries, dict):
+                self._entries = entries
+
+    @staticmethod
+    def key(ref: str, raw: bytes) -> str:
+        digest = hashlib.sha256(ref.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(raw)
+        return digest.hexdigest()
+
+    def peek(self, key: str) -> NormalizedDoc | None:
+        """The entry under a key from key(), without counting a hit or miss or refreshing its LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return self._doc(entry)
+
+    def get(self, ref: str, raw: bytes) -> NormalizedDoc | None:
+        key = self.key(ref, raw)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["used_at"] = time.time()
+            self._dirty = True
+        return self._doc(entry)
+
+    @staticmethod
+    def _doc(entry: dict[str, Any]) -> NormalizedDoc:
+        return NormalizedDoc(
+            content=entry["content"],
+            content_hash=entry["content_hash"],
+            frontmatter=copy.deepcopy(entry["frontmatter"]),
+            taxonomy=copy.deepcopy(entry["taxonomy"]),
+        )
+
+    def put(self, ref: str, raw: bytes, doc: NormalizedDoc) -> None:
+        entry: dict[str, Any] = {
+            "content": doc.content,
+            "content_hash": doc.content_hash,
+            "frontmatter": copy.deepcopy(doc.frontmatter),
+            "taxonomy": copy.deepcopy(doc.taxonomy),
+        }
+        entry["size"] = len(json.dumps(entry))
+        entry["used_at"] = time.time()
+        with self._lock:
+            self._entries[self.key(ref, raw)] = entry
+            self._dirty = True
+
+    def save(self) -> None:
+        """Evict least recently used entries down to max_bytes, then write the cache if it changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            total = sum(int(entry.get("size") or 0) for entry in self._entries.values())
+            for key, entry in sorted(self._entries.items(), key=lambda item: float(item[1].get("used_at") or 0)):
+                if total <= self.max_bytes:
+                    break
+                total -= int(entry.get("size") or 0)
+                del self._entries[key]
+                self.evicted += 1
+            write_json_atomic(self.path, {"version": self.version, "entries": self._entries}, indent=None)
+            self._dirty = False
+            log(
+                f"[INFO] Normalization cache: hits={self.hits} misses={self.misses} evicted={self.evicted} "
+                f"entries={len(self._entries)} size={total / 1024:.0f}KiB"
+            )
+
+
+class LocalDocLoader:
+    """Rebuilds a lazy LocalDoc's normalized page and metadata for one partition's build_local_docs run.
+
+    Pages come from the normalization cache when it still holds them, otherwise they are read
+    and normalized again; a page whose content no longer matches its planned hash is an error.
+    """
+
+    def __init__(
+        self,
+        *,
+        partition: str,
+        docs_base_url: str,
+        repo_name: str,
+        source: str,
+        commit_sha: str,
+        cache: NormalizationCache | None,
+        volatile_metadata_keys: frozenset[str],
+    ) -> None:
+        self.docs_base_url = docs_base_url
+        self.repo_name = repo_name
+        self.source = source
+        self.commit_sha = commit_sha
+        self.cache = cache
+        self.volatile_metadata_keys = volatile_metadata_keys
+        self.visibility = "shared" if partition == "shared_docs" else "tenant"
+        self.tenant_id = partition.removeprefix("tenant_") if partition.startswith("tenant_") else partition
+
+    def metadata(self, ref: str, doc: NormalizedDoc) -> dict[str, Any]:
+        fallback_title = ref.rsplit("/", 1)[-1].replace("-", " ").strip().title() or ref
+        url_path = "/" + ref.lstrip("/")
+        metadata: dict[str, Any] = {
+            "source": self.source,
+            "repo": self.repo_name,
+            "docs_ref": ref,
+            "url_path": url_path,
+            "url_full": self.docs_base_url.rstrip("/") + url_path,
+            "title": doc.frontmatter.get("title", fallback_title),
+            "description": doc.frontmatter.get("description", ""),
+            "content_hash": doc.content_hash,
+            "visibility": self.visibility,
+            "tenant_id": self.tenant_id,
+        }
+        metadata.update(doc.taxonomy)
+        if self.commit_sha:
+            metadata["commit_sha"] = self.commit_sha
+        metadata["metadata_fingerprint"] = metadata_fingerprint(metadata, volatile_keys=self.volatile_metadata_keys)
+        return metadata
+
+    def normalized(self, doc: LocalDoc) -> NormalizedDoc:
+        if self.cache is not None and doc.cache_key:
+            cached = self.cache.peek(doc.cache_key)
+            if cached is not None:
+                return cached
+        rel_path = doc.path.relative_to(REPO_ROOT).as_posix()
+        graph = ImportGraph()
+        graph.add(rel_path, decode_doc_source(doc.path.read_bytes()))
+        normalized = normalize_doc_source(
+            inline_snippet_components(graph.sources[rel_path] or "", graph.components(rel_path)), doc.ref
+        )
+        if normalized.content_hash != doc.content_hash:
+            raise SyncError(f"{doc.ref} changed on disk after it was planned; re-run the sync")
+        return normalized
+
+
+def build_local_docs(
+    *,
+    refs: list[str],
+    partition: str,
     docs_base_url: str,
     repo_name: str,
     source: str,
     commit_sha: str,
+    jobs: int = 1,
+    cache: NormalizationCache | None = None,
+    volatile_metadata_keys: frozenset[str] = DEFAULT_VOLATILE_METADATA_KEYS,
 ) -> list[LocalDoc]:
     docs: list[LocalDoc] = []
+    loader = LocalDocLoader(
+        partition=partition,
+        docs_base_url=docs_base_url,
+        repo_name=repo_name,
+        source=source,
+        commit_sha=commit_sha,
+        cache=cache,
+        volatile_metadata_keys=volatile_metadata_keys,
+    )
 
-    visibility = "shared" if partition == "shared_docs" else "tenant"
-    tenant_id = partition.removeprefix("tenant_") if partition.startswith("tenant_") else partition
-
+    work: list[tuple[str, Path, bytes]] = []
+    graph = ImportGraph()
     for ref in refs:
         path = resolve_ref_path(ref)
         if path is None:
@@ -936,57 +2547,57 @@ def build_local_docs(
         rel_path = path.relative_to(REPO_ROOT)
         if rel_path.parts[0] in {"snippets", "specs"}:
             continue
+        raw = path.read_bytes()
+        graph.add(rel_path.as_posix(), decode_doc_source(raw))
+        # Imported snippets are part of the rendered page, so their bytes are part of its cache key.
+        work.append((ref, path, raw + graph.fingerprint(rel_path.as_posix())))
 
-        raw_text = path.read_text(encoding="utf-8", errors="ignore")
-        fallback_title = ref.rsplit("/", 1)[-1].replace("-", " ").strip().title() or ref
-        content, fm = normalize_doc_text(raw_text, fallback_title)
-
-        content_hash = sha256_text(content)
-
-        url_path = "/" + ref.lstrip("/")
-        url_full = docs_base_url.rstrip("/") + url_path
-
-        taxonomy = derive_taxonomy(
-            ref=ref,
-            title=fm.get("title", fallback_title),
-            description=fm.get("description", ""),
-            frontmatter_tags=fm.get("tags", []),
-        )
-
-        metadata: dict[str, Any] = {
-            "source": source,
-            "repo": repo_name,
-            "docs_ref": ref,
-            "url_path": url_path,
-            "url_full": url_full,
-            "title": fm.get("title", fallback_title),
-            "description": fm.get("description", ""),
-            "content_hash": content_hash,
-            "visibility": visibility,
-            "tenant_id": tenant_id,
-        }
-        metadata.update(taxonomy)
-        if commit_sha:
-            metadata["commit_sha"] = commit_sha
-
-        external_id = f"repo:{repo_name}|partition:{partition}|ref:{ref}"
-        name = ref
-
+    normalized: list[NormalizedDoc | None] = [
+        cache.get(ref, key) if cache is not None else None for ref, _, key in work
+    ]
+    misses = [index for index, doc in enumerate(normalized) if doc is None]
+    sources: list[tuple[str, str]] = []
+    for index in misses:
+        ref, path, _ = work[index]
+        rel_path = path.relative_to(REPO_ROOT).as_posix()
+        sources.append((ref, inline_snippet_components(graph.sources[rel_path] or "", graph.components(rel_path))))
+    fresh = normalize_doc_sources(sources, jobs=jobs)
+    for index, doc in zip(misses, fresh):
+        normalized[index] = doc
+        if cache is not None:
+            cache.put(work[index][0], work[index][2], doc)
+
+    for (ref, path, key), doc in zip(work, normalized):
+        assert doc is not None
+        # Only the fingerprint is kept; content and metadata are rebuilt for docs that get written.
+        fingerprint = loader.metadata(ref, doc)["metadata_fingerprint"]
         docs.append(
             LocalDoc(
                 ref=ref,
                 path=path,
-                name=name,
-                external_id=external_id,
-                content=content,
-                content_hash=content_hash,
-                metadata=metadata,
+                name=ref,
+                external_id=build_external_id(repo_name=repo_name, partition=partition, ref=ref),
+                content_hash=doc.content_hash,
+                metadata_fingerprint=fingerprint,
+                cache_key=NormalizationCache.key(ref, key) if cache is not None else "",
+                loader=loader,
             )
         )
 
     return docs
 
 
+def metadata_fingerprint(metadata: dict[str, Any], *, volatile_keys: frozenset[str]) -> str:
+    """Hash of the managed metadata that should trigger a write (volatile keys excluded)."""
+    return canonical_json_hash(
+        {
+            key: value
+            for key, value in metadata.items()
+            if key in MANAGED_METADATA_KEYS and key not in volatile_keys and key != "metadata_fingerprint"
+        }
+    )
+
+
 def compare_metadata_patch(remote_metadata: dict[str, Any], desired_metadata: dict[str, Any]) -> dict[str, Any]:
     patch: dict[str, Any] = {}
 
@@ -1007,6 +2618,52 @@ def is_managed_remote_doc(doc: dict[str, Any], *, source: str, repo_name: str) -
     return metadata.get("source") == source and metadata.get("repo") == repo_name
 
 
+# Top-level fields of a listed document that planning, the manifest and plan files read.
+REMOTE_DOC_FIELDS = ("id", "external_id", "updated_at")
+
+
+def slim_remote_doc(doc: dict[str, Any]) -> dict[str, Any]:
+    """A listed document cut down to REMOTE_DOC_FIELDS plus its managed metadata keys.
+
+    Large partitions are listed in full on every sync; everything else in the listing
+    (names, statuses, chunk counts, unmanaged metadata) is dropped as each page arrives.
+    """
+    metadata = doc.get("metadata")
+    slim = {key: doc[key] for key in REMOTE_DOC_FIELDS if key in doc}
+    slim["metadata"] = (
+        {key: value for key, value in metadata.items() if key in MANAGED_METADATA_KEYS}
+        if isinstance(metadata, dict)
+        else {}
+    )
+    return slim
+
+
+class RemoteListing:
+    """Running filter over a streamed /documents listing: counts every doc, keeps the managed ones."""
+
+    def __init__(self, *, source: str, repo_name: str) -> None:
+        self.source = source
+        self.repo_name = repo_name
+        self.total = 0
+        self.managed: list[dict[str, Any]] = []
+
+    def add(self, doc: dict[str, Any]) -> bool:
+        self.total += 1
+        if not is_managed_remote_doc(doc, source=self.source, repo_name=self.repo_name):
+            return False
+        self.managed.append(doc)
+        return True
+
+    def stream(self, docs: Iterable[dict[str, Any]]) -> Iterator[dict[str, Any]]:
+        """Yield the managed docs of `docs` as they arrive, recording them along the way."""
+        for doc in docs:
+            if self.add(doc):
+                yield doc
+
+    def log_counts(self, partition: str) -> None:
+        log(f"[INFO] Remote docs in partition '{partition}': total={self.total} managed={len(self.managed)}")
+
+
 def pick_latest_doc(docs: list[dict[str, Any]]) -> tuple[dict[str, Any], list[dict[str, Any]]]:
     def updated_at_key(doc: dict[str, Any]) -> str:
         return str(doc.get("updated_at") or "")
@@ -1015,213 +2672,2932 @@ def pick_latest_doc(docs: list[dict[str, Any]]) -> tuple[dict[str, Any], list[di
     return ordered[0], ordered[1:]
 
 
-def poll_changed_documents(
+@dataclass
+class SyncPlan:
+    create_docs: list[LocalDoc] = field(default_factory=list)
+    update_raw_docs: list[tuple[LocalDoc, dict[str, Any]]] = field(default_factory=list)
+    patch_metadata_docs: list[tuple[LocalDoc, dict[str, Any], dict[str, Any]]] = field(default_factory=list)
+    stale_docs: list[dict[str, Any]] = field(default_factory=list)
+    duplicate_docs: list[dict[str, Any]] = field(default_factory=list)
+    stale_no_external_docs: list[dict[str, Any]] = field(default_factory=list)
+    skipped_no_external: int = 0
+
+    @property
+    def delete_count(self) -> int:
+        return len(self.stale_docs) + len(self.duplicate_docs) + len(self.stale_no_external_docs)
+
+
+def build_sync_plan(
     *,
-    client: RagieClient,
-    partition: str,
-    document_ids: list[str],
-    timeout_seconds: int,
-    interval_seconds: float,
-    allow_indexed: bool,
-) -> None:
-    if not document_ids:
-        return
+    local_docs: list[LocalDoc],
+    managed_remote_docs: Iterable[dict[str, Any]],
+    partial_sync: bool,
+    removed_external_ids: frozenset[str] = frozenset(),
+) -> SyncPlan:
+    """Diff local docs against the managed remote docs.
+
+    managed_remote_docs is consumed once, so a streamed listing is grouped page by page
+    as it arrives; the rest of planning needs every copy of an external_id and runs after.
+    """
+    local_by_external = {doc.external_id: doc for doc in local_docs}
+    local_refs = {doc.ref for doc in local_docs}
+
+    grouped_by_external: dict[str, list[dict[str, Any]]] = {}
+    remote_without_external: list[dict[str, Any]] = []
+    for doc in managed_remote_docs:
+        ext = str(doc.get("external_id") or "").strip()
+        if not ext:
+            remote_without_external.append(doc)
+            continue
+        grouped_by_external.setdefault(ext, []).append(doc)
 
-    success_statuses = {"ready"}
-    if allow_indexed:
-        success_statuses.update({"indexed", "summary_indexed", "keyword_indexed"})
+    plan = SyncPlan()
+    remote_by_external: dict[str, dict[str, Any]] = {}
 
-    pending = set(document_ids)
-    failures: list[tuple[str, list[str]]] = []
-    deadline = time.time() + timeout_seconds
+    for external_id, docs in grouped_by_external.items():
+        keep, dups = pick_latest_doc(docs)
+        remote_by_external[external_id] = keep
+        plan.duplicate_docs.extend(dups)
 
-    while pending and time.time() < deadline:
-        for document_id in list(pending):
-            doc = client.get_document(partition=partition, document_id=document_id)
-            status = str(doc.get("status") or "").strip().lower()
-            if status in success_statuses:
-                pending.remove(document_id)
-                continue
-            if status in TERMINAL_FAILURE_STATUSES:
-                pending.remove(document_id)
-                errors = doc.get("errors") or []
-                if not isinstance(errors, list):
-                    errors = [str(errors)]
-                failures.append((document_id, [str(e) for e in errors]))
+    for external_id, local in local_by_external.items():
+        remote = remote_by_external.get(external_id)
+        if remote is None:
+            plan.create_docs.append(local)
+            continue
 
-        if pending:
-            time.sleep(interval_seconds)
+        remote_metadata = remote.get("metadata") or {}
+        if not isinstance(remote_metadata, dict):
+            remote_metadata = {}
 
-    if pending:
-        waiting = ", ".join(sorted(pending))
-        raise SyncError(
-            f"Timed out waiting for Ragie documents to finish indexing in partition '{partition}': {waiting}"
-        )
+        fingerprint = local.metadata_fingerprint
+        if fingerprint and remote_metadata.get("metadata_fingerprint") == fingerprint:
+            # Content and every non-volatile managed key match what we last wrote.
+            continue
 
-    if failures:
-        details = "; ".join(
-            f"{doc_id}: {', '.join(errs) if errs else 'unknown error'}" for doc_id, errs in failures
-        )
-        raise SyncError(f"One or more Ragie documents failed indexing: {details}")
+        metadata_patch = compare_metadata_patch(remote_metadata, local.metadata)
+        remote_hash = str(remote_metadata.get("content_hash") or "")
+        needs_raw_update = remote_hash != local.content_hash
 
+        if needs_raw_update:
+            plan.update_raw_docs.append((local, remote))
 
-def _json_equal(left: Any, right: Any) -> bool:
-    return json.dumps(left, sort_keys=True, separators=(",", ":"), ensure_ascii=True) == json.dumps(
-        right,
-        sort_keys=True,
-        separators=(",", ":"),
-        ensure_ascii=True,
-    )
+        if metadata_patch:
+            plan.patch_metadata_docs.append((local, remote, metadata_patch))
 
+    if not partial_sync:
+        stale_external_ids = sorted(set(remote_by_external.keys()) - set(local_by_external.keys()))
+        plan.stale_docs = [remote_by_external[eid] for eid in stale_external_ids]
 
-def ensure_partition_configuration(
-    *,
-    client: RagieClient,
-    partition: str,
-    description: str,
-    metadata_schema: dict[str, Any],
-    dry_run: bool,
-) -> None:
-    partitions = client.list_partitions()
-    exists = any(str(item.get("name") or "") == partition for item in partitions)
+        for doc in remote_without_external:
+            metadata = doc.get("metadata") or {}
+            docs_ref = str(metadata.get("docs_ref") or "").strip()
+            if docs_ref and docs_ref not in local_refs:
+                plan.stale_no_external_docs.append(doc)
+            else:
+                plan.skipped_no_external += 1
+    else:
+        # In partial mode, only clean duplicates for targeted external_ids and
+        # delete docs whose source files were explicitly removed.
+        targeted = set(local_by_external) | removed_external_ids
+        plan.duplicate_docs = [
+            doc for doc in plan.duplicate_docs if str(doc.get("external_id") or "") in targeted
+        ]
+        plan.stale_docs = [
+            remote_by_external[eid]
+            for eid in sorted(removed_external_ids)
+            if eid in remote_by_external and eid not in local_by_external
+        ]
 
-    if not exists:
-        if dry_run:
-            log(f"[DRY-RUN] CREATE_PARTITION {partition}")
-        else:
-            client.create_partition(
-                name=partition,
-                description=description,
-                metadata_schema=metadata_schema,
-            )
-            log(f"[PARTITION_CREATE] {partition}")
+    return plan
 
-    if dry_run and not exists:
-        log(f"[DRY-RUN] PATCH_PARTITION {partition} keys=[context_aware,description,metadata_schema]")
-        return
 
-    detail = client.get_partition(partition_id=partition)
-    patch: dict[str, Any] = {}
+@dataclass(frozen=True)
+class SyncOperation:
+    """One planned write against Ragie. `key` groups operations that must run in order."""
 
-    if detail.get("context_aware") is not True:
-        patch["context_aware"] = True
-    if description and str(detail.get("description") or "") != description:
-        patch["description"] = description
-    if not _json_equal(detail.get("metadata_schema"), metadata_schema):
-        patch["metadata_schema"] = metadata_schema
+    kind: str
+    key: str
+    doc_id: str = ""
+    local: LocalDoc | None = None
+    metadata_patch: dict[str, Any] | None = None
 
-    if not patch:
-        log(f"[INFO] Partition '{partition}' already configured for context-aware retrieval")
-        return
 
-    if dry_run:
-        keys = ",".join(sorted(patch.keys()))
-        log(f"[DRY-RUN] PATCH_PARTITION {partition} keys=[{keys}]")
-        return
+DELETE_OPERATION_KINDS = ("DELETE_STALE", "DELETE_DUPLICATE", "DELETE_STALE_NO_EXTERNAL")
 
-    # Ragie currently rejects context_aware + description in the same PATCH payload.
-    # Apply in two steps when both are needed.
-    non_context_patch = {
-        key: patch[key]
-        for key in ("description", "metadata_schema")
-        if key in patch
-    }
-    if non_context_patch:
-        client.update_partition(
-            partition_id=partition,
-            description=non_context_patch.get("description"),
-            metadata_schema=non_context_patch.get("metadata_schema"),
+
+def plan_operations(plan: SyncPlan) -> list[SyncOperation]:
+    """Operations for a plan. A doc whose content and metadata both changed gets one REPLACE."""
+    operations: list[SyncOperation] = []
+
+    for local in plan.create_docs:
+        operations.append(SyncOperation(kind="CREATE", key=local.external_id, local=local))
+
+    unmerged_patches = {local.external_id: metadata_patch for local, _, metadata_patch in plan.patch_metadata_docs}
+    for local, remote in plan.update_raw_docs:
+        doc_id = str(remote.get("id") or "")
+        metadata_patch = unmerged_patches.pop(local.external_id, None)
+        if metadata_patch is None:
+            operations.append(
+                SyncOperation(kind="UPDATE_RAW", key=doc_id or local.external_id, doc_id=doc_id, local=local)
+            )
+            continue
+        operations.append(
+            SyncOperation(
+                kind="REPLACE",
+                key=doc_id or local.external_id,
+                doc_id=doc_id,
+                local=local,
+                metadata_patch=metadata_patch,
+            )
         )
-        keys = ",".join(sorted(non_context_patch.keys()))
-        log(f"[PARTITION_PATCH] {partition} keys=[{keys}]")
 
-    if "context_aware" in patch:
-        client.update_partition(
-            partition_id=partition,
-            context_aware=bool(patch["context_aware"]),
+    for local, remote, metadata_patch in plan.patch_metadata_docs:
+        if local.external_id not in unmerged_patches:
+            continue
+        doc_id = str(remote.get("id") or "")
+        operations.append(
+            SyncOperation(
+                kind="PATCH_METADATA",
+                key=doc_id or local.external_id,
+                doc_id=doc_id,
+                local=local,
+                metadata_patch=metadata_patch,
+            )
         )
-        log(f"[PARTITION_PATCH] {partition} keys=[context_aware]")
 
+    for kind, docs in zip(DELETE_OPERATION_KINDS, (plan.stale_docs, plan.duplicate_docs, plan.stale_no_external_docs)):
+        for doc in docs:
+            doc_id = str(doc.get("id") or "")
+            if not doc_id:
+                continue
+            operations.append(SyncOperation(kind=kind, key=doc_id, doc_id=doc_id))
 
-def ensure_entity_instruction(
-    *,
-    client: RagieClient,
-    partition: str,
-    source: str,
-    repo_name: str,
-    instruction_name: str,
-    scope: str,
-    dry_run: bool,
-) -> bool:
-    expected_payload: dict[str, Any] = {
-        "name": instruction_name,
-        "active": True,
-        "scope": scope,
-        "prompt": DEFAULT_ENTITY_INSTRUCTION_PROMPT,
-        "entity_schema": build_entity_schema(),
-        "filter": {
-            "source": {"$eq": source},
-            "repo": {"$eq": repo_name},
-        },
-        "partition": partition,
-    }
+    return operations
 
-    instructions = client.list_instructions()
-    matches = [inst for inst in instructions if str(inst.get("name") or "") == instruction_name]
 
-    if not matches:
-        if dry_run:
-            log(f"[DRY-RUN] CREATE_INSTRUCTION {instruction_name} partition={partition}")
-            return False
-        created = client.create_instruction(payload=expected_payload)
-        log(f"[INSTRUCTION_CREATE] {instruction_name} id={created.get('id')}")
-        return True
+def plan_write_calls(operations: list[SyncOperation]) -> tuple[int, int]:
+    """(API write calls the operations issue, calls saved against an UPDATE_RAW plus a PATCH_METADATA per REPLACE)."""
+    calls = saved = 0
+    for operation in operations:
+        issued = 1 + bool(operation.metadata_patch) if operation.kind == "REPLACE" else 1
+        calls += issued
+        saved += 2 - issued if operation.kind == "REPLACE" else 0
+    return calls, saved
 
-    instruction = matches[0]
-    if len(matches) > 1:
-        log(f"[WARN] Multiple instructions found for name '{instruction_name}', using newest by API order")
 
-    instruction_id = str(instruction.get("id") or "")
-    if not bool(instruction.get("active")):
+def group_operation_chains(operations: list[SyncOperation]) -> list[list[SyncOperation]]:
+    """Group operations by key, keeping plan order within (and across) groups."""
+    chains: dict[str, list[SyncOperation]] = {}
+    for operation in operations:
+        chains.setdefault(operation.key, []).append(operation)
+    return list(chains.values())
+
+
+def apply_operation(*, client: RagieClient, partition: str, operation: SyncOperation) -> str | None:
+    """Execute one operation. Returns the document id when ingestion must be polled."""
+    local = operation.local
+
+    if operation.kind == "CREATE":
+        assert local is not None
+        response = client.create_document_raw(
+            partition=partition,
+            name=local.name,
+            external_id=local.external_id,
+            metadata=local.metadata,
+            data=local.content,
+        )
+        doc_id = str(response.get("id") or "")
+        if not doc_id:
+            raise SyncError(f"Create returned no document id for {local.ref}")
+        log(f"[CREATE] {local.ref} -> {doc_id}")
+        return doc_id
+
+    if operation.kind == "UPDATE_RAW":
+        assert local is not None
+        if not operation.doc_id:
+            raise SyncError(f"Remote document missing id for update: {local.ref}")
+        client.update_document_raw(partition=partition, document_id=operation.doc_id, data=local.content)
+        log(f"[UPDATE_RAW] {local.ref} -> {operation.doc_id}")
+        return operation.doc_id
+
+    if operation.kind == "REPLACE":
+        assert local is not None
+        if not operation.doc_id:
+            raise SyncError(f"Remote document missing id for replace: {local.ref}")
+        # Raw update first: the patch carries content_hash and metadata_fingerprint, so a run killed
+        # between the two leaves the old hash on the remote and the doc is planned again (or resumed).
+        client.update_document_raw(partition=partition, document_id=operation.doc_id, data=local.content)
+        if operation.metadata_patch:
+            client.patch_document_metadata(
+                partition=partition, document_id=operation.doc_id, metadata_patch=operation.metadata_patch
+            )
+        log(f"[REPLACE] {local.ref} -> {operation.doc_id}")
+        return operation.doc_id
+
+    if operation.kind == "PATCH_METADATA":
+        assert local is not None
+        if not operation.doc_id:
+            raise SyncError(f"Remote document missing id for metadata patch: {local.ref}")
+        client.patch_document_metadata(
+            partition=partition,
+            document_id=operation.doc_id,
+            metadata_patch=operation.metadata_patch or {},
+        )
+        log(f"[PATCH_METADATA] {local.ref} -> {operation.doc_id}")
+        return None
+
+    if operation.kind in DELETE_OPERATION_KINDS:
+        client.delete_document(partition=partition, document_id=operation.doc_id, async_delete=True)
+        log(f"[{operation.kind}] doc_id={operation.doc_id}")
+        return None
+
+    raise SyncError(f"Unknown sync operation kind '{operation.kind}'")
+
+
+AppliedOperation = tuple[SyncOperation, "str | None"]
+
+
+def changed_document_ids_of(applied: list[AppliedOperation]) -> list[str]:
+    """Document ids whose ingestion must be polled after the given operations."""
+    return sorted({doc_id for _, doc_id in applied if doc_id})
+
+
+class OperationJournal:
+    """Append-only write-ahead log of one partition's writes, fsync'd record by record.
+
+    A run records its plan before the first write, then an intent before and an outcome after
+    every operation. The file is removed once the state file is written, so one left behind
+    means the run died part-way; --resume replays it to skip writes that already completed.
+    """
+
+    def __init__(self, path: Path, *, context: dict[str, Any] | None = None) -> None:
+        self.path = path
+        self.context = context or {}
+        self.header: dict[str, Any] | None = None
+        self.completed: dict[str, str] = {}
+        self.in_doubt: set[str] = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def operation_id(operation: SyncOperation) -> str:
+        return f"{operation.kind}:{operation.key}"
+
+    @classmethod
+    def load(cls, path: Path) -> OperationJournal | None:
+        """The unfinished journal at `path`, or None when there is nothing to resume."""
+        try:
+            lines = path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return None
+        journal = cls(path)
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # torn final append from the crash
+            event = record.get("event")
+            if event == "begin":
+                journal.header = record
+            elif event == "intent":
+                journal.in_doubt.add(record["op"])
+            elif event == "done":
+                journal.in_doubt.discard(record["op"])
+                journal.completed[record["op"]] = str(record.get("doc_id") or "")
+        if journal.header is None:
+            return None
+        journal.context = {key: journal.header.get(key) for key in ("partition", "commit_sha", "source", "repo")}
+        return journal
+
+    def _append(self, record: dict[str, Any], *, truncate: bool = False) -> None:
+        line = json.dumps(record, separators=(",", ":"), ensure_ascii=True) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("w" if truncate else "a", encoding="utf-8") as handle:
+                handle.write(line)
+                handle.flush()
+                os.fsync(handle.fileno())
+            if truncate:
+                _fsync_directory(self.path.parent)
+
+    def start(self, result: SyncResult, *, options: SyncOptions) -> tuple[list[AppliedOperation], list[SyncOperation]]:
+        """Record the plan (or the resumption of a journaled one); returns (already applied, still to run)."""
+        operations = plan_operations(result.plan)
+        if self.header is None:
+            self.header = {
+                "event": "begin",
+                **self.context,
+                "partial_sync": options.partial_sync,
+                "incremental_base": options.incremental_base,
+                "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "manifest": manifest_from_remote_docs(result.managed_remote_docs),
+                "plan": sync_plan_to_json(result.plan),
+            }
+            self._append(self.header, truncate=True)
+            return [], operations
+
+        applied: list[AppliedOperation] = []
+        pending: list[SyncOperation] = []
+        for operation in operations:
+            operation_id = self.operation_id(operation)
+            if operation_id in self.completed:
+                applied.append((operation, self.completed[operation_id] or None))
+            else:
+                pending.append(operation)
+        log(
+            f"[INFO] Resuming journaled sync from {self.header.get('started_at') or '?'}: "
+            f"completed={len(applied)} pending={len(pending)} in_doubt={len(self.in_doubt)}"
+        )
+        if self.in_doubt:
+            log(
+                f"[WARN] {len(self.in_doubt)} write(s) were in flight when the run stopped and will be re-issued "
+                "(a re-issued create can leave a duplicate, removed by the next full sync)"
+            )
+        self._append({"event": "resume", "at": datetime.now(timezone.utc).isoformat(timespec="seconds")})
+        return applied, pending
+
+    def intent(self, operation: SyncOperation) -> None:
+        self._append({"event": "intent", "op": self.operation_id(operation)})
+
+    def done(self, operation: SyncOperation, doc_id: str | None) -> None:
+        self._append({"event": "done", "op": self.operation_id(operation), "doc_id": doc_id or ""})
+
+    def complete(self) -> None:
+        """Drop the journal once its outcome is captured in the state file."""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+
+
+def _fsync_directory(path: Path) -> None:
+    """Persist a newly created directory entry (no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _run_operation_chain(
+    *,
+    client: RagieClient,
+    partition: str,
+    chain: list[SyncOperation],
+    abort: threading.Event,
+    slots: threading.Semaphore | None = None,
+    tracker: IngestionTracker | None = None,
+    journal: OperationJournal | None = None,
+) -> list[AppliedOperation]:
+    applied: list[AppliedOperation] = []
+    with slots if slots is not None else nullcontext():
+        for operation in chain:
+            if abort.is_set():
+                break
+            if journal is not None:
+                journal.intent(operation)
+            doc_id = apply_operation(client=client, partition=partition, operation=operation)
+            if journal is not None:
+                journal.done(operation, doc_id)
+            if tracker is not None:
+                tracker.track(operation, doc_id)
+            applied.append((operation, doc_id))
+    return applied
+
+
+def execute_operations(
+    *,
+    client: RagieClient,
+    partition: str,
+    operations: list[SyncOperation],
+    concurrency: int,
+    slots: threading.Semaphore | None = None,
+    tracker: IngestionTracker | None = None,
+    journal: OperationJournal | None = None,
+) -> list[AppliedOperation]:
+    """Run planned operations on a bounded worker pool.
+
+    Operations sharing a key (the same remote document) run sequentially in plan order,
+    so a raw update always lands before its metadata patch. The first failure stops
+    new work from starting and is re-raised. `slots`, when given, caps in-flight chains
+    across every caller sharing it (e.g. all partitions of one run); `tracker`, when
+    given, starts tracking each document's ingestion as soon as its write returns;
+    `journal`, when given, records every write before it is issued and after it returns.
+    Returns each applied operation with the document id to poll (None when ingestion
+    is not re-triggered).
+    """
+    chains = group_operation_chains(operations)
+    abort = threading.Event()
+    applied: list[AppliedOperation] = []
+
+    if concurrency <= 1:
+        for chain in chains:
+            applied.extend(
+                _run_operation_chain(
+                    client=client,
+                    partition=partition,
+                    chain=chain,
+                    abort=abort,
+                    slots=slots,
+                    tracker=tracker,
+                    journal=journal,
+                )
+            )
+        return applied
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ragie-sync")
+    try:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _run_operation_chain,
+                client=client,
+                partition=partition,
+                chain=chain,
+                abort=abort,
+                slots=slots,
+                tracker=tracker,
+                journal=journal,
+            )
+            for chain in chains
+        ]
+        # Results are merged on this thread only, so no shared mutable state crosses workers.
+        for future in as_completed(futures):
+            applied.extend(future.result())
+    except BaseException:
+        abort.set()
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    return applied
+
+
+def next_poll_delay(status: str, *, interval: float, unchanged_polls: int) -> float:
+    """Seconds until a document is polled again.
+
+    Documents early in Ragie's ingestion pipeline are polled rarely (2x interval) and
+    ones close to `ready` often (interval/4). Each poll that sees no progress stretches
+    the delay by 1.5x, capped at 4x interval.
+    """
+    if status in INGESTION_STAGES:
+        remaining = 1 - INGESTION_STAGES.index(status) / (len(INGESTION_STAGES) - 1)
+    else:
+        remaining = 1.0
+    delay = interval * (0.25 + 1.75 * remaining) * (1.5 ** unchanged_polls)
+    return min(delay, interval * 4)
+
+
+@dataclass
+class IngestionRecord:
+    document_id: str
+    label: str
+    submitted_at: float
+    next_poll_at: float
+    status: str = ""
+    polls: int = 0
+    unchanged_polls: int = 0
+    finished_at: float | None = None
+    errors: list[str] = field(default_factory=list)
+
+
+class IngestionTracker:
+    """Ingestion status of changed documents: which are due for a poll, and how long each took.
+
+    Transport-agnostic; poll_changed_documents and async_poll_changed_documents drive it.
+    """
+
+    def __init__(
+        self,
+        *,
+        partition: str,
+        interval_seconds: float,
+        allow_indexed: bool,
+        clock: Any = time.monotonic,
+    ) -> None:
+        self.partition = partition
+        self.interval_seconds = interval_seconds
+        self.success_statuses = {"ready"}
+        if allow_indexed:
+            self.success_statuses.update({"indexed", "summary_indexed", "keyword_indexed"})
+        self.clock = clock
+        self.records: dict[str, IngestionRecord] = {}
+        self._lock = threading.Lock()
+
+    def add(self, document_id: str, *, label: str = "") -> None:
+        now = self.clock()
+        with self._lock:
+            if document_id in self.records:
+                return
+            self.records[document_id] = IngestionRecord(
+                document_id=document_id,
+                label=label,
+                submitted_at=now,
+                next_poll_at=now + self.interval_seconds,
+            )
+
+    def track(self, operation: SyncOperation, document_id: str | None) -> None:
+        """Start tracking a write that re-triggered ingestion."""
+        if document_id:
+            self.add(document_id, label=operation.local.ref if operation.local is not None else "")
+
+    @property
+    def pending(self) -> list[IngestionRecord]:
+        with self._lock:
+            return [record for record in self.records.values() if record.finished_at is None]
+
+    def due(self) -> list[IngestionRecord]:
+        now = self.clock()
+        return sorted(
+            (record for record in self.pending if record.next_poll_at <= now),
+            key=lambda record: record.next_poll_at,
+        )
+
+    def seconds_until_due(self) -> float:
+        pending = self.pending
+        if not pending:
+            return 0.0
+        return max(0.0, min(record.next_poll_at for record in pending) - self.clock())
+
+    def observe(self, record: IngestionRecord, doc: dict[str, Any]) -> None:
+        """Record one status response; logs as soon as a document finishes."""
+        now = self.clock()
+        status = str(doc.get("status") or "").strip().lower()
+        name = f"{record.label} ({record.document_id})" if record.label else record.document_id
+        with self._lock:
+            record.polls += 1
+            record.unchanged_polls = record.unchanged_polls + 1 if status == record.status else 0
+            record.status = status
+            if status in self.success_statuses or status in TERMINAL_FAILURE_STATUSES:
+                record.finished_at = now
+            else:
+                record.next_poll_at = now + next_poll_delay(
+                    status, interval=self.interval_seconds, unchanged_polls=record.unchanged_polls
+                )
+                return
+
+        elapsed = now - record.submitted_at
+        if status in self.success_statuses:
+            log(f"[READY] {name} status={status} after {elapsed:.1f}s ({record.polls} polls)")
+            return
+        errors = doc.get("errors") or []
+        if not isinstance(errors, list):
+            errors = [str(errors)]
+        record.errors = [str(e) for e in errors]
+        log(f"[FAILED] {name} after {elapsed:.1f}s: {', '.join(record.errors) or 'unknown error'}")
+
+    @property
+    def time_to_ready(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                record.document_id: round(record.finished_at - record.submitted_at, 3)
+                for record in self.records.values()
+                if record.finished_at is not None and record.status in self.success_statuses
+            }
+
+    def finish(self) -> None:
+        """Log timing stats, then raise for timed-out or failed documents."""
+        timings = sorted(self.time_to_ready.values())
+        if timings:
+            log(
+                f"[INFO] Time to ready: docs={len(timings)} "
+                f"p50={_quantile(timings, 0.5):.1f}s p90={_quantile(timings, 0.9):.1f}s max={timings[-1]:.1f}s"
+            )
+
+        pending = self.pending
+        if pending:
+            waiting = ", ".join(sorted(record.document_id for record in pending))
+            raise SyncError(
+                f"Timed out waiting for Ragie documents to finish indexing in partition '{self.partition}': {waiting}"
+            )
+
+        failures = [record for record in self.records.values() if record.status in TERMINAL_FAILURE_STATUSES]
+        if failures:
+            details = "; ".join(
+                f"{record.document_id}: {', '.join(record.errors) if record.errors else 'unknown error'}"
+                for record in failures
+            )
+            raise SyncError(f"One or more Ragie documents failed indexing: {details}")
+
+
+def run_ingestion_polling(
+    *,
+    client: RagieClient,
+    tracker: IngestionTracker,
+    timeout_seconds: float,
+    concurrency: int,
+    writes_done: threading.Event | None = None,
+    stop: threading.Event | None = None,
+) -> None:
+    """Poll the tracker's due docs on up to `concurrency` threads until none are pending.
+
+    With `writes_done`, docs keep arriving while writes run and the timeout only starts
+    counting once the event is set, so pipelining never shortens the indexing budget.
+    `stop` ends polling early (set when the writes failed).
+    """
+    clock = tracker.clock
+    deadline = clock() + timeout_seconds if writes_done is None else None
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="ragie-poll") as executor:
+        while stop is None or not stop.is_set():
+            writing = writes_done is not None and not writes_done.is_set()
+            if deadline is None and not writing:
+                deadline = clock() + timeout_seconds
+            if not writing and not tracker.pending:
+                return
+            if deadline is not None and clock() >= deadline:
+                return
+
+            wait = tracker.seconds_until_due() if tracker.pending else tracker.interval_seconds
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - clock()))
+            if writing:
+                writes_done.wait(wait)
+            else:
+                time.sleep(wait)
+
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run,
+                    client.get_document,
+                    partition=tracker.partition,
+                    document_id=record.document_id,
+                ): record
+                for record in tracker.due()
+            }
+            for future in as_completed(futures):
+                tracker.observe(futures[future], future.result())
+
+
+def poll_changed_documents(
+    *,
+    client: RagieClient,
+    partition: str,
+    document_ids: list[str],
+    timeout_seconds: int,
+    interval_seconds: float,
+    allow_indexed: bool,
+    concurrency: int = 8,
+    labels: dict[str, str] | None = None,
+) -> IngestionTracker:
+    """Poll changed docs until each is ready or failed, checking due docs on up to `concurrency` threads."""
+    tracker = IngestionTracker(partition=partition, interval_seconds=interval_seconds, allow_indexed=allow_indexed)
+    labels = labels or {}
+    for document_id in document_ids:
+        tracker.add(document_id, label=labels.get(document_id, ""))
+    if document_ids:
+        run_ingestion_polling(client=client, tracker=tracker, timeout_seconds=timeout_seconds, concurrency=concurrency)
+    tracker.finish()
+    return tracker
+
+
+async def async_apply_operation(*, client: AsyncRagieClient, partition: str, operation: SyncOperation) -> str | None:
+    """asyncio counterpart of apply_operation."""
+    local = operation.local
+
+    if operation.kind == "CREATE":
+        assert local is not None
+        response = await client.create_document_raw(
+            partition=partition,
+            name=local.name,
+            external_id=local.external_id,
+            metadata=local.metadata,
+            data=local.content,
+        )
+        doc_id = str(response.get("id") or "")
+        if not doc_id:
+            raise SyncError(f"Create returned no document id for {local.ref}")
+        log(f"[CREATE] {local.ref} -> {doc_id}")
+        return doc_id
+
+    if operation.kind == "UPDATE_RAW":
+        assert local is not None
+        if not operation.doc_id:
+            raise SyncError(f"Remote document missing id for update: {local.ref}")
+        await client.update_document_raw(partition=partition, document_id=operation.doc_id, data=local.content)
+        log(f"[UPDATE_RAW] {local.ref} -> {operation.doc_id}")
+        return operation.doc_id
+
+    if operation.kind == "REPLACE":
+        assert local is not None
+        if not operation.doc_id:
+            raise SyncError(f"Remote document missing id for replace: {local.ref}")
+        await client.update_document_raw(partition=partition, document_id=operation.doc_id, data=local.content)
+        if operation.metadata_patch:
+            await client.patch_document_metadata(
+                partition=partition, document_id=operation.doc_id, metadata_patch=operation.metadata_patch
+            )
+        log(f"[REPLACE] {local.ref} -> {operation.doc_id}")
+        return operation.doc_id
+
+    if operation.kind == "PATCH_METADATA":
+        assert local is not None
+        if not operation.doc_id:
+            raise SyncError(f"Remote document missing id for metadata patch: {local.ref}")
+        await client.patch_document_metadata(
+            partition=partition,
+            document_id=operation.doc_id,
+            metadata_patch=operation.metadata_patch or {},
+        )
+        log(f"[PATCH_METADATA] {local.ref} -> {operation.doc_id}")
+        return None
+
+    if operation.kind in DELETE_OPERATION_KINDS:
+        await client.delete_document(partition=partition, document_id=operation.doc_id, async_delete=True)
+        log(f"[{operation.kind}] doc_id={operation.doc_id}")
+        return None
+
+    raise SyncError(f"Unknown sync operation kind '{operation.kind}'")
+
+
+async def _gather_fail_fast(coroutines: list[Any]) -> list[Any]:
+    """Run coroutines concurrently; on the first failure cancel the rest and re-raise it."""
+    tasks = [asyncio.ensure_future(coro) for coro in coroutines]
+    if not tasks:
+        return []
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()  # type: ignore[misc]
+        return [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def async_execute_operations(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    operations: list[SyncOperation],
+    concurrency: int,
+    slots: asyncio.Semaphore | None = None,
+    tracker: IngestionTracker | None = None,
+    journal: OperationJournal | None = None,
+) -> list[AppliedOperation]:
+    """asyncio counterpart of execute_operations, with the same ordering and fail-fast rules."""
+    if slots is None:
+        slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_chain(chain: list[SyncOperation]) -> list[AppliedOperation]:
+        applied: list[AppliedOperation] = []
+        async with slots:
+            for operation in chain:
+                if journal is not None:
+                    journal.intent(operation)
+                doc_id = await async_apply_operation(client=client, partition=partition, operation=operation)
+                if journal is not None:
+                    journal.done(operation, doc_id)
+                if tracker is not None:
+                    tracker.track(operation, doc_id)
+                applied.append((operation, doc_id))
+        return applied
+
+    results = await _gather_fail_fast([run_chain(chain) for chain in group_operation_chains(operations)])
+    return [item for applied in results for item in applied]
+
+
+async def async_run_delete_stage(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    operations: list[SyncOperation],
+    options: SyncOptions,
+    stats: DeleteStats,
+    slots: asyncio.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+) -> list[AppliedOperation]:
+    """asyncio counterpart of run_delete_stage."""
+    stats.requested += len(operations)
+    stats.concurrency = options.delete_concurrency or options.concurrency
+    if not operations:
+        return []
+    started = time.monotonic()
+    with timed_phase("deletes", partition=partition):
+        applied = await async_execute_operations(
+            client=client,
+            partition=partition,
+            operations=operations,
+            concurrency=stats.concurrency,
+            slots=None if options.delete_concurrency else slots,
+            journal=journal,
+        )
+    seconds = time.monotonic() - started
+    stats.deleted += len(applied)
+    stats.seconds += seconds
+    _log_delete_stage(stats, issued=len(applied), seconds=seconds)
+    return applied
+
+
+async def async_verify_deletions(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    applied: list[AppliedOperation],
+    stats: DeleteStats,
+) -> None:
+    """asyncio counterpart of verify_deletions."""
+    deleted = deleted_document_ids(applied)
+    if not deleted:
+        stats.unconfirmed = []
+        return
+    with timed_phase("verify_deletes", partition=partition):
+        listed = [doc["id"] async for doc in client.iter_documents(partition=partition) if doc.get("id") in deleted]
+    remaining = sorted(listed)
+    _record_delete_verification(stats, remaining, partition=partition, checked=len(deleted))
+
+
+async def async_run_ingestion_polling(
+    *,
+    client: AsyncRagieClient,
+    tracker: IngestionTracker,
+    timeout_seconds: float,
+    concurrency: int,
+    writes_done: asyncio.Event | None = None,
+) -> None:
+    """asyncio counterpart of run_ingestion_polling."""
+    clock = tracker.clock
+    deadline = clock() + timeout_seconds if writes_done is None else None
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(record: IngestionRecord) -> tuple[IngestionRecord, dict[str, Any]]:
+        async with slots:
+            return record, await client.get_document(partition=tracker.partition, document_id=record.document_id)
+
+    while True:
+        writing = writes_done is not None and not writes_done.is_set()
+        if deadline is None and not writing:
+            deadline = clock() + timeout_seconds
+        if not writing and not tracker.pending:
+            return
+        if deadline is not None and clock() >= deadline:
+            return
+
+        wait = tracker.seconds_until_due() if tracker.pending else tracker.interval_seconds
+        if deadline is not None:
+            wait = min(wait, max(0.0, deadline - clock()))
+        if writing:
+            try:
+                await asyncio.wait_for(writes_done.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await asyncio.sleep(wait)
+
+        tasks = [asyncio.ensure_future(fetch(record)) for record in tracker.due()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                tracker.observe(*await next_done)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def async_poll_changed_documents(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    document_ids: list[str],
+    timeout_seconds: int,
+    interval_seconds: float,
+    allow_indexed: bool,
+    concurrency: int,
+    labels: dict[str, str] | None = None,
+) -> IngestionTracker:
+    """asyncio counterpart of poll_changed_documents."""
+    tracker = IngestionTracker(partition=partition, interval_seconds=interval_seconds, allow_indexed=allow_indexed)
+    labels = labels or {}
+    for document_id in document_ids:
+        tracker.add(document_id, label=labels.get(document_id, ""))
+    if document_ids:
+        await async_run_ingestion_polling(
+            client=client, tracker=tracker, timeout_seconds=timeout_seconds, concurrency=concurrency
+        )
+    tracker.finish()
+    return tracker
+
+
+@dataclass(frozen=True)
+class SyncOptions:
+    source: str
+    repo_name: str
+    partial_sync: bool
+    dry_run: bool
+    concurrency: int
+    poll_timeout: int
+    poll_interval: float
+    allow_indexed: bool
+    incremental_base: str = ""
+    poll_concurrency: int = 8
+    pipeline_polling: bool = False
+    # 0 = deletes share `concurrency` and the run-wide write slots.
+    delete_concurrency: int = 0
+    verify_deletes: bool = False
+
+
+@dataclass
+class DeleteStats:
+    """Throughput of one partition's delete stage, and what the verification pass still saw listed."""
+
+    requested: int = 0
+    deleted: int = 0
+    concurrency: int = 0
+    seconds: float = 0.0
+    # None until a verification pass runs.
+    unconfirmed: list[str] | None = None
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "requested": self.requested,
+            "deleted": self.deleted,
+            "concurrency": self.concurrency,
+            "seconds": round(self.seconds, 3),
+            "per_second": round(self.deleted / self.seconds, 1) if self.seconds > 0 else None,
+            "verified": self.unconfirmed is not None,
+            "unconfirmed": len(self.unconfirmed or []),
+        }
+
+
+@dataclass
+class SyncResult:
+    managed_remote_docs: list[dict[str, Any]]
+    plan: SyncPlan
+    applied: list[AppliedOperation] = field(default_factory=list)
+    time_to_ready: dict[str, float] = field(default_factory=dict)
+    deletes: DeleteStats = field(default_factory=DeleteStats)
+
+    @property
+    def changed_document_ids(self) -> list[str]:
+        return changed_document_ids_of(self.applied)
+
+    @property
+    def document_labels(self) -> dict[str, str]:
+        return {doc_id: op.local.ref for op, doc_id in self.applied if doc_id and op.local is not None}
+
+
+def filter_managed_remote_docs(
+    remote_docs_all: list[dict[str, Any]],
+    *,
+    partition: str,
+    options: SyncOptions,
+) -> list[dict[str, Any]]:
+    listing = RemoteListing(source=options.source, repo_name=options.repo_name)
+    for doc in remote_docs_all:
+        listing.add(doc)
+    listing.log_counts(partition)
+    return listing.managed
+
+
+def log_sync_plan(plan: SyncPlan, *, options: SyncOptions) -> None:
+    log(
+        "[INFO] Plan: "
+        f"create={len(plan.create_docs)} "
+        f"update_raw={len(plan.update_raw_docs)} "
+        f"patch_metadata={len(plan.patch_metadata_docs)} "
+        f"delete_stale={len(plan.stale_docs)} "
+        f"delete_duplicates={len(plan.duplicate_docs)} "
+        f"delete_stale_no_external={len(plan.stale_no_external_docs)}"
+    )
+    operations = plan_operations(plan)
+    replaces = sum(1 for operation in operations if operation.kind == "REPLACE")
+    if replaces:
+        calls, saved = plan_write_calls(operations)
+        log(
+            f"[INFO] Replacing {replaces} doc(s) whose content and metadata both changed: "
+            f"write_calls={calls} saved={saved}"
+        )
+    if options.incremental_base:
+        log(f"[INFO] Incremental sync since {options.incremental_base} (stale deletion limited to removed refs)")
+    elif options.partial_sync:
+        log("[INFO] Partial sync mode enabled via --doc-ref (stale deletion disabled)")
+    if plan.skipped_no_external:
+        log(f"[WARN] Managed docs without external_id kept (no safe delete signal): {plan.skipped_no_external}")
+
+    if not options.dry_run:
+        return
+
+    for doc in plan.create_docs[:20]:
+        log(f"[DRY-RUN] CREATE {doc.ref}")
+    for operation in [op for op in operations if op.kind in ("UPDATE_RAW", "REPLACE")][:20]:
+        assert operation.local is not None
+        log(f"[DRY-RUN] {operation.kind} {operation.local.ref} doc_id={operation.doc_id}")
+    for operation in [op for op in operations if op.kind == "PATCH_METADATA"][:20]:
+        assert operation.local is not None
+        patch_keys = ",".join(sorted((operation.metadata_patch or {}).keys()))
+        log(f"[DRY-RUN] PATCH_METADATA {operation.local.ref} doc_id={operation.doc_id} keys=[{patch_keys}]")
+    for doc in plan.stale_docs[:20]:
+        log(f"[DRY-RUN] DELETE_STALE external_id={doc.get('external_id')} doc_id={doc.get('id')}")
+    for doc in plan.duplicate_docs[:20]:
+        log(f"[DRY-RUN] DELETE_DUPLICATE external_id={doc.get('external_id')} doc_id={doc.get('id')}")
+    for doc in plan.stale_no_external_docs[:20]:
+        md = doc.get("metadata") or {}
+        log(f"[DRY-RUN] DELETE_STALE_NO_EXTERNAL docs_ref={md.get('docs_ref')} doc_id={doc.get('id')}")
+    log("[INFO] Dry-run complete")
+
+
+def split_delete_operations(
+    operations: list[SyncOperation],
+) -> tuple[list[SyncOperation], list[SyncOperation]]:
+    """(upserts, deletes). Deletes run as their own stage once every upsert is issued, so a
+    moved page's new document exists before the old one is removed."""
+    upserts = [operation for operation in operations if operation.kind not in DELETE_OPERATION_KINDS]
+    deletes = [operation for operation in operations if operation.kind in DELETE_OPERATION_KINDS]
+    return upserts, deletes
+
+
+def deleted_document_ids(applied: list[AppliedOperation]) -> set[str]:
+    return {operation.doc_id for operation, _ in applied if operation.kind in DELETE_OPERATION_KINDS}
+
+
+def _log_delete_stage(stats: DeleteStats, *, issued: int, seconds: float) -> None:
+    rate = f"{issued / seconds:.1f}/s" if seconds > 0 else "n/a"
+    log(f"[INFO] Delete stage: deleted={issued} in {seconds:.2f}s ({rate}, concurrency={stats.concurrency})")
+
+
+def run_delete_stage(
+    *,
+    client: RagieClient,
+    partition: str,
+    operations: list[SyncOperation],
+    options: SyncOptions,
+    stats: DeleteStats,
+    slots: threading.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+) -> list[AppliedOperation]:
+    """Fan the partition's deletes out on a bounded pool, recording throughput in `stats`.
+
+    With options.delete_concurrency set, deletes get that many workers of their own instead
+    of sharing `slots` (the run-wide write budget): async deletes are cheap for Ragie.
+    """
+    stats.requested += len(operations)
+    stats.concurrency = options.delete_concurrency or options.concurrency
+    if not operations:
+        return []
+    started = time.monotonic()
+    with timed_phase("deletes", partition=partition):
+        applied = execute_operations(
+            client=client,
+            partition=partition,
+            operations=operations,
+            concurrency=stats.concurrency,
+            slots=None if options.delete_concurrency else slots,
+            journal=journal,
+        )
+    seconds = time.monotonic() - started
+    stats.deleted += len(applied)
+    stats.seconds += seconds
+    _log_delete_stage(stats, issued=len(applied), seconds=seconds)
+    return applied
+
+
+def _record_delete_verification(stats: DeleteStats, remaining: list[str], *, partition: str, checked: int) -> None:
+    stats.unconfirmed = remaining
+    if remaining:
+        log(
+            f"[WARN] {len(remaining)}/{checked} deleted doc(s) still listed in partition '{partition}' "
+            f"(Ragie deletes asynchronously; the next full sync re-plans any that remain): {', '.join(remaining[:5])}"
+        )
+    else:
+        log(f"[OK] Verified {checked} delete(s) in partition '{partition}'")
+
+
+def verify_deletions(
+    *,
+    client: RagieClient,
+    partition: str,
+    applied: list[AppliedOperation],
+    stats: DeleteStats,
+) -> None:
+    """One final listing pass confirming that the deleted documents are gone."""
+    deleted = deleted_document_ids(applied)
+    if not deleted:
+        stats.unconfirmed = []
+        return
+    with timed_phase("verify_deletes", partition=partition):
+        remaining = sorted(doc["id"] for doc in client.iter_documents(partition=partition) if doc.get("id") in deleted)
+    _record_delete_verification(stats, remaining, partition=partition, checked=len(deleted))
+
+
+def log_sync_complete(plan: SyncPlan, *, partition: str) -> None:
+    log(
+        f"[OK] Sync complete for partition '{partition}': "
+        f"created={len(plan.create_docs)} updated={len(plan.update_raw_docs)} "
+        f"patched={len(plan.patch_metadata_docs)} deleted={plan.delete_count}"
+    )
+
+
+def execute_and_poll_operations(
+    *,
+    client: RagieClient,
+    partition: str,
+    operations: list[SyncOperation],
+    options: SyncOptions,
+    write_slots: threading.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+    resumed: list[AppliedOperation] | None = None,
+    delete_stats: DeleteStats | None = None,
+) -> tuple[list[AppliedOperation], IngestionTracker]:
+    """Run writes and ingestion polling side by side; each doc is tracked as soon as its write returns.
+
+    Deletes run as a separate stage after the upserts, while polling continues.
+    Docs written by an earlier, interrupted run (`resumed`) are tracked from the start.
+    """
+    operations, deletes = split_delete_operations(operations)
+    tracker = IngestionTracker(
+        partition=partition, interval_seconds=options.poll_interval, allow_indexed=options.allow_indexed
+    )
+    for operation, doc_id in resumed or []:
+        tracker.track(operation, doc_id)
+    writes_done = threading.Event()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="ragie-poll-loop") as executor:
+        poller = executor.submit(
+            contextvars.copy_context().run,
+            run_ingestion_polling,
+            client=client,
+            tracker=tracker,
+            timeout_seconds=options.poll_timeout,
+            concurrency=options.poll_concurrency,
+            writes_done=writes_done,
+            stop=stop,
+        )
+        try:
+            applied = execute_operations(
+                client=client,
+                partition=partition,
+                operations=operations,
+                concurrency=options.concurrency,
+                slots=write_slots,
+                tracker=tracker,
+                journal=journal,
+            )
+            applied += run_delete_stage(
+                client=client,
+                partition=partition,
+                operations=deletes,
+                options=options,
+                stats=delete_stats if delete_stats is not None else DeleteStats(),
+                slots=write_slots,
+                journal=journal,
+            )
+        except BaseException:
+            stop.set()
+            raise
+        finally:
+            writes_done.set()
+        poller.result()
+
+    tracker.finish()
+    return (resumed or []) + applied, tracker
+
+
+async def async_execute_and_poll_operations(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    operations: list[SyncOperation],
+    options: SyncOptions,
+    write_slots: asyncio.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+    resumed: list[AppliedOperation] | None = None,
+    delete_stats: DeleteStats | None = None,
+) -> tuple[list[AppliedOperation], IngestionTracker]:
+    """asyncio counterpart of execute_and_poll_operations."""
+    operations, deletes = split_delete_operations(operations)
+    tracker = IngestionTracker(
+        partition=partition, interval_seconds=options.poll_interval, allow_indexed=options.allow_indexed
+    )
+    for operation, doc_id in resumed or []:
+        tracker.track(operation, doc_id)
+    writes_done = asyncio.Event()
+    poller = asyncio.ensure_future(
+        async_run_ingestion_polling(
+            client=client,
+            tracker=tracker,
+            timeout_seconds=options.poll_timeout,
+            concurrency=options.poll_concurrency,
+            writes_done=writes_done,
+        )
+    )
+    try:
+        applied = await async_execute_operations(
+            client=client,
+            partition=partition,
+            operations=operations,
+            concurrency=options.concurrency,
+            slots=write_slots,
+            tracker=tracker,
+            journal=journal,
+        )
+        applied += await async_run_delete_stage(
+            client=client,
+            partition=partition,
+            operations=deletes,
+            options=options,
+            stats=delete_stats if delete_stats is not None else DeleteStats(),
+            slots=write_slots,
+            journal=journal,
+        )
+    except BaseException:
+        poller.cancel()
+        raise
+    finally:
+        writes_done.set()
+    await poller
+
+    tracker.finish()
+    return (resumed or []) + applied, tracker
+
+
+def sync_documents(
+    *,
+    client: RagieClient,
+    partition: str,
+    local_docs: list[LocalDoc],
+    options: SyncOptions,
+    remote_docs_all: list[dict[str, Any]] | None = None,
+    removed_external_ids: frozenset[str] = frozenset(),
+    write_slots: threading.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+) -> SyncResult:
+    """List (unless remote docs are supplied), plan, write and poll one partition.
+
+    A fresh listing is streamed straight into the planner rather than collected first.
+    """
+    if remote_docs_all is None:
+        listing = RemoteListing(source=options.source, repo_name=options.repo_name)
+        with timed_phase("list_and_plan", partition=partition):
+            plan = build_sync_plan(
+                local_docs=local_docs,
+                managed_remote_docs=listing.stream(client.iter_documents(partition=partition)),
+                partial_sync=options.partial_sync,
+                removed_external_ids=removed_external_ids,
+            )
+        listing.log_counts(partition)
+        managed_remote_docs = listing.managed
+    else:
+        managed_remote_docs = filter_managed_remote_docs(remote_docs_all, partition=partition, options=options)
+        with timed_phase("plan", partition=partition):
+            plan = build_sync_plan(
+                local_docs=local_docs,
+                managed_remote_docs=managed_remote_docs,
+                partial_sync=options.partial_sync,
+                removed_external_ids=removed_external_ids,
+            )
+    result = SyncResult(managed_remote_docs=managed_remote_docs, plan=plan)
+    log_sync_plan(plan, options=options)
+    if not options.dry_run:
+        execute_sync_plan(
+            client=client,
+            partition=partition,
+            result=result,
+            options=options,
+            write_slots=write_slots,
+            journal=journal,
+        )
+    return result
+
+
+def execute_sync_plan(
+    *,
+    client: RagieClient,
+    partition: str,
+    result: SyncResult,
+    options: SyncOptions,
+    write_slots: threading.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+) -> None:
+    """Write and poll result.plan, recording what was applied and how long docs took to become ready.
+
+    With a journal, writes it already records as done (from an interrupted run) are not re-issued.
+    """
+    plan = result.plan
+    resumed: list[AppliedOperation] = []
+    operations = plan_operations(plan)
+    if journal is not None:
+        resumed, operations = journal.start(result, options=options)
+    if options.pipeline_polling:
+        with timed_phase("writes_and_polling", partition=partition):
+            result.applied, tracker = execute_and_poll_operations(
+                client=client,
+                partition=partition,
+                operations=operations,
+                options=options,
+                write_slots=write_slots,
+                journal=journal,
+                resumed=resumed,
+                delete_stats=result.deletes,
+            )
+    else:
+        upserts, deletes = split_delete_operations(operations)
+        with timed_phase("writes", partition=partition):
+            result.applied = resumed + execute_operations(
+                client=client,
+                partition=partition,
+                operations=upserts,
+                concurrency=options.concurrency,
+                slots=write_slots,
+                journal=journal,
+            )
+        result.applied += run_delete_stage(
+            client=client,
+            partition=partition,
+            operations=deletes,
+            options=options,
+            stats=result.deletes,
+            slots=write_slots,
+            journal=journal,
+        )
+        with timed_phase("polling", partition=partition):
+            tracker = poll_changed_documents(
+                client=client,
+                partition=partition,
+                document_ids=result.changed_document_ids,
+                timeout_seconds=options.poll_timeout,
+                interval_seconds=options.poll_interval,
+                allow_indexed=options.allow_indexed,
+                concurrency=options.poll_concurrency,
+                labels=result.document_labels,
+            )
+    result.time_to_ready = tracker.time_to_ready
+    if options.verify_deletes:
+        verify_deletions(client=client, partition=partition, applied=result.applied, stats=result.deletes)
+
+    log_sync_complete(plan, partition=partition)
+
+
+async def async_sync_documents(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    local_docs: list[LocalDoc],
+    options: SyncOptions,
+    remote_docs_all: list[dict[str, Any]] | None = None,
+    removed_external_ids: frozenset[str] = frozenset(),
+    write_slots: asyncio.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+) -> SyncResult:
+    """asyncio counterpart of sync_documents."""
+    if remote_docs_all is None:
+        # build_sync_plan cannot consume an async iterator, so pages are filtered as they
+        # arrive and only the slim managed docs are kept for planning.
+        listing = RemoteListing(source=options.source, repo_name=options.repo_name)
+        with timed_phase("list_documents", partition=partition):
+            async for doc in client.iter_documents(partition=partition):
+                listing.add(doc)
+        listing.log_counts(partition)
+        managed_remote_docs = listing.managed
+    else:
+        managed_remote_docs = filter_managed_remote_docs(remote_docs_all, partition=partition, options=options)
+
+    with timed_phase("plan", partition=partition):
+        plan = build_sync_plan(
+            local_docs=local_docs,
+            managed_remote_docs=managed_remote_docs,
+            partial_sync=options.partial_sync,
+            removed_external_ids=removed_external_ids,
+        )
+    result = SyncResult(managed_remote_docs=managed_remote_docs, plan=plan)
+    log_sync_plan(plan, options=options)
+    if not options.dry_run:
+        await async_execute_sync_plan(
+            client=client,
+            partition=partition,
+            result=result,
+            options=options,
+            write_slots=write_slots,
+            journal=journal,
+        )
+    return result
+
+
+async def async_execute_sync_plan(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    result: SyncResult,
+    options: SyncOptions,
+    write_slots: asyncio.Semaphore | None = None,
+    journal: OperationJournal | None = None,
+) -> None:
+    """asyncio counterpart of execute_sync_plan."""
+    plan = result.plan
+    resumed: list[AppliedOperation] = []
+    operations = plan_operations(plan)
+    if journal is not None:
+        resumed, operations = journal.start(result, options=options)
+    if options.pipeline_polling:
+        with timed_phase("writes_and_polling", partition=partition):
+            result.applied, tracker = await async_execute_and_poll_operations(
+                client=client,
+                partition=partition,
+                operations=operations,
+                options=options,
+                write_slots=write_slots,
+                journal=journal,
+                resumed=resumed,
+                delete_stats=result.deletes,
+            )
+    else:
+        upserts, deletes = split_delete_operations(operations)
+        with timed_phase("writes", partition=partition):
+            result.applied = resumed + await async_execute_operations(
+                client=client,
+                partition=partition,
+                operations=upserts,
+                concurrency=options.concurrency,
+                slots=write_slots,
+                journal=journal,
+            )
+        result.applied += await async_run_delete_stage(
+            client=client,
+            partition=partition,
+            operations=deletes,
+            options=options,
+            stats=result.deletes,
+            slots=write_slots,
+            journal=journal,
+        )
+        with timed_phase("polling", partition=partition):
+            tracker = await async_poll_changed_documents(
+                client=client,
+                partition=partition,
+                document_ids=result.changed_document_ids,
+                timeout_seconds=options.poll_timeout,
+                interval_seconds=options.poll_interval,
+                allow_indexed=options.allow_indexed,
+                concurrency=options.poll_concurrency,
+                labels=result.document_labels,
+            )
+    result.time_to_ready = tracker.time_to_ready
+    if options.verify_deletes:
+        await async_verify_deletions(client=client, partition=partition, applied=result.applied, stats=result.deletes)
+
+    log_sync_complete(plan, partition=partition)
+
+
+def canonical_json_hash(value: Any) -> str:
+    return sha256_text(json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=True))
+
+
+def manifest_entry(*, doc_id: str, metadata: dict[str, Any], updated_at: str) -> dict[str, Any]:
+    managed = {key: value for key, value in metadata.items() if key in MANAGED_METADATA_KEYS}
+    return {
+        "id": doc_id,
+        "content_hash": str(managed.get("content_hash") or ""),
+        "metadata_hash": canonical_json_hash(managed),
+        "updated_at": updated_at,
+        "metadata": managed,
+    }
+
+
+def manifest_from_remote_docs(managed_remote_docs: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+    """Manifest entries for the doc each external_id resolves to (duplicates are dropped)."""
+    grouped: dict[str, list[dict[str, Any]]] = {}
+    for doc in managed_remote_docs:
+        ext = str(doc.get("external_id") or "").strip()
+        if ext:
+            grouped.setdefault(ext, []).append(doc)
+
+    documents: dict[str, dict[str, Any]] = {}
+    for ext, docs in grouped.items():
+        keep, _ = pick_latest_doc(docs)
+        metadata = keep.get("metadata") if isinstance(keep.get("metadata"), dict) else {}
+        documents[ext] = manifest_entry(
+            doc_id=str(keep.get("id") or ""),
+            metadata=metadata,
+            updated_at=str(keep.get("updated_at") or ""),
+        )
+    return documents
+
+
+def manifest_remote_docs(documents: dict[str, dict[str, Any]]) -> list[dict[str, Any]]:
+    """Remote-document stand-ins for the planner, built from manifest entries."""
+    return [
+        {
+            "id": entry["id"],
+            "external_id": ext,
+            "updated_at": entry.get("updated_at", ""),
+            "metadata": dict(entry.get("metadata") or {}),
+        }
+        for ext, entry in documents.items()
+    ]
+
+
+def apply_results_to_manifest(
+    documents: dict[str, dict[str, Any]],
+    applied: list[AppliedOperation],
+) -> dict[str, dict[str, Any]]:
+    """Fold the outcome of applied operations into a copy of the manifest."""
+    updated = dict(documents)
+    now = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    deleted_ids = {operation.doc_id for operation, _ in applied if operation.kind in DELETE_OPERATION_KINDS}
+
+    for operation, doc_id in applied:
+        local = operation.local
+        if local is None:
+            continue
+        target_id = doc_id or operation.doc_id
+        updated[local.external_id] = manifest_entry(doc_id=target_id, metadata=local.metadata, updated_at=now)
+
+    return {ext: entry for ext, entry in updated.items() if entry["id"] not in deleted_ids}
+
+
+def load_manifest(
+    state: dict[str, Any],
+    *,
+    source: str,
+    repo_name: str,
+    max_age_hours: float,
+) -> dict[str, dict[str, Any]] | None:
+    """Return manifest documents when they can stand in for a remote listing."""
+    manifest = state.get("manifest")
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("documents"), dict):
+        return None
+    if manifest.get("source") != source or manifest.get("repo") != repo_name:
+        return None
+
+    verified_at = str(manifest.get("verified_at") or "")
+    try:
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(verified_at)
+    except ValueError:
+        return None
+    if max_age_hours > 0 and age.total_seconds() > max_age_hours * 3600:
+        log(f"[INFO] Manifest last verified {verified_at}; older than {max_age_hours}h, re-listing remote")
+        return None
+    return manifest["documents"]
+
+
+def manifest_drift(
+    manifest_documents: dict[str, dict[str, Any]],
+    remote_documents: dict[str, dict[str, Any]],
+    *,
+    ignore: set[str],
+) -> dict[str, list[str]]:
+    """Compare a manifest with a fresh remote listing, skipping external ids in `ignore`."""
+    drift: dict[str, list[str]] = {"missing_remote": [], "untracked_remote": [], "changed": []}
+    for ext in sorted(set(manifest_documents) | set(remote_documents)):
+        if ext in ignore:
+            continue
+        expected = manifest_documents.get(ext)
+        actual = remote_documents.get(ext)
+        if actual is None:
+            drift["missing_remote"].append(ext)
+        elif expected is None:
+            drift["untracked_remote"].append(ext)
+        elif (expected["id"], expected["content_hash"], expected["metadata_hash"]) != (
+            actual["id"],
+            actual["content_hash"],
+            actual["metadata_hash"],
+        ):
+            drift["changed"].append(ext)
+    return drift
+
+
+class ManifestVerifier:
+    """Lists the remote partition on a background thread while the sync runs."""
+
+    def __init__(self, *, client: RagieClient, partition: str, source: str, repo_name: str) -> None:
+        self._client = client
+        self._partition = partition
+        self._source = source
+        self._repo_name = repo_name
+        self._result: list[dict[str, Any]] | None = None
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="ragie-manifest-verify", daemon=True)
+
+    def start(self) -> ManifestVerifier:
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        try:
+            listing = RemoteListing(source=self._source, repo_name=self._repo_name)
+            for doc in self._client.iter_documents(partition=self._partition):
+                listing.add(doc)
+            self._result = listing.managed
+        except BaseException as err:  # surfaced from reconcile()
+            self._error = err
+
+    def reconcile(
+        self,
+        manifest_documents: dict[str, dict[str, Any]],
+        applied: list[AppliedOperation],
+    ) -> dict[str, dict[str, Any]]:
+        """Replace manifest entries this run did not touch with what the remote reports."""
+        self._thread.join()
+        if self._error is not None:
+            raise SyncError(f"Manifest verification listing failed: {self._error}") from self._error
+        assert self._result is not None
+
+        touched_ids = {doc_id or operation.doc_id for operation, doc_id in applied}
+        remote_documents = manifest_from_remote_docs(self._result)
+        touched = {operation.local.external_id for operation, _ in applied if operation.local is not None}
+        touched.update(ext for ext, entry in remote_documents.items() if entry["id"] in touched_ids)
+        drift = manifest_drift(manifest_documents, remote_documents, ignore=touched)
+        if any(drift.values()):
+            log(
+                "[WARN] Manifest drift corrected: "
+                + " ".join(f"{kind}={len(exts)}" for kind, exts in drift.items())
+            )
+        else:
+            log("[INFO] Manifest verified against remote listing: no drift")
+
+        reconciled = {ext: entry for ext, entry in remote_documents.items() if ext not in touched}
+        reconciled.update({ext: manifest_documents[ext] for ext in touched if ext in manifest_documents})
+        return reconciled
+
+
+def _json_equal(left: Any, right: Any) -> bool:
+    return json.dumps(left, sort_keys=True, separators=(",", ":"), ensure_ascii=True) == json.dumps(
+        right,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=True,
+    )
+
+
+class RagieLookupCache:
+    """Partition details and the instruction listing, fetched once per process and shared by every partition.
+
+    Partitions are probed by name (a 404 means missing) rather than found by paging through
+    /partitions, so ensuring N partitions costs O(N) requests instead of O(N²).
+    """
+
+    def __init__(self) -> None:
+        self._partitions: dict[str, dict[str, Any] | None] = {}
+        self._instructions: list[dict[str, Any]] | None = None
+        self._lock = threading.Lock()
+        self._instructions_lock = threading.Lock()
+        self._async_instructions_lock: asyncio.Lock | None = None
+
+    def partition(self, client: RagieClient, name: str) -> dict[str, Any] | None:
+        with self._lock:
+            if name in self._partitions:
+                return self._partitions[name]
+        try:
+            detail: dict[str, Any] | None = client.get_partition(partition_id=name)
+        except RagieAPIError as err:
+            if err.status != 404:
+                raise
+            detail = None
+        with self._lock:
+            self._partitions[name] = detail
+        return detail
+
+    async def async_partition(self, client: AsyncRagieClient, name: str) -> dict[str, Any] | None:
+        with self._lock:
+            if name in self._partitions:
+                return self._partitions[name]
+        try:
+            detail: dict[str, Any] | None = await client.get_partition(partition_id=name)
+        except RagieAPIError as err:
+            if err.status != 404:
+                raise
+            detail = None
+        with self._lock:
+            self._partitions[name] = detail
+        return detail
+
+    def forget_partition(self, name: str) -> None:
+        with self._lock:
+            self._partitions.pop(name, None)
+
+    def instructions(self, client: RagieClient) -> list[dict[str, Any]]:
+        # Held across the request so partitions preparing in parallel share one listing.
+        with self._instructions_lock:
+            if self._instructions is None:
+                self._instructions = client.list_instructions()
+            return list(self._instructions)
+
+    async def async_instructions(self, client: AsyncRagieClient) -> list[dict[str, Any]]:
+        if self._async_instructions_lock is None:
+            self._async_instructions_lock = asyncio.Lock()
+        async with self._async_instructions_lock:
+            if self._instructions is None:
+                self._instructions = await client.list_instructions()
+            return list(self._instructions)
+
+    def add_instruction(self, instruction: dict[str, Any]) -> None:
+        with self._instructions_lock:
+            if self._instructions is not None:
+                self._instructions.append(instruction)
+
+
+def partition_config_patch(
+    detail: dict[str, Any], *, description: str, metadata_schema: dict[str, Any]
+) -> dict[str, Any]:
+    """Changes that bring a partition's details to the context-aware configuration."""
+    patch: dict[str, Any] = {}
+    if detail.get("context_aware") is not True:
+        patch["context_aware"] = True
+    if description and str(detail.get("description") or "") != description:
+        patch["description"] = description
+    if not _json_equal(detail.get("metadata_schema"), metadata_schema):
+        patch["metadata_schema"] = metadata_schema
+    return patch
+
+
+def partition_patch_calls(patch: dict[str, Any]) -> list[dict[str, Any]]:
+    """update_partition keyword arguments that apply a partition_config_patch, in order."""
+    # Ragie currently rejects context_aware + description in the same PATCH payload.
+    # Apply in two steps when both are needed.
+    calls = []
+    non_context_patch = {key: patch[key] for key in ("description", "metadata_schema") if key in patch}
+    if non_context_patch:
+        calls.append(non_context_patch)
+    if "context_aware" in patch:
+        calls.append({"context_aware": bool(patch["context_aware"])})
+    return calls
+
+
+def ensure_partition_configuration(
+    *,
+    client: RagieClient,
+    partition: str,
+    description: str,
+    metadata_schema: dict[str, Any],
+    dry_run: bool,
+    lookups: RagieLookupCache | None = None,
+) -> None:
+    lookups = lookups or RagieLookupCache()
+    detail = lookups.partition(client, partition)
+    exists = detail is not None
+
+    if not exists:
+        if dry_run:
+            log(f"[DRY-RUN] CREATE_PARTITION {partition}")
+        else:
+            client.create_partition(
+                name=partition,
+                description=description,
+                metadata_schema=metadata_schema,
+            )
+            log(f"[PARTITION_CREATE] {partition}")
+
+    if dry_run and not exists:
+        log(f"[DRY-RUN] PATCH_PARTITION {partition} keys=[context_aware,description,metadata_schema]")
+        return
+
+    if detail is None:
+        lookups.forget_partition(partition)
+        detail = lookups.partition(client, partition)
+        if detail is None:
+            raise SyncError(f"Partition '{partition}' not found after creating it")
+    patch = partition_config_patch(detail, description=description, metadata_schema=metadata_schema)
+
+    if not patch:
+        log(f"[INFO] Partition '{partition}' already configured for context-aware retrieval")
+        return
+
+    if dry_run:
+        keys = ",".join(sorted(patch.keys()))
+        log(f"[DRY-RUN] PATCH_PARTITION {partition} keys=[{keys}]")
+        return
+
+    lookups.forget_partition(partition)
+    for call in partition_patch_calls(patch):
+        client.update_partition(partition_id=partition, **call)
+        log(f"[PARTITION_PATCH] {partition} keys=[{','.join(sorted(call))}]")
+
+
+async def async_ensure_partition_configuration(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    description: str,
+    metadata_schema: dict[str, Any],
+    dry_run: bool,
+    lookups: RagieLookupCache | None = None,
+) -> None:
+    lookups = lookups or RagieLookupCache()
+    detail = await lookups.async_partition(client, partition)
+    exists = detail is not None
+
+    if not exists:
+        if dry_run:
+            log(f"[DRY-RUN] CREATE_PARTITION {partition}")
+        else:
+            await client.create_partition(
+                name=partition,
+                description=description,
+                metadata_schema=metadata_schema,
+            )
+            log(f"[PARTITION_CREATE] {partition}")
+
+    if dry_run and not exists:
+        log(f"[DRY-RUN] PATCH_PARTITION {partition} keys=[context_aware,description,metadata_schema]")
+        return
+
+    if detail is None:
+        lookups.forget_partition(partition)
+        detail = await lookups.async_partition(client, partition)
+        if detail is None:
+            raise SyncError(f"Partition '{partition}' not found after creating it")
+    patch = partition_config_patch(detail, description=description, metadata_schema=metadata_schema)
+
+    if not patch:
+        log(f"[INFO] Partition '{partition}' already configured for context-aware retrieval")
+        return
+
+    if dry_run:
+        keys = ",".join(sorted(patch.keys()))
+        log(f"[DRY-RUN] PATCH_PARTITION {partition} keys=[{keys}]")
+        return
+
+    lookups.forget_partition(partition)
+    for call in partition_patch_calls(patch):
+        await client.update_partition(partition_id=partition, **call)
+        log(f"[PARTITION_PATCH] {partition} keys=[{','.join(sorted(call))}]")
+
+
+def entity_instruction_payload(
+    *, partition: str, source: str, repo_name: str, instruction_name: str, scope: str
+) -> dict[str, Any]:
+    return {
+        "name": instruction_name,
+        "active": True,
+        "scope": scope,
+        "prompt": DEFAULT_ENTITY_INSTRUCTION_PROMPT,
+        "entity_schema": build_entity_schema(),
+        "filter": {
+            "source": {"$eq": source},
+            "repo": {"$eq": repo_name},
+        },
+        "partition": partition,
+    }
+
+
+def log_instruction_drift(instruction: dict[str, Any], expected_payload: dict[str, Any]) -> None:
+    """Warn about config an existing instruction does not share with the expected payload."""
+    instruction_name = expected_payload["name"]
+    drift_fields: list[str] = []
+    if str(instruction.get("partition") or "") != expected_payload["partition"]:
+        drift_fields.append("partition")
+    if str(instruction.get("scope") or "") != expected_payload["scope"]:
+        drift_fields.append("scope")
+    if str(instruction.get("prompt") or "") != DEFAULT_ENTITY_INSTRUCTION_PROMPT:
+        drift_fields.append("prompt")
+    if not _json_equal(instruction.get("entity_schema"), expected_payload["entity_schema"]):
+        drift_fields.append("entity_schema")
+    if not _json_equal(instruction.get("filter"), expected_payload["filter"]):
+        drift_fields.append("filter")
+
+    if drift_fields:
+        joined = ",".join(sorted(drift_fields))
+        log(
+            "[WARN] Instruction config drift detected for "
+            f"'{instruction_name}' (fields: {joined}). Ragie only supports active-state updates; "
+            "delete/recreate instruction to apply config changes."
+        )
+    else:
+        log(f"[INFO] Instruction '{instruction_name}' already configured")
+
+
+def ensure_entity_instruction(
+    *,
+    client: RagieClient,
+    partition: str,
+    source: str,
+    repo_name: str,
+    instruction_name: str,
+    scope: str,
+    dry_run: bool,
+    lookups: RagieLookupCache | None = None,
+) -> bool:
+    expected_payload = entity_instruction_payload(
+        partition=partition, source=source, repo_name=repo_name, instruction_name=instruction_name, scope=scope
+    )
+
+    lookups = lookups or RagieLookupCache()
+    instructions = lookups.instructions(client)
+    matches = [inst for inst in instructions if str(inst.get("name") or "") == instruction_name]
+
+    if not matches:
+        if dry_run:
+            log(f"[DRY-RUN] CREATE_INSTRUCTION {instruction_name} partition={partition}")
+            return False
+        created = client.create_instruction(payload=expected_payload)
+        lookups.add_instruction(created)
+        log(f"[INSTRUCTION_CREATE] {instruction_name} id={created.get('id')}")
+        return True
+
+    instruction = matches[0]
+    if len(matches) > 1:
+        log(f"[WARN] Multiple instructions found for name '{instruction_name}', using newest by API order")
+
+    instruction_id = str(instruction.get("id") or "")
+    if not bool(instruction.get("active")):
         if dry_run:
             log(f"[DRY-RUN] ACTIVATE_INSTRUCTION {instruction_name} id={instruction_id}")
         elif instruction_id:
             client.update_instruction_active(instruction_id=instruction_id, active=True)
+            instruction["active"] = True
+            log(f"[INSTRUCTION_ACTIVATE] {instruction_name} id={instruction_id}")
+
+    log_instruction_drift(instruction, expected_payload)
+    return False
+
+
+async def async_ensure_entity_instruction(
+    *,
+    client: AsyncRagieClient,
+    partition: str,
+    source: str,
+    repo_name: str,
+    instruction_name: str,
+    scope: str,
+    dry_run: bool,
+    lookups: RagieLookupCache | None = None,
+) -> bool:
+    expected_payload = entity_instruction_payload(
+        partition=partition, source=source, repo_name=repo_name, instruction_name=instruction_name, scope=scope
+    )
+
+    lookups = lookups or RagieLookupCache()
+    instructions = await lookups.async_instructions(client)
+    matches = [inst for inst in instructions if str(inst.get("name") or "") == instruction_name]
+
+    if not matches:
+        if dry_run:
+            log(f"[DRY-RUN] CREATE_INSTRUCTION {instruction_name} partition={partition}")
+            return False
+        created = await client.create_instruction(payload=expected_payload)
+        lookups.add_instruction(created)
+        log(f"[INSTRUCTION_CREATE] {instruction_name} id={created.get('id')}")
+        return True
+
+    instruction = matches[0]
+    if len(matches) > 1:
+        log(f"[WARN] Multiple instructions found for name '{instruction_name}', using newest by API order")
+
+    instruction_id = str(instruction.get("id") or "")
+    if not bool(instruction.get("active")):
+        if dry_run:
+            log(f"[DRY-RUN] ACTIVATE_INSTRUCTION {instruction_name} id={instruction_id}")
+        elif instruction_id:
+            await client.update_instruction_active(instruction_id=instruction_id, active=True)
+            instruction["active"] = True
             log(f"[INSTRUCTION_ACTIVATE] {instruction_name} id={instruction_id}")
 
-    drift_fields: list[str] = []
-    if str(instruction.get("partition") or "") != partition:
-        drift_fields.append("partition")
-    if str(instruction.get("scope") or "") != scope:
-        drift_fields.append("scope")
-    if str(instruction.get("prompt") or "") != DEFAULT_ENTITY_INSTRUCTION_PROMPT:
-        drift_fields.append("prompt")
-    if not _json_equal(instruction.get("entity_schema"), expected_payload["entity_schema"]):
-        drift_fields.append("entity_schema")
-    if not _json_equal(instruction.get("filter"), expected_payload["filter"]):
-        drift_fields.append("filter")
+    log_instruction_drift(instruction, expected_payload)
+    return False
+
+
+SHARED_PARTITION = "shared_docs"
+
+
+@dataclass
+class PartitionJob:
+    """Per-partition state carried from planning through writes to the final state file."""
+
+    partition: str
+    refs: list[str] = field(default_factory=list)
+    partial_sync: bool = False
+    incremental: bool = False
+    state_path: Path | None = None
+    state: dict[str, Any] = field(default_factory=dict)
+    scope: IncrementalScope | None = None
+    # Import edges of the partition's pages, kept up to date with the tree when scope was resolved from them.
+    import_graph: ImportGraph | None = None
+    local_docs: list[LocalDoc] = field(default_factory=list)
+    remote_docs_all: list[dict[str, Any]] | None = None
+    removed_external_ids: frozenset[str] = frozenset()
+    manifest_documents: dict[str, dict[str, Any]] | None = None
+    verifier: ManifestVerifier | None = None
+    options: SyncOptions | None = None
+    planned: SyncPlan | None = None
+    journal: OperationJournal | None = None
+    # Commit the synced content was read from, when it is not the checkout running the sync (--resume).
+    source_commit: str = ""
+    created_instruction: bool = False
+    result: SyncResult | None = None
+    error: SyncError | None = None
+    seconds: float = 0.0
+
+    @property
+    def has_changes(self) -> bool:
+        if self.planned is not None:
+            return bool(plan_operations(self.planned))
+        return self.scope is None or bool(self.local_docs) or bool(self.removed_external_ids)
+
+
+def resolve_target_partitions(args: argparse.Namespace) -> list[str]:
+    if args.all_partitions:
+        partitions = [SHARED_PARTITION] + [f"tenant_{slug}" for slug in discover_tenant_slugs()]
+    elif args.partitions:
+        partitions = [sanitize_partition(p) for p in args.partitions.split(",") if p.strip()]
+    else:
+        partitions = [sanitize_partition(args.partition)]
+
+    partitions = list(dict.fromkeys(partitions))
+    if not partitions:
+        raise SyncError("No partitions to sync")
+    if len(partitions) > 1 and args.doc_ref:
+        raise SyncError("--doc-ref can only be used when syncing a single partition")
+    return partitions
+
+
+def ensure_partition_setup(
+    job: PartitionJob,
+    *,
+    args: argparse.Namespace,
+    client: RagieClient,
+    lookups: RagieLookupCache | None = None,
+) -> None:
+    """Run the opt-in partition configuration and entity instruction ensure steps."""
+    partition = job.partition
+    if args.ensure_partition_context_aware:
+        desired_description = args.partition_description.strip() or default_partition_description(partition)
+        ensure_partition_configuration(
+            client=client,
+            partition=partition,
+            description=desired_description,
+            metadata_schema=build_partition_metadata_schema(),
+            dry_run=args.dry_run,
+            lookups=lookups,
+        )
+
+    if args.ensure_entity_instruction:
+        instruction_name = args.entity_instruction_name.strip() or default_entity_instruction_name(partition)
+        job.created_instruction = ensure_entity_instruction(
+            client=client,
+            partition=partition,
+            source=args.source,
+            repo_name=args.repo_name,
+            instruction_name=instruction_name,
+            scope=args.entity_instruction_scope,
+            dry_run=args.dry_run,
+            lookups=lookups,
+        )
+
+
+async def async_ensure_partition_setup(
+    job: PartitionJob,
+    *,
+    args: argparse.Namespace,
+    client: AsyncRagieClient,
+    lookups: RagieLookupCache | None = None,
+) -> None:
+    partition = job.partition
+    if args.ensure_partition_context_aware:
+        desired_description = args.partition_description.strip() or default_partition_description(partition)
+        await async_ensure_partition_configuration(
+            client=client,
+            partition=partition,
+            description=desired_description,
+            metadata_schema=build_partition_metadata_schema(),
+            dry_run=args.dry_run,
+            lookups=lookups,
+        )
+
+    if args.ensure_entity_instruction:
+        instruction_name = args.entity_instruction_name.strip() or default_entity_instruction_name(partition)
+        job.created_instruction = await async_ensure_entity_instruction(
+            client=client,
+            partition=partition,
+            source=args.source,
+            repo_name=args.repo_name,
+            instruction_name=instruction_name,
+            scope=args.entity_instruction_scope,
+            dry_run=args.dry_run,
+            lookups=lookups,
+        )
+
+
+def build_sync_options(args: argparse.Namespace, *, partial_sync: bool, incremental_base: str) -> SyncOptions:
+    return SyncOptions(
+        source=args.source,
+        repo_name=args.repo_name,
+        partial_sync=partial_sync,
+        dry_run=args.dry_run,
+        concurrency=args.concurrency,
+        poll_timeout=args.poll_timeout,
+        poll_interval=args.poll_interval,
+        allow_indexed=args.allow_indexed,
+        incremental_base=incremental_base,
+        poll_concurrency=args.poll_concurrency,
+        pipeline_polling=args.pipeline_polling,
+        delete_concurrency=args.delete_concurrency,
+        verify_deletes=args.verify_deletes,
+    )
+
+
+def prepare_partition_job(
+    job: PartitionJob,
+    *,
+    args: argparse.Namespace,
+    docs_refs: list[str],
+    commit_sha: str,
+    client: RagieClient | None,
+    cache: NormalizationCache | None = None,
+    lookups: RagieLookupCache | None = None,
+    changes: TreeChanges | None = None,
+    import_graph: ImportGraph | None = None,
+    ensure_setup: bool = True,
+) -> None:
+    """Scope refs, resolve the incremental base, run ensure steps and discover local docs.
+
+    With no client (--skip-remote) only local discovery runs. With --resume and a journal
+    left by an interrupted run, the journaled plan is picked up instead. With changes (a
+    --watch cycle), the sync is scoped to the refs those paths affect instead of a git diff,
+    starting from import_graph (the previous cycle's) when given. ensure_setup=False skips
+    the ensure steps, for a caller (--async-io) that ran async_ensure_partition_setup already.
+    """
+    partition = job.partition
+    journal_path = sync_journal_path(Path(args.state_dir), partition)
+    if args.resume and client is not None:
+        journal = OperationJournal.load(journal_path)
+        if journal is not None:
+            header = journal.header or {}
+            job.planned = load_planned_job(
+                job, args=args, entry=header, source=header.get("source"), repo=header.get("repo")
+            )
+            job.journal = journal
+            job.source_commit = str(header.get("commit_sha") or "")
+            return
+        log(f"[INFO] No unfinished sync journal for partition '{partition}'; running a normal sync")
+    elif journal_path.exists() and client is not None:
+        log(f"[WARN] Found an unfinished sync journal for partition '{partition}'; starting over (see --resume)")
+
+    refs = scope_refs_for_partition(refs=docs_refs, partition=partition)
+    requested_doc_refs = [r.lstrip("/") for r in args.doc_ref if str(r).strip()]
+    job.partial_sync = bool(requested_doc_refs)
+    if requested_doc_refs:
+        wanted = set(requested_doc_refs)
+        refs = [r for r in refs if r in wanted]
+        missing = sorted(wanted - set(refs))
+        if missing:
+            raise SyncError(
+                f"doc_ref(s) not available for partition '{partition}': {', '.join(missing)}"
+            )
+    job.refs = refs
+
+    job.state_path = sync_state_path(Path(args.state_dir), partition)
+    job.state = load_sync_state(job.state_path)
+    job.incremental = (args.mode == "incremental" or changes is not None) and not job.partial_sync
+
+    explicit_base = args.since.strip() or str(job.state.get("last_synced_commit") or "")
+    if changes is not None:
+        graph = import_graph or ImportGraph()
+        job.scope = scope_for_changed_paths(
+            base="the last watch cycle",
+            changed_paths=set(changes.changed_paths),
+            removed_paths=set(changes.removed_paths),
+            refs=refs,
+            partition=partition,
+            previous_refs=list(changes.previous_refs) if changes.previous_refs is not None else None,
+            graph=graph,
+        )
+        job.import_graph = graph
+    elif job.incremental and explicit_base:
+        graph = load_import_graph(job.state, commit=explicit_base) or ImportGraph()
+        with timed_phase("incremental_scope", partition=partition):
+            job.scope = resolve_incremental_scope(
+                base_commit=explicit_base, refs=refs, partition=partition, graph=graph
+            )
+        if job.scope is not None:
+            job.import_graph = graph
+
+    if client is not None:
+        if ensure_setup:
+            with timed_phase("ensure_partition", partition=partition):
+                ensure_partition_setup(job, args=args, client=client, lookups=lookups)
+
+        # Per-doc commit_sha stamps are no substitute for the state file: partial and --doc-ref runs
+        # stamp HEAD on some docs only, so diffing from them would miss their siblings' changes.
+        if job.incremental and job.scope is None:
+            log("[INFO] No usable last synced commit; running full diff-based reconciliation")
+
+        if (args.mode == "incremental" or changes is not None) and job.remote_docs_all is None:
+            job.manifest_documents = load_manifest(
+                job.state,
+                source=args.source,
+                repo_name=args.repo_name,
+                max_age_hours=args.manifest_max_age_hours,
+            )
+        if job.manifest_documents is not None:
+            job.remote_docs_all = manifest_remote_docs(job.manifest_documents)
+            log(f"[INFO] Planning from local manifest ({len(job.manifest_documents)} docs); remote listing skipped")
+            if args.verify_manifest:
+                job.verifier = ManifestVerifier(
+                    client=client,
+                    partition=partition,
+                    source=args.source,
+                    repo_name=args.repo_name,
+                ).start()
+
+    scope = job.scope
+    with timed_phase("build_local_docs", partition=partition):
+        job.local_docs = build_local_docs(
+            refs=sorted(scope.changed_refs) if scope is not None else refs,
+            partition=partition,
+            docs_base_url=args.docs_base_url,
+            repo_name=args.repo_name,
+            source=args.source,
+            commit_sha=commit_sha,
+            jobs=args.jobs or os.cpu_count() or 1,
+            cache=cache,
+            volatile_metadata_keys=volatile_metadata_keys(args),
+        )
+    if scope is not None:
+        log(
+            f"[INFO] Incremental scope since {scope.base_commit}: "
+            f"changed_refs={len(scope.changed_refs)} removed_refs={len(scope.removed_refs)}"
+        )
+    elif not job.local_docs:
+        raise SyncError("No local docs discovered to sync")
+    log(f"[INFO] Local docs discovered: {len(job.local_docs)}")
+
+    job.removed_external_ids = frozenset(
+        build_external_id(repo_name=args.repo_name, partition=partition, ref=ref)
+        for ref in (scope.removed_refs if scope is not None else ())
+    )
+    job.options = build_sync_options(
+        args,
+        partial_sync=job.partial_sync or scope is not None,
+        incremental_base=scope.base_commit if scope is not None else "",
+    )
+    if not job.has_changes:
+        log(f"[OK] No doc changes in partition '{partition}' since {scope.base_commit}")
+
+
+def load_planned_job(
+    job: PartitionJob,
+    *,
+    args: argparse.Namespace,
+    entry: dict[str, Any],
+    source: Any,
+    repo: Any,
+) -> SyncPlan:
+    """Fill in a job from a serialized plan: an --apply partition entry or a journal's begin record."""
+    partition = job.partition
+    if (source, repo) != (args.source, args.repo_name):
+        raise SyncError(f"Plan was built for source={source} repo={repo}; pass matching --source/--repo-name")
+    try:
+        plan = sync_plan_from_json(entry["plan"])
+    except (KeyError, TypeError, ValueError) as err:
+        raise SyncError(f"Malformed plan for partition '{partition}': {err!r}") from err
+
+    job.state_path = sync_state_path(Path(args.state_dir), partition)
+    job.state = load_sync_state(job.state_path)
+    job.partial_sync = bool(entry.get("partial_sync"))
+    job.manifest_documents = entry.get("manifest")
+    incremental_base = str(entry.get("incremental_base") or "")
+    if incremental_base:
+        job.scope = IncrementalScope(
+            base_commit=incremental_base,
+            changed_refs=frozenset(doc.ref for doc in plan.create_docs + [local for local, _ in plan.update_raw_docs]),
+            removed_refs=frozenset(),
+        )
+    job.options = build_sync_options(
+        args,
+        partial_sync=job.partial_sync or bool(incremental_base),
+        incremental_base=incremental_base,
+    )
+    return plan
+
+
+def prepare_planned_job(
+    job: PartitionJob,
+    *,
+    args: argparse.Namespace,
+    plan_file: dict[str, Any],
+    client: RagieClient,
+    lookups: RagieLookupCache | None = None,
+    ensure_setup: bool = True,
+) -> None:
+    """Load one partition's saved plan (--apply) and check it against the remote before anything is written."""
+    entry = next(item for item in plan_file["partitions"] if item.get("partition") == job.partition)
+    plan = load_planned_job(job, args=args, entry=entry, source=plan_file.get("source"), repo=plan_file.get("repo"))
+    if ensure_setup:
+        ensure_partition_setup(job, args=args, client=client, lookups=lookups)
+    with timed_phase("conflict_check", partition=job.partition):
+        job.planned = check_plan_conflicts(
+            client=client, partition=job.partition, plan=plan, concurrency=args.concurrency
+        )
+    if not job.has_changes:
+        log(f"[OK] Nothing left to apply in partition '{job.partition}'")
+
+
+def planned_sync_result(job: PartitionJob) -> SyncResult:
+    """SyncResult for an --apply job, logged the way a freshly built plan would be."""
+    assert job.planned is not None and job.options is not None
+    result = SyncResult(managed_remote_docs=manifest_remote_docs(job.manifest_documents or {}), plan=job.planned)
+    log_sync_plan(job.planned, options=job.options)
+    return result
+
+
+def run_partition_job(
+    job: PartitionJob,
+    *,
+    client: RagieClient,
+    write_slots: threading.Semaphore | None = None,
+) -> None:
+    if not job.has_changes:
+        return
+    assert job.options is not None
+    if job.planned is not None:
+        job.result = planned_sync_result(job)
+        if not job.options.dry_run:
+            execute_sync_plan(
+                client=client,
+                partition=job.partition,
+                result=job.result,
+                options=job.options,
+                write_slots=write_slots,
+                journal=job.journal,
+            )
+        return
+    job.result = sync_documents(
+        client=client,
+        partition=job.partition,
+        local_docs=job.local_docs,
+        options=job.options,
+        remote_docs_all=job.remote_docs_all,
+        removed_external_ids=job.removed_external_ids,
+        write_slots=write_slots,
+        journal=job.journal,
+    )
+
+
+async def async_run_partition_job(
+    job: PartitionJob,
+    *,
+    client: AsyncRagieClient,
+    write_slots: asyncio.Semaphore | None = None,
+) -> None:
+    if not job.has_changes:
+        return
+    assert job.options is not None
+    if job.planned is not None:
+        job.result = planned_sync_result(job)
+        if not job.options.dry_run:
+            await async_execute_sync_plan(
+                client=client,
+                partition=job.partition,
+                result=job.result,
+                options=job.options,
+                write_slots=write_slots,
+                journal=job.journal,
+            )
+        return
+    job.result = await async_sync_documents(
+        client=client,
+        partition=job.partition,
+        local_docs=job.local_docs,
+        options=job.options,
+        remote_docs_all=job.remote_docs_all,
+        removed_external_ids=job.removed_external_ids,
+        write_slots=write_slots,
+        journal=job.journal,
+    )
+
+
+def finalize_partition_job(job: PartitionJob, *, args: argparse.Namespace, head_commit: str) -> None:
+    """Persist the manifest and last synced commit, then warn about un-backfilled instructions.
+
+    Only runs for jobs that did not fail, so last_synced_commit marks the last sync in which
+    every write succeeded. --watch cycles push working-tree edits no commit describes, so once
+    one has written anything the commit is cleared and the next incremental run reconciles fully.
+    """
+    result = job.result
+    head_commit = job.source_commit or head_commit
+    if not args.dry_run and job.state_path is not None:
+        state = job.state
+        new_state = {**state, "partition": job.partition}
+        previous_manifest = state.get("manifest") if isinstance(state.get("manifest"), dict) else {}
+        verified_at = str(previous_manifest.get("verified_at") or "")
+        applied = result.applied if result is not None else []
+
+        if job.manifest_documents is not None:
+            documents: dict[str, dict[str, Any]] | None = apply_results_to_manifest(job.manifest_documents, applied)
+        elif result is not None:
+            documents = apply_results_to_manifest(manifest_from_remote_docs(result.managed_remote_docs), applied)
+            verified_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        else:
+            documents = None
+
+        if job.verifier is not None and documents is not None:
+            documents = job.verifier.reconcile(documents, applied)
+            verified_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+        if documents is not None:
+            new_state["manifest"] = {
+                "source": args.source,
+                "repo": args.repo_name,
+                "verified_at": verified_at,
+                "documents": documents,
+            }
+        if args.watch:
+            if applied:
+                new_state.pop("last_synced_commit", None)
+                new_state.update(
+                    {"last_sync_mode": "watch", "synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+                )
+        elif not job.partial_sync and head_commit:
+            new_state.update(
+                {
+                    "last_synced_commit": head_commit,
+                    "last_sync_mode": "incremental" if job.scope is not None else "full",
+                    "synced_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                }
+            )
+            if job.refs:
+                # Saved so the next incremental run reads only changed files to find a snippet's importers.
+                graph = job.import_graph or build_import_graph(job.refs)[0]
+                new_state["import_graph"] = {"commit": head_commit, "imports": graph.imports}
+        write_sync_state(job.state_path, new_state)
+        if job.journal is not None:
+            job.journal.complete()
+
+    if job.created_instruction and not (result and result.changed_document_ids) and not args.dry_run:
+        log(
+            "[WARN] Entity instruction was created but no documents changed in this run. "
+            "Run a full sync to backfill extracted entities on existing docs."
+        )
+
+
+def discard_failed_manifest(job: PartitionJob, *, args: argparse.Namespace) -> None:
+    """Drop the manifest of a partition whose sync failed, so the next run lists the remote instead.
+
+    Writes that landed before the failure are not in the manifest; planning from it would
+    create those docs again.
+    """
+    if args.dry_run or job.state_path is None or "manifest" not in job.state:
+        return
+    write_sync_state(job.state_path, {key: value for key, value in job.state.items() if key != "manifest"})
+    log(f"[WARN] Sync of partition '{job.partition}' failed; discarded its manifest so the next run re-lists")
+
+
+def _partition_step(job: PartitionJob, step: Any, *args: Any, **kwargs: Any) -> None:
+    """Run one phase for a partition, recording (not raising) its SyncError and elapsed time."""
+    if job.error is not None:
+        return
+    started = time.monotonic()
+    try:
+        step(*args, **kwargs)
+    except SyncError as err:
+        job.error = err
+    finally:
+        job.seconds += time.monotonic() - started
+
+
+async def _async_partition_step(job: PartitionJob, step: Any, *args: Any, **kwargs: Any) -> None:
+    if job.error is not None:
+        return
+    started = time.monotonic()
+    try:
+        await step(*args, **kwargs)
+    except SyncError as err:
+        job.error = err
+    finally:
+        job.seconds += time.monotonic() - started
+
+
+def _with_log_prefix(prefix: str, fn: Any, *args: Any, **kwargs: Any) -> Any:
+    _LOG_PREFIX.set(prefix)
+    return fn(*args, **kwargs)
+
+
+def run_partition_jobs(
+    *,
+    args: argparse.Namespace,
+    partitions: list[str],
+    docs_refs: list[str],
+    commit_sha: str,
+    head_commit: str,
+    client_options: dict[str, Any],
+    cache: NormalizationCache | None = None,
+    plan_file: dict[str, Any] | None = None,
+    client: RagieClient | None = None,
+    lookups: RagieLookupCache | None = None,
+    changes: TreeChanges | None = None,
+    import_graphs: dict[str, ImportGraph] | None = None,
+) -> list[PartitionJob]:
+    """Sync every partition over one shared client, with at most --concurrency document writes in flight overall.
+
+    With plan_file (--apply), each partition executes its saved plan instead of listing and diffing.
+    A client and lookups passed in are reused rather than opened per call, as --watch does across cycles;
+    it also passes each partition's import graph from the previous cycle in import_graphs. With --async-io,
+    partition setup and the document phase go through an AsyncRagieClient over that same client and pool.
+    """
+    jobs = [PartitionJob(partition=partition) for partition in partitions]
+    multi = len(jobs) > 1
+    lookups = lookups or RagieLookupCache()
+
+    def prefixed(job: PartitionJob, fn: Any, *fn_args: Any, **fn_kwargs: Any) -> Any:
+        prefix = f"[{job.partition}] " if multi else ""
+        return contextvars.copy_context().run(_with_log_prefix, prefix, fn, *fn_args, **fn_kwargs)
+
+    def prepare(job: PartitionJob, client: RagieClient, *, ensure_setup: bool = True) -> None:
+        if plan_file is not None:
+            _partition_step(
+                job,
+                prepare_planned_job,
+                job,
+                args=args,
+                plan_file=plan_file,
+                client=client,
+                lookups=lookups,
+                ensure_setup=ensure_setup,
+            )
+        else:
+            _partition_step(
+                job,
+                prepare_partition_job,
+                job,
+                args=args,
+                docs_refs=docs_refs,
+                commit_sha=commit_sha,
+                client=client,
+                cache=cache,
+                lookups=lookups,
+                changes=changes,
+                import_graph=(import_graphs or {}).get(job.partition),
+                ensure_setup=ensure_setup,
+            )
+        if job.error is None and job.journal is None and not args.dry_run:
+            job.journal = OperationJournal(
+                sync_journal_path(Path(args.state_dir), job.partition),
+                context={
+                    "partition": job.partition,
+                    "commit_sha": head_commit,
+                    "source": args.source,
+                    "repo": args.repo_name,
+                },
+            )
+
+    def finalize(job: PartitionJob) -> None:
+        with timed_phase("finalize", partition=job.partition):
+            if job.error is not None:
+                discard_failed_manifest(job, args=args)
+            _partition_step(job, finalize_partition_job, job, args=args, head_commit=head_commit)
+
+    def in_parallel(fn: Any) -> None:
+        with ThreadPoolExecutor(max_workers=max(1, min(args.partition_concurrency, len(jobs)))) as executor:
+            for future in [executor.submit(contextvars.copy_context().run, prefixed, job, fn, job) for job in jobs]:
+                future.result()
+
+    with nullcontext(client) if client is not None else RagieClient(**client_options) as client:
+        if args.async_io:
+
+            async def run_all() -> None:
+                async with AsyncRagieClient(client=client) as async_client:
+                    write_slots = asyncio.Semaphore(max(1, args.concurrency))
+                    partition_slots = asyncio.Semaphore(max(1, args.partition_concurrency))
+
+                    async def setup_one(job: PartitionJob) -> None:
+                        if multi:
+                            _LOG_PREFIX.set(f"[{job.partition}] ")
+                        # A resumed job picks up its journaled plan without re-running the ensure steps.
+                        if args.resume and sync_journal_path(Path(args.state_dir), job.partition).exists():
+                            return
+                        async with partition_slots:
+                            with timed_phase("ensure_partition", partition=job.partition):
+                                await _async_partition_step(
+                                    job,
+                                    async_ensure_partition_setup,
+                                    job,
+                                    args=args,
+                                    client=async_client,
+                                    lookups=lookups,
+                                )
+
+                    async def run_one(job: PartitionJob) -> None:
+                        if multi:
+                            _LOG_PREFIX.set(f"[{job.partition}] ")
+                        async with partition_slots:
+                            await _async_partition_step(
+                                job, async_run_partition_job, job, client=async_client, write_slots=write_slots
+                            )
+
+                    await asyncio.gather(*(setup_one(job) for job in jobs))
+                    await asyncio.to_thread(in_parallel, lambda job: prepare(job, client, ensure_setup=False))
+                    await asyncio.gather(*(run_one(job) for job in jobs))
+
+            asyncio.run(run_all())
+            in_parallel(finalize)
+        else:
+            in_parallel(lambda job: prepare(job, client))
+            write_slots = threading.BoundedSemaphore(max(1, args.concurrency))
+
+            def run_and_finalize(job: PartitionJob) -> None:
+                _partition_step(job, run_partition_job, job, client=client, write_slots=write_slots)
+                finalize(job)
+
+            in_parallel(run_and_finalize)
+
+    return jobs
+
+
+def partition_outcome(job: PartitionJob, *, dry_run: bool) -> tuple[str, dict[str, int]]:
+    """(status, planned write counts) of a partition job."""
+    plan = job.result.plan if job.result is not None else None
+    counts = {
+        "created": len(plan.create_docs) if plan else 0,
+        "updated": len(plan.update_raw_docs) if plan else 0,
+        "patched": len(plan.patch_metadata_docs) if plan else 0,
+        "deleted": plan.delete_count if plan else 0,
+    }
+    if job.error is not None:
+        status = "failed"
+    elif plan is None:
+        status = "unchanged"
+    else:
+        status = "planned" if dry_run else "synced"
+    return status, counts
+
+
+def log_partition_summary(jobs: list[PartitionJob], *, dry_run: bool, elapsed: float) -> None:
+    totals = {"created": 0, "updated": 0, "patched": 0, "deleted": 0}
+    for job in jobs:
+        status, counts = partition_outcome(job, dry_run=dry_run)
+        for key, value in counts.items():
+            totals[key] += value
+        if job.error is not None:
+            log(f"[ERROR] {job.partition}: {job.error}")
+        log(
+            f"[SUMMARY] {job.partition}: {status} "
+            + " ".join(f"{key}={value}" for key, value in counts.items())
+            + f" in {job.seconds:.1f}s"
+        )
+    failed = sum(1 for job in jobs if job.error is not None)
+    log(
+        f"[SUMMARY] total: partitions={len(jobs)} failed={failed} "
+        + " ".join(f"{key}={value}" for key, value in totals.items())
+        + f" in {elapsed:.1f}s"
+    )
+
+
+PLAN_FORMAT_VERSION = 1
+
+
+def local_doc_to_json(doc: LocalDoc) -> dict[str, Any]:
+    return {
+        "ref": doc.ref,
+        "path": doc.path.relative_to(REPO_ROOT).as_posix(),
+        "name": doc.name,
+        "content": doc.content,
+        "content_hash": doc.content_hash,
+        "metadata": doc.metadata,
+    }
+
+
+def local_doc_from_json(external_id: str, payload: dict[str, Any]) -> LocalDoc:
+    return LocalDoc(
+        ref=payload["ref"],
+        path=REPO_ROOT / payload["path"],
+        name=payload["name"],
+        external_id=external_id,
+        content=payload["content"],
+        content_hash=payload["content_hash"],
+        metadata=payload["metadata"],
+    )
+
+
+def planned_remote_doc(doc: dict[str, Any]) -> dict[str, Any]:
+    """A remote doc as recorded in a plan: its id plus the managed-metadata hashes seen at plan time."""
+    metadata = doc.get("metadata") if isinstance(doc.get("metadata"), dict) else {}
+    entry = manifest_entry(
+        doc_id=str(doc.get("id") or ""),
+        metadata=metadata,
+        updated_at=str(doc.get("updated_at") or ""),
+    )
+    return {"external_id": str(doc.get("external_id") or ""), **entry}
+
+
+def sync_plan_to_json(plan: SyncPlan) -> dict[str, Any]:
+    """Serialize a plan; local docs are stored once and referenced by external_id."""
+    documents = [plan.create_docs, [local for local, _ in plan.update_raw_docs]]
+    documents.append([local for local, _, _ in plan.patch_metadata_docs])
+    return {
+        "documents": {doc.external_id: local_doc_to_json(doc) for group in documents for doc in group},
+        "create": [doc.external_id for doc in plan.create_docs],
+        "update_raw": [
+            {"external_id": local.external_id, "remote": planned_remote_doc(remote)}
+            for local, remote in plan.update_raw_docs
+        ],
+        "patch_metadata": [
+            {"external_id": local.external_id, "remote": planned_remote_doc(remote), "metadata_patch": patch}
+            for local, remote, patch in plan.patch_metadata_docs
+        ],
+        "delete_stale": [planned_remote_doc(doc) for doc in plan.stale_docs],
+        "delete_duplicate": [planned_remote_doc(doc) for doc in plan.duplicate_docs],
+        "delete_stale_no_external": [planned_remote_doc(doc) for doc in plan.stale_no_external_docs],
+        "skipped_no_external": plan.skipped_no_external,
+    }
+
+
+def sync_plan_from_json(payload: dict[str, Any]) -> SyncPlan:
+    documents = {ext: local_doc_from_json(ext, doc) for ext, doc in payload["documents"].items()}
+    return SyncPlan(
+        create_docs=[documents[ext] for ext in payload["create"]],
+        update_raw_docs=[(documents[item["external_id"]], item["remote"]) for item in payload["update_raw"]],
+        patch_metadata_docs=[
+            (documents[item["external_id"]], item["remote"], item["metadata_patch"])
+            for item in payload["patch_metadata"]
+        ],
+        stale_docs=list(payload["delete_stale"]),
+        duplicate_docs=list(payload["delete_duplicate"]),
+        stale_no_external_docs=list(payload["delete_stale_no_external"]),
+        skipped_no_external=int(payload.get("skipped_no_external") or 0),
+    )
+
+
+def write_plan_file(path: Path, jobs: list[PartitionJob], *, args: argparse.Namespace, head_commit: str) -> None:
+    partitions: list[dict[str, Any]] = []
+    operations = 0
+    for job in jobs:
+        result = job.result
+        plan = result.plan if result is not None else SyncPlan()
+        operations += len(plan_operations(plan))
+        partitions.append(
+            {
+                "partition": job.partition,
+                "partial_sync": job.partial_sync,
+                "incremental_base": job.options.incremental_base if job.options is not None else "",
+                # What the planner saw remotely; --apply folds its writes into this to refresh the state manifest.
+                "manifest": manifest_from_remote_docs(result.managed_remote_docs) if result is not None else None,
+                "plan": sync_plan_to_json(plan),
+            }
+        )
+    write_json_atomic(
+        path,
+        {
+            "version": PLAN_FORMAT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit_sha": head_commit,
+            "source": args.source,
+            "repo": args.repo_name,
+            "partitions": partitions,
+        },
+    )
+    log(f"[INFO] Wrote sync plan to {path}: partitions={len(partitions)} operations={operations}")
+
 
-    if drift_fields:
-        joined = ",".join(sorted(drift_fields))
-        log(
-            "[WARN] Instruction config drift detected for "
-            f"'{instruction_name}' (fields: {joined}). Ragie only supports active-state updates; "
-            "delete/recreate instruction to apply config changes."
+def read_plan_file(path: Path) -> dict[str, Any]:
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as err:
+        raise SyncError(f"Could not read sync plan {path}: {err}") from err
+    if not isinstance(payload, dict) or payload.get("version") != PLAN_FORMAT_VERSION:
+        raise SyncError(f"Unsupported sync plan {path} (expected format version {PLAN_FORMAT_VERSION})")
+    if not isinstance(payload.get("partitions"), list) or not payload["partitions"]:
+        raise SyncError(f"Sync plan {path} has no partitions")
+    return payload
+
+
+def check_plan_conflicts(*, client: RagieClient, partition: str, plan: SyncPlan, concurrency: int) -> SyncPlan:
+    """Re-read each remote doc a saved plan writes or deletes and compare it with the hashes recorded at plan time.
+
+    Docs already in the planned end state (deleted, or carrying the desired metadata) are dropped
+    from the plan, so an interrupted apply can be re-run. Any other difference is a conflict.
+    Planned creates are looked up by external_id in one listing of the partition: one that
+    already landed with the planned content is dropped, any other doc under that id is a conflict.
+    """
+    targets: dict[str, tuple[dict[str, Any], LocalDoc | None]] = {}
+    for local, remote in plan.update_raw_docs:
+        targets[str(remote["id"])] = (remote, local)
+    for local, remote, _ in plan.patch_metadata_docs:
+        targets[str(remote["id"])] = (remote, local)
+    for doc in plan.stale_docs + plan.duplicate_docs + plan.stale_no_external_docs:
+        targets[str(doc["id"])] = (doc, None)
+    if not targets and not plan.create_docs:
+        return plan
+
+    def fetch(doc_id: str) -> dict[str, Any] | None:
+        try:
+            return client.get_document(partition=partition, document_id=doc_id)
+        except RagieAPIError as err:
+            if err.status == 404:
+                return None
+            raise
+
+    doc_ids = list(targets)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(doc_ids) or 1))) as executor:
+        current = dict(zip(doc_ids, executor.map(fetch, doc_ids)))
+
+    conflicts: list[str] = []
+    done: set[str] = set()
+    created: set[str] = set()
+    if plan.create_docs:
+        creates = {local.external_id: local for local in plan.create_docs}
+        for doc in client.iter_documents(partition):
+            local = creates.get(str(doc.get("external_id") or ""))
+            if local is None:
+                continue
+            if (doc.get("metadata") or {}).get("content_hash") == local.content_hash:
+                created.add(local.external_id)
+            else:
+                conflicts.append(f"{local.ref} ({doc.get('id')}): created remotely")
+    for doc_id, (expected, local) in targets.items():
+        label = local.ref if local is not None else str(expected.get("external_id") or doc_id)
+        doc = current[doc_id]
+        if doc is None:
+            if local is None:
+                done.add(doc_id)
+            else:
+                conflicts.append(f"{label} ({doc_id}): deleted remotely")
+            continue
+        metadata = doc.get("metadata") if isinstance(doc.get("metadata"), dict) else {}
+        actual = manifest_entry(doc_id=doc_id, metadata=metadata, updated_at="")
+        if (actual["content_hash"], actual["metadata_hash"]) == (expected["content_hash"], expected["metadata_hash"]):
+            continue
+        desired = manifest_entry(doc_id=doc_id, metadata=local.metadata, updated_at="") if local is not None else None
+        if desired is not None and actual["metadata_hash"] == desired["metadata_hash"]:
+            done.add(doc_id)
+            continue
+        changed = "content" if actual["content_hash"] != expected["content_hash"] else "metadata"
+        conflicts.append(f"{label} ({doc_id}): {changed} changed remotely")
+
+    for conflict in conflicts:
+        log(f"[CONFLICT] {conflict}")
+    if conflicts:
+        raise SyncError(
+            f"{len(conflicts)} planned document(s) in partition '{partition}' changed since the plan was built; "
+            "re-run with --plan-out"
         )
-    else:
-        log(f"[INFO] Instruction '{instruction_name}' already configured")
+    log(
+        f"[INFO] Plan checked against remote: docs={len(targets) + len(plan.create_docs)} "
+        f"already_applied={len(done) + len(created)} conflicts=0"
+    )
 
-    return False
+    return SyncPlan(
+        create_docs=[local for local in plan.create_docs if local.external_id not in created],
+        update_raw_docs=[(local, remote) for local, remote in plan.update_raw_docs if remote["id"] not in done],
+        patch_metadata_docs=[item for item in plan.patch_metadata_docs if item[1]["id"] not in done],
+        stale_docs=[doc for doc in plan.stale_docs if doc["id"] not in done],
+        duplicate_docs=[doc for doc in plan.duplicate_docs if doc["id"] not in done],
+        stale_no_external_docs=[doc for doc in plan.stale_no_external_docs if doc["id"] not in done],
+        skipped_no_external=plan.skipped_no_external,
+    )
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Sync SourceMedium docs into Ragie")
-    parser.add_argument("--partition", required=True, help="Ragie partition (e.g. shared_docs, tenant_acme)")
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument("--partition", help="Ragie partition (e.g. shared_docs, tenant_acme)")
+    targets.add_argument(
+        "--partitions",
+        default="",
+        help="Comma-separated partitions to sync in one process (e.g. shared_docs,tenant_acme)",
+    )
+    targets.add_argument(
+        "--all-partitions",
+        action="store_true",
+        help="Sync shared_docs plus a tenant_<slug> partition for every tenant under /tenants",
+    )
+    targets.add_argument(
+        "--apply",
+        default="",
+        metavar="PLAN",
+        help=(
+            "Execute a plan written by --plan-out without re-listing its partitions; "
+            "aborts if a planned doc changed remotely since planning"
+        ),
+    )
+    parser.add_argument(
+        "--plan-out",
+        default="",
+        metavar="PATH",
+        help="Write the full sync plan as JSON for a later --apply (implies --dry-run)",
+    )
+    parser.add_argument(
+        "--partition-concurrency",
+        type=int,
+        default=4,
+        help="Max partitions synced in parallel; --concurrency still caps document writes across all of them",
+    )
     parser.add_argument(
         "--mode",
         choices=["incremental", "full"],
         default="incremental",
-        help="Sync mode (currently both modes use full diff-based reconciliation)",
+        help=(
+            "incremental: only sync refs whose files changed since the last synced commit "
+            "(from --since or the local state file; without either it falls back to a full run); "
+            "full: reconcile every doc in the partition"
+        ),
+    )
+    parser.add_argument("--since", default="", help="Override the last synced commit used by incremental mode")
+    parser.add_argument(
+        "--state-dir",
+        default=str(DEFAULT_STATE_DIR),
+        help="Directory for per-partition sync state (last synced commit and document manifest)",
+    )
+    parser.add_argument(
+        "--verify-manifest",
+        action="store_true",
+        help="When planning from the local manifest, list the remote partition in the background and correct drift",
+    )
+    parser.add_argument(
+        "--manifest-max-age-hours",
+        type=float,
+        default=24.0,
+        help="Re-list the remote partition when the manifest was last verified longer ago than this (0 = never)",
     )
     parser.add_argument(
         "--doc-ref",
@@ -1229,11 +5605,37 @@ def parse_args() -> argparse.Namespace:
         default=[],
         help="Optional docs ref to sync. Repeatable for multiple refs.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for reading and normalizing docs (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help="Directory for the normalized-docs cache (keyed by each page's raw bytes)",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=64.0,
+        help="Size bound for the normalized-docs cache; least recently used pages are evicted (0 disables)",
+    )
     parser.add_argument("--source", default="sourcemedium-docs", help="Managed metadata source marker")
     parser.add_argument("--repo-name", default="sourcemedium-docs", help="Repo name for metadata/external_id")
     parser.add_argument("--docs-base-url", default="https://docs.sourcemedium.com", help="Base URL for url_full metadata")
     parser.add_argument("--base-url", default="https://api.ragie.ai", help="Ragie API base URL")
     parser.add_argument("--commit-sha", default="", help="Commit SHA to stamp in metadata")
+    parser.add_argument(
+        "--volatile-metadata-key",
+        action="append",
+        default=None,
+        help=(
+            "Managed metadata key that is refreshed when a doc is written but never triggers a patch by itself "
+            "(repeatable; default: commit_sha; pass an empty value to make every key significant)"
+        ),
+    )
     parser.add_argument(
         "--ensure-partition-context-aware",
         action="store_true",
@@ -1265,8 +5667,110 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--timeout", type=int, default=30, help="HTTP timeout seconds")
     parser.add_argument("--max-retries", type=int, default=4, help="HTTP retry attempts for retryable errors")
     parser.add_argument("--retry-base-delay", type=float, default=0.5, help="Exponential backoff base delay in seconds")
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=20.0,
+        help="Max Ragie requests per second; adapts down on 429s and back up on success (0 disables)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=8,
+        help="Max persistent HTTP connections to the Ragie API (and requests in flight with --async-io)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Max documents written to Ragie in parallel (1 = sequential)",
+    )
+    parser.add_argument(
+        "--async-io",
+        action="store_true",
+        help=(
+            "Drive partition setup, document listing, writes and polling from a single asyncio event loop; "
+            "requests still run on a thread pool, so at most --pool-size are in flight at once"
+        ),
+    )
     parser.add_argument("--poll-timeout", type=int, default=600, help="Polling timeout in seconds")
-    parser.add_argument("--poll-interval", type=float, default=2.0, help="Polling interval in seconds")
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=2.0,
+        help="Base polling interval in seconds; docs early in ingestion are polled less often, near-ready ones more",
+    )
+    parser.add_argument(
+        "--poll-concurrency",
+        type=int,
+        default=8,
+        help="Max ingestion-status requests in flight while polling changed docs",
+    )
+    parser.add_argument(
+        "--pipeline-polling",
+        action="store_true",
+        help=(
+            "Start polling each doc's ingestion as soon as its write returns instead of after all writes; "
+            "--poll-timeout still counts from the last write"
+        ),
+    )
+    parser.add_argument(
+        "--delete-concurrency",
+        type=int,
+        default=0,
+        help=(
+            "Parallel deletes per partition, outside the --concurrency write budget "
+            "(default: deletes share --concurrency)"
+        ),
+    )
+    parser.add_argument(
+        "--verify-deletes",
+        action="store_true",
+        help="After syncing, confirm deleted docs are gone with one listing pass (leftovers are reported)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=(
+            "After syncing, keep watching pages, snippets and docs.json and re-sync only the refs each "
+            "burst of edits affects (Ctrl-C to stop)"
+        ),
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between --watch polls of the docs tree (default: 1.0)",
+    )
+    parser.add_argument(
+        "--watch-debounce",
+        type=float,
+        default=0.5,
+        help="Seconds the tree must stay unchanged before --watch syncs a burst of edits (default: 0.5)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Continue a sync that died part-way, from the write journal in --state-dir: completed writes are "
+            "skipped and their docs polled, without re-listing (a normal sync runs when there is no journal)"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-json",
+        default="",
+        metavar="PATH",
+        help=(
+            "Write a run report: per-phase timings, per-endpoint request latency histograms, retries, "
+            "bytes sent/received, write counts and time-to-ready per partition"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        default="",
+        metavar="PATH",
+        help="Also write the run report as a Prometheus textfile (for node_exporter's textfile collector)",
+    )
     parser.add_argument(
         "--skip-remote",
         action="store_true",
@@ -1275,265 +5779,260 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def volatile_metadata_keys(args: argparse.Namespace) -> frozenset[str]:
+    if args.volatile_metadata_key is None:
+        return DEFAULT_VOLATILE_METADATA_KEYS
+    return frozenset(key.strip() for key in args.volatile_metadata_key if key.strip())
+
+
 def main() -> int:
     args = parse_args()
+    unknown_volatile = sorted(volatile_metadata_keys(args) - MANAGED_METADATA_KEYS)
+    if unknown_volatile:
+        raise SyncError(f"--volatile-metadata-key must name managed metadata keys, got: {', '.join(unknown_volatile)}")
 
     load_local_env(ENV_FILE)
 
-    partition = sanitize_partition(args.partition)
-
+    if args.plan_out:
+        args.dry_run = True
+    plan_file = read_plan_file(Path(args.apply)) if args.apply else None
+    if plan_file is not None:
+        partitions = [str(entry.get("partition") or "") for entry in plan_file["partitions"]]
+    else:
+        partitions = resolve_target_partitions(args)
     commit_sha = args.commit_sha.strip() or os.environ.get("GITHUB_SHA", "").strip()
-
-    refs = load_docs_refs()
-    refs = scope_refs_for_partition(refs=refs, partition=partition)
-    requested_doc_refs = [r.lstrip("/") for r in args.doc_ref if str(r).strip()]
-    partial_sync = bool(requested_doc_refs)
-    if requested_doc_refs:
-        wanted = set(requested_doc_refs)
-        refs = [r for r in refs if r in wanted]
-        missing = sorted(wanted - set(refs))
-        if missing:
-            raise SyncError(
-                f"doc_ref(s) not available for partition '{partition}': {', '.join(missing)}"
-            )
-
-    local_docs = build_local_docs(
-        refs=refs,
-        partition=partition,
-        docs_base_url=args.docs_base_url,
-        repo_name=args.repo_name,
-        source=args.source,
-        commit_sha=commit_sha,
+    metrics = SyncMetrics() if args.metrics_json or args.metrics_prom else None
+    _METRICS.set(metrics)
+    cache = (
+        NormalizationCache(Path(args.cache_dir), max_bytes=int(args.cache_max_mb * 1024 * 1024))
+        if args.cache_max_mb > 0
+        else None
     )
+    exit_code = 1
+    try:
+        with timed_phase("load_docs_refs"):
+            docs_refs = load_docs_refs()
+        if args.watch:
+            exit_code = watch_partitions(
+                args, partitions=partitions, docs_refs=docs_refs, commit_sha=commit_sha, cache=cache
+            )
+            return exit_code
+        exit_code = run_sync(
+            args,
+            partitions=partitions,
+            docs_refs=docs_refs,
+            commit_sha=commit_sha,
+            cache=cache,
+            plan_file=plan_file,
+        )
+        return exit_code
+    finally:
+        if cache is not None:
+            cache.save()
+        if metrics is not None:
+            write_run_metrics(metrics, args=args, exit_code=exit_code)
 
-    if not local_docs:
-        raise SyncError("No local docs discovered to sync")
-
-    local_by_external = {doc.external_id: doc for doc in local_docs}
-    local_refs = {doc.ref for doc in local_docs}
 
-    log(f"[INFO] Local docs discovered: {len(local_docs)}")
+def write_run_metrics(metrics: SyncMetrics, *, args: argparse.Namespace, exit_code: int) -> None:
+    if args.metrics_json:
+        write_json_atomic(Path(args.metrics_json), metrics.report(exit_code=exit_code))
+        log(f"[INFO] Wrote run metrics to {args.metrics_json}")
+    if args.metrics_prom:
+        write_text_atomic(Path(args.metrics_prom), metrics.prometheus(exit_code=exit_code))
+        log(f"[INFO] Wrote Prometheus metrics to {args.metrics_prom}")
 
-    if args.skip_remote:
-        log("[INFO] --skip-remote enabled, ending after local discovery")
-        return 0
 
+def build_client_options(args: argparse.Namespace) -> dict[str, Any]:
+    """RagieClient/AsyncRagieClient keyword arguments from the CLI."""
     api_key = os.environ.get("RAGIE_API_KEY", "").strip()
     if not api_key:
         raise SyncError("RAGIE_API_KEY is not set (env or .env)")
 
-    client = RagieClient(
-        api_key=api_key,
-        base_url=args.base_url,
-        timeout=args.timeout,
-        max_retries=args.max_retries,
-        retry_base_delay=args.retry_base_delay,
-    )
+    return {
+        "api_key": api_key,
+        "base_url": args.base_url,
+        "timeout": args.timeout,
+        "max_retries": args.max_retries,
+        "retry_base_delay": args.retry_base_delay,
+        "pool_size": args.pool_size,
+        "rate_limiter": AdaptiveRateLimiter(max_rate=args.rate_limit) if args.rate_limit > 0 else None,
+        "metrics": _METRICS.get(),
+    }
 
-    created_instruction = False
-    if args.ensure_partition_context_aware:
-        desired_description = args.partition_description.strip() or default_partition_description(partition)
-        ensure_partition_configuration(
-            client=client,
-            partition=partition,
-            description=desired_description,
-            metadata_schema=build_partition_metadata_schema(),
-            dry_run=args.dry_run,
-        )
 
-    if args.ensure_entity_instruction:
-        instruction_name = args.entity_instruction_name.strip() or default_entity_instruction_name(partition)
-        created_instruction = ensure_entity_instruction(
-            client=client,
-            partition=partition,
-            source=args.source,
-            repo_name=args.repo_name,
-            instruction_name=instruction_name,
-            scope=args.entity_instruction_scope,
-            dry_run=args.dry_run,
+def watch_partitions(
+    args: argparse.Namespace,
+    *,
+    partitions: list[str],
+    docs_refs: list[str],
+    commit_sha: str,
+    cache: NormalizationCache | None,
+    stop: threading.Event | None = None,
+) -> int:
+    """--watch: sync once, then re-sync only the refs affected by each burst of file changes.
+
+    The client and its keep-alive pool, partition/instruction lookups and the normalization
+    cache stay warm across cycles. A failing cycle is reported and watching continues. Runs
+    until interrupted or until `stop` is set.
+    """
+    unsupported = [
+        flag
+        for flag, enabled in (
+            ("--apply", bool(args.apply)),
+            ("--skip-remote", args.skip_remote),
+            ("--plan-out", bool(args.plan_out)),
+            ("--resume", args.resume),
+            ("--doc-ref", bool(args.doc_ref)),
+            ("--async-io", args.async_io),
         )
-
-    remote_docs_all = client.list_documents(partition=partition)
-    managed_remote_docs = [
-        doc for doc in remote_docs_all if is_managed_remote_doc(doc, source=args.source, repo_name=args.repo_name)
+        if enabled
     ]
-
-    log(
-        f"[INFO] Remote docs in partition '{partition}': total={len(remote_docs_all)} managed={len(managed_remote_docs)}"
-    )
-
-    grouped_by_external: dict[str, list[dict[str, Any]]] = {}
-    remote_without_external: list[dict[str, Any]] = []
-    for doc in managed_remote_docs:
-        ext = str(doc.get("external_id") or "").strip()
-        if not ext:
-            remote_without_external.append(doc)
-            continue
-        grouped_by_external.setdefault(ext, []).append(doc)
-
-    remote_by_external: dict[str, dict[str, Any]] = {}
-    duplicate_docs: list[dict[str, Any]] = []
-
-    for external_id, docs in grouped_by_external.items():
-        keep, dups = pick_latest_doc(docs)
-        remote_by_external[external_id] = keep
-        duplicate_docs.extend(dups)
-
-    create_docs: list[LocalDoc] = []
-    update_raw_docs: list[tuple[LocalDoc, dict[str, Any]]] = []
-    patch_metadata_docs: list[tuple[LocalDoc, dict[str, Any], dict[str, Any]]] = []
-
-    for external_id, local in local_by_external.items():
-        remote = remote_by_external.get(external_id)
-        if remote is None:
-            create_docs.append(local)
-            continue
-
-        remote_metadata = remote.get("metadata") or {}
-        if not isinstance(remote_metadata, dict):
-            remote_metadata = {}
-
-        metadata_patch = compare_metadata_patch(remote_metadata, local.metadata)
-        remote_hash = str(remote_metadata.get("content_hash") or "")
-        needs_raw_update = remote_hash != local.content_hash
-
-        if needs_raw_update:
-            update_raw_docs.append((local, remote))
-
-        if metadata_patch:
-            patch_metadata_docs.append((local, remote, metadata_patch))
-
-    stale_docs: list[dict[str, Any]] = []
-    stale_no_external_docs: list[dict[str, Any]] = []
-    skipped_no_external = 0
-
-    if not partial_sync:
-        stale_external_ids = sorted(set(remote_by_external.keys()) - set(local_by_external.keys()))
-        stale_docs = [remote_by_external[eid] for eid in stale_external_ids]
-
-        for doc in remote_without_external:
-            metadata = doc.get("metadata") or {}
-            docs_ref = str(metadata.get("docs_ref") or "").strip()
-            if docs_ref and docs_ref not in local_refs:
-                stale_no_external_docs.append(doc)
-            else:
-                skipped_no_external += 1
-    else:
-        # In partial mode, only clean duplicates for targeted external_ids.
-        duplicate_docs = [
-            doc for doc in duplicate_docs if str(doc.get("external_id") or "") in set(local_by_external.keys())
-        ]
-
-    log(
-        "[INFO] Plan: "
-        f"create={len(create_docs)} "
-        f"update_raw={len(update_raw_docs)} "
-        f"patch_metadata={len(patch_metadata_docs)} "
-        f"delete_stale={len(stale_docs)} "
-        f"delete_duplicates={len(duplicate_docs)} "
-        f"delete_stale_no_external={len(stale_no_external_docs)}"
-    )
-    if partial_sync:
-        log("[INFO] Partial sync mode enabled via --doc-ref (stale deletion disabled)")
-    if skipped_no_external:
-        log(f"[WARN] Managed docs without external_id kept (no safe delete signal): {skipped_no_external}")
-
-    if args.dry_run:
-        for doc in create_docs[:20]:
-            log(f"[DRY-RUN] CREATE {doc.ref}")
-        for local, remote in update_raw_docs[:20]:
-            log(f"[DRY-RUN] UPDATE_RAW {local.ref} doc_id={remote.get('id')}")
-        for local, remote, metadata_patch in patch_metadata_docs[:20]:
-            patch_keys = ",".join(sorted(metadata_patch.keys()))
-            log(f"[DRY-RUN] PATCH_METADATA {local.ref} doc_id={remote.get('id')} keys=[{patch_keys}]")
-        for doc in stale_docs[:20]:
-            log(f"[DRY-RUN] DELETE_STALE external_id={doc.get('external_id')} doc_id={doc.get('id')}")
-        for doc in duplicate_docs[:20]:
-            log(f"[DRY-RUN] DELETE_DUPLICATE external_id={doc.get('external_id')} doc_id={doc.get('id')}")
-        for doc in stale_no_external_docs[:20]:
-            md = doc.get("metadata") or {}
-            log(f"[DRY-RUN] DELETE_STALE_NO_EXTERNAL docs_ref={md.get('docs_ref')} doc_id={doc.get('id')}")
-        log("[INFO] Dry-run complete")
+    if unsupported:
+        raise SyncError(f"--watch cannot be combined with {', '.join(unsupported)}")
+
+    client_options = build_client_options(args)
+    watcher = DocsTreeWatcher(REPO_ROOT, interval=args.watch_interval, debounce=args.watch_debounce)
+    lookups = RagieLookupCache()
+    import_graphs: dict[str, ImportGraph] = {}
+    changes: TreeChanges | None = None
+    try:
+        with RagieClient(**client_options) as client:
+            while True:
+                started = time.monotonic()
+                jobs = run_partition_jobs(
+                    args=args,
+                    partitions=partitions,
+                    docs_refs=docs_refs,
+                    commit_sha=commit_sha,
+                    head_commit=current_git_commit(),
+                    client_options=client_options,
+                    cache=cache,
+                    client=client,
+                    lookups=lookups,
+                    changes=changes,
+                    import_graphs=import_graphs,
+                )
+                import_graphs.update({job.partition: job.import_graph for job in jobs if job.import_graph is not None})
+                if cache is not None:
+                    cache.save()
+                log_partition_summary(jobs, dry_run=args.dry_run, elapsed=time.monotonic() - started)
+                log(f"[WATCH] Watching {REPO_ROOT} for changes (Ctrl-C to stop)")
+
+                changes = None
+                pending_changed: set[str] = set()
+                pending_removed: set[str] = set()
+                while changes is None:
+                    paths = watcher.wait(stop)
+                    if paths is None:
+                        return 0
+                    changed, removed = paths
+                    # A path can flip between removed and changed across bursts; the latest state wins.
+                    pending_changed = (pending_changed - removed) | changed
+                    pending_removed = (pending_removed - changed) | removed
+                    previous_refs: list[str] | None = None
+                    if "docs.json" in pending_changed:
+                        try:
+                            previous_refs, docs_refs = docs_refs, load_docs_refs()
+                        except (SyncError, ValueError) as err:
+                            log(f"[WARN] docs.json is not readable yet ({err}); waiting for the next change")
+                            continue
+                    changes = TreeChanges(
+                        changed_paths=frozenset(pending_changed),
+                        removed_paths=frozenset(pending_removed),
+                        previous_refs=tuple(previous_refs) if previous_refs is not None else None,
+                    )
+                shown = ", ".join(sorted(changes.changed_paths | changes.removed_paths)[:5])
+                log(f"[WATCH] changed={len(changes.changed_paths)} removed={len(changes.removed_paths)}: {shown}")
+    except KeyboardInterrupt:
+        log("[WATCH] Stopped")
         return 0
 
-    changed_document_ids: list[str] = []
-
-    for local in create_docs:
-        response = client.create_document_raw(
-            partition=partition,
-            name=local.name,
-            external_id=local.external_id,
-            metadata=local.metadata,
-            data=local.content,
-        )
-        doc_id = str(response.get("id") or "")
-        if not doc_id:
-            raise SyncError(f"Create returned no document id for {local.ref}")
-        changed_document_ids.append(doc_id)
-        log(f"[CREATE] {local.ref} -> {doc_id}")
-
-    for local, remote in update_raw_docs:
-        doc_id = str(remote.get("id") or "")
-        if not doc_id:
-            raise SyncError(f"Remote document missing id for update: {local.ref}")
-        client.update_document_raw(partition=partition, document_id=doc_id, data=local.content)
-        changed_document_ids.append(doc_id)
-        log(f"[UPDATE_RAW] {local.ref} -> {doc_id}")
-
-    for local, remote, metadata_patch in patch_metadata_docs:
-        doc_id = str(remote.get("id") or "")
-        if not doc_id:
-            raise SyncError(f"Remote document missing id for metadata patch: {local.ref}")
-        client.patch_document_metadata(
-            partition=partition,
-            document_id=doc_id,
-            metadata_patch=metadata_patch,
-        )
-        log(f"[PATCH_METADATA] {local.ref} -> {doc_id}")
-
-    for doc in stale_docs:
-        doc_id = str(doc.get("id") or "")
-        if not doc_id:
-            continue
-        client.delete_document(partition=partition, document_id=doc_id, async_delete=True)
-        log(f"[DELETE_STALE] doc_id={doc_id}")
-
-    for doc in duplicate_docs:
-        doc_id = str(doc.get("id") or "")
-        if not doc_id:
-            continue
-        client.delete_document(partition=partition, document_id=doc_id, async_delete=True)
-        log(f"[DELETE_DUPLICATE] doc_id={doc_id}")
 
-    for doc in stale_no_external_docs:
-        doc_id = str(doc.get("id") or "")
-        if not doc_id:
-            continue
-        client.delete_document(partition=partition, document_id=doc_id, async_delete=True)
-        log(f"[DELETE_STALE_NO_EXTERNAL] doc_id={doc_id}")
+def run_sync(
+    args: argparse.Namespace,
+    *,
+    partitions: list[str],
+    docs_refs: list[str],
+    commit_sha: str,
+    cache: NormalizationCache | None,
+    plan_file: dict[str, Any] | None = None,
+) -> int:
+    if args.skip_remote and (args.plan_out or plan_file is not None):
+        raise SyncError("--plan-out and --apply need the Ragie API; drop --skip-remote")
+    if args.skip_remote:
+        for partition in partitions:
+            token = _LOG_PREFIX.set(f"[{partition}] " if len(partitions) > 1 else "")
+            try:
+                prepare_partition_job(
+                    PartitionJob(partition=partition),
+                    args=args,
+                    docs_refs=docs_refs,
+                    commit_sha=commit_sha,
+                    client=None,
+                    cache=cache,
+                )
+            finally:
+                _LOG_PREFIX.reset(token)
+        log("[INFO] --skip-remote enabled, ending after local discovery")
+        return 0
 
-    changed_document_ids = sorted(set(changed_document_ids))
+    client_options = build_client_options(args)
+    head_commit = current_git_commit()
+    if plan_file is not None:
+        # State records the commit the applied content came from, not the checkout applying it.
+        planned_commit = str(plan_file.get("commit_sha") or "")
+        if planned_commit != head_commit:
+            log(
+                f"[WARN] Plan was built at {planned_commit or 'an unknown commit'}; "
+                f"applying its recorded content at {head_commit}"
+            )
+        head_commit = planned_commit
 
-    poll_changed_documents(
-        client=client,
-        partition=partition,
-        document_ids=changed_document_ids,
-        timeout_seconds=args.poll_timeout,
-        interval_seconds=args.poll_interval,
-        allow_indexed=args.allow_indexed,
+    started = time.monotonic()
+    jobs = run_partition_jobs(
+        args=args,
+        partitions=partitions,
+        docs_refs=docs_refs,
+        commit_sha=commit_sha,
+        head_commit=head_commit,
+        client_options=client_options,
+        cache=cache,
+        plan_file=plan_file,
     )
+    metrics = _METRICS.get()
+    if metrics is not None:
+        for job in jobs:
+            status, counts = partition_outcome(job, dry_run=args.dry_run)
+            metrics.record_partition(
+                job.partition,
+                status=status,
+                seconds=job.seconds,
+                counts=counts,
+                time_to_ready=job.result.time_to_ready if job.result is not None else {},
+                deletes=job.result.deletes.to_json() if job.result is not None and not args.dry_run else None,
+            )
+    if args.plan_out:
+        if any(job.error is not None for job in jobs):
+            log("[WARN] Sync plan not written: planning failed for at least one partition")
+        else:
+            write_plan_file(Path(args.plan_out), jobs, args=args, head_commit=head_commit)
 
-    log(
-        f"[OK] Sync complete for partition '{partition}': "
-        f"created={len(create_docs)} updated={len(update_raw_docs)} "
-        f"patched={len(patch_metadata_docs)} deleted={len(stale_docs) + len(duplicate_docs) + len(stale_no_external_docs)}"
-    )
-    if created_instruction and not changed_document_ids:
+    rate_limiter = client_options["rate_limiter"]
+    if rate_limiter is not None:
+        stats = rate_limiter.stats()
         log(
-            "[WARN] Entity instruction was created but no documents changed in this run. "
-            "Run a full sync to backfill extracted entities on existing docs."
+            "[INFO] Rate limiter: "
+            f"rate={stats['rate']}/s max={stats['max_rate']}/s requests={stats['requests']} "
+            f"throttled={stats['throttled']} waited={stats['waited_seconds']}s"
         )
-    return 0
+
+    if len(jobs) == 1:
+        if jobs[0].error is not None:
+            raise jobs[0].error
+        return 0
+
+    log_partition_summary(jobs, dry_run=args.dry_run, elapsed=time.monotonic() - started)
+    return 1 if any(job.error is not None for job in jobs) else 0
 
 
 if __name__ == "__main__":
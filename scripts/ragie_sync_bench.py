@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for scripts/ragie_sync.py.
+
+Benchmarks:
+- normalize: the single-pass MDX tokenizer (normalize_doc_text) against the original
+  regex chain (_normalize_doc_text_regex) over every docs.json and tenant page, plus
+  a few adversarial inputs (unclosed tags/comments/callouts) that made the regex
+  chain quadratic.
+- scale: synthetic docs trees (1k/10k/50k pages of realistic MDX) measuring
+  build_local_docs time and peak memory, plan computation (grouping,
+  pick_latest_doc, compare_metadata_patch, build_sync_plan), and end-to-end
+  syncs against scripts/ragie_fake_server.py at several latencies and
+  concurrencies. Results can be written as JSON and compared to a baseline
+  from another commit.
+
+Usage:
+  python3 scripts/ragie_sync_bench.py normalize
+  python3 scripts/ragie_sync_bench.py normalize --repeat 20
+  python3 scripts/ragie_sync_bench.py scale --output /tmp/bench-head.json
+  python3 scripts/ragie_sync_bench.py scale --pages 1000 --sync-pages 500 --baseline /tmp/bench-main.json
+
+Exit codes:
+  0 = OK
+  1 = the tokenizer's output differs from the regex chain on a docs page
+  2 = a scale timing regressed past --max-regression against --baseline
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import ragie_sync
+
+FAKE_SERVER = Path(__file__).resolve().parent / "ragie_fake_server.py"
+
+
+def corpus_pages() -> list[tuple[str, str]]:
+    """(ref, raw text) for every docs.json page and every tenant page, as the sync would read them."""
+    refs = ragie_sync.load_docs_refs()
+    for slug in ragie_sync.discover_tenant_slugs():
+        refs.extend(ragie_sync.discover_tenant_refs(slug))
+
+    pages: dict[str, str] = {}
+    for ref in refs:
+        path = ragie_sync.resolve_ref_path(ref)
+        if path is not None:
+            pages[ref] = path.read_text(encoding="utf-8", errors="ignore")
+    return sorted(pages.items())
+
+
+def adversarial_inputs(size: int) -> dict[str, str]:
+    return {
+        "unclosed_tags": "<a" * size,
+        "unclosed_comments": "{/*" * size,
+        "unclosed_callouts": "<Info>" * size,
+        "mismatched_callouts": "<Info>x" * size + "</Tip>",
+    }
+
+
+def time_per_call(fn: Callable[[], Any], *, repeat: int) -> float:
+    """Best-of-`repeat` wall time of fn(), in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench_normalize(args: argparse.Namespace) -> int:
+    pages = corpus_pages()
+    mismatched = [
+        ref
+        for ref, text in pages
+        if ragie_sync.normalize_doc_text(text, ref) != ragie_sync._normalize_doc_text_regex(text, ref)
+    ]
+    for ref in mismatched:
+        print(f"[FAIL] tokenizer output differs from regex chain: {ref}")
+
+    total_bytes = sum(len(text.encode("utf-8")) for _, text in pages)
+    print(f"[INFO] Corpus: pages={len(pages)} size={total_bytes / 1024:.0f} KiB repeat={args.repeat}")
+
+    implementations = [
+        ("regex", ragie_sync._normalize_doc_text_regex),
+        ("tokenizer", ragie_sync.normalize_doc_text),
+    ]
+    corpus_times = {
+        name: time_per_call(lambda fn=fn: [fn(text, ref) for ref, text in pages], repeat=args.repeat)
+        for name, fn in implementations
+    }
+    for name, seconds in corpus_times.items():
+        print(
+            f"[BENCH] corpus {name:<9} {seconds * 1000:8.1f} ms  "
+            f"{seconds / len(pages) * 1e6:7.1f} us/page  {total_bytes / seconds / 1e6:6.1f} MB/s"
+        )
+    print(f"[BENCH] corpus speedup {corpus_times['regex'] / corpus_times['tokenizer']:.2f}x")
+
+    for case, text in adversarial_inputs(args.adversarial_size).items():
+        regex = time_per_call(lambda: ragie_sync._normalize_doc_text_regex(text, case), repeat=1)
+        tokenizer = time_per_call(lambda: ragie_sync.normalize_doc_text(text, case), repeat=1)
+        print(f"[BENCH] {case:<20} regex={regex * 1000:8.1f} ms  tokenizer={tokenizer * 1000:6.1f} ms")
+
+    return 1 if mismatched else 0
+
+
+def parse_int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_float_list(value: str) -> list[float]:
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+CALLOUTS = ("Info", "Tip", "Note", "Warning")
+TAGS = ("attribution", "orders", "ltv", "retention", "ads", "shopify", "amazon", "dbt", "bigquery", "looker")
+WORDS = (
+    "order customer channel cohort revenue refund subscription campaign margin attribution "
+    "dashboard warehouse model table column metric dimension source medium spend return"
+).split()
+
+
+def synthetic_page(index: int, rng: random.Random) -> str:
+    """One MDX page shaped like the real docs: frontmatter, headings, callouts, code, tables, comments."""
+
+    def sentence() -> str:
+        words = rng.choices(WORDS, k=rng.randint(8, 20))
+        return " ".join(words).capitalize() + "."
+
+    def paragraph() -> str:
+        return " ".join(sentence() for _ in range(rng.randint(2, 5)))
+
+    tags = "\n".join(f"  - {tag}" for tag in rng.sample(TAGS, k=rng.randint(1, 3)))
+    parts = [
+        f'---\ntitle: "Synthetic Page {index}"\ndescription: "{sentence()}"\ntags:\n{tags}\n---\n',
+        paragraph(),
+    ]
+    for section in range(rng.randint(2, 5)):
+        parts.append(f"## Section {section + 1}")
+        parts.append(paragraph())
+        callout = rng.choice(CALLOUTS)
+        link = f"/synthetic/page-{rng.randrange(index + 1):05d}"
+        parts.append(f"<{callout}>\n{paragraph()} See [the guide]({link}).\n</{callout}>")
+        if rng.random() < 0.5:
+            parts.append(
+                "```sql\nselect order_id, sum(net_revenue) as revenue\nfrom `sm_transformed_v2.obt_orders`\n"
+                f"where order_date >= '2024-0{rng.randint(1, 9)}-01'\ngroup by 1\n```"
+            )
+        if rng.random() < 0.3:
+            rows = "\n".join(f"| `{rng.choice(WORDS)}_{row}` | {sentence()} |" for row in range(rng.randint(3, 8)))
+            parts.append(f"| Column | Description |\n|---|---|\n{rows}")
+        if rng.random() < 0.2:
+            parts.append(f"{{/* TODO: {sentence()} */}}")
+            parts.append(f'<Card title="{rng.choice(WORDS).title()}" href="/synthetic/page-0">\n{sentence()}\n</Card>')
+    return "\n\n".join(parts) + "\n"
+
+
+def write_synthetic_tree(root: Path, *, pages: int, seed: int) -> list[str]:
+    """Write docs.json plus `pages` MDX pages under root; returns their refs."""
+    refs = [f"synthetic/section-{index // 100:03d}/page-{index:05d}" for index in range(pages)]
+    for index, ref in enumerate(refs):
+        path = root / f"{ref}.mdx"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(synthetic_page(index, random.Random(seed * 1_000_003 + index)), encoding="utf-8")
+    (root / "docs.json").write_text(json.dumps({"navigation": {"pages": refs}}), encoding="utf-8")
+    return refs
+
+
+@contextlib.contextmanager
+def synthetic_repo(*, pages: int, seed: int) -> Iterator[list[str]]:
+    """A temporary synthetic docs tree with ragie_sync's REPO_ROOT/DOCS_JSON pointed at it."""
+    saved = ragie_sync.REPO_ROOT, ragie_sync.DOCS_JSON
+    with tempfile.TemporaryDirectory(prefix="ragie-bench-") as tmp:
+        root = Path(tmp)
+        write_synthetic_tree(root, pages=pages, seed=seed)
+        ragie_sync.REPO_ROOT, ragie_sync.DOCS_JSON = root, root / "docs.json"
+        try:
+            yield ragie_sync.load_docs_refs()
+        finally:
+            ragie_sync.REPO_ROOT, ragie_sync.DOCS_JSON = saved
+
+
+def build_docs(refs: list[str], *, jobs: int) -> list[ragie_sync.LocalDoc]:
+    return ragie_sync.build_local_docs(
+        refs=refs,
+        partition="shared_docs",
+        docs_base_url="https://docs.sourcemedium.com",
+        repo_name="bench",
+        source="bench",
+        commit_sha="bench",
+        jobs=jobs,
+    )
+
+
+def synthetic_remote_docs(local_docs: list[ragie_sync.LocalDoc], *, seed: int) -> list[dict[str, Any]]:
+    """A remote listing drifted from local_docs the way a real partition drifts between syncs.
+
+    About 2% of local docs are missing remotely, 10% have stale content, 5% stale metadata,
+    3% have an older duplicate, and 2% extra remote docs no longer exist locally.
+    """
+    rng = random.Random(seed)
+    remote: list[dict[str, Any]] = []
+
+    def remote_doc(external_id: str, metadata: dict[str, Any], updated_at: str) -> dict[str, Any]:
+        doc_id = hashlib.sha1(f"{external_id}{updated_at}".encode()).hexdigest()
+        return {
+            "id": doc_id,
+            "external_id": external_id,
+            "name": metadata.get("docs_ref", external_id),
+            "status": "ready",
+            "updated_at": updated_at,
+            "metadata": metadata,
+        }
+
+    for doc in local_docs:
+        roll = rng.random()
+        if roll < 0.02:
+            continue
+        metadata = dict(doc.metadata)
+        if roll < 0.12:
+            metadata["content_hash"] = "stale"
+            metadata["metadata_fingerprint"] = "stale"
+        elif roll < 0.17:
+            metadata["title"] = "Stale title"
+            metadata["metadata_fingerprint"] = "stale"
+        remote.append(remote_doc(doc.external_id, metadata, "2025-02-01T00:00:00+00:00"))
+        if rng.random() < 0.03:
+            remote.append(remote_doc(doc.external_id, metadata, "2025-01-01T00:00:00+00:00"))
+    for index in range(len(local_docs) // 50):
+        metadata = {"source": "bench", "repo": "bench", "docs_ref": f"removed/page-{index}"}
+        remote.append(remote_doc(f"bench:shared_docs:removed/page-{index}", metadata, "2025-01-01T00:00:00+00:00"))
+    return remote
+
+
+def bench_build(refs: list[str], *, jobs: int, repeat: int) -> dict[str, Any]:
+    seconds = time_per_call(lambda: build_docs(refs, jobs=jobs), repeat=repeat)
+    tracemalloc.start()
+    try:
+        docs = build_docs(refs, jobs=jobs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "pages": len(docs),
+        "jobs": jobs,
+        "seconds": round(seconds, 4),
+        "pages_per_second": round(len(docs) / seconds, 1),
+        "peak_mb": round(peak / 1e6, 2),
+    }
+
+
+def bench_plan(local_docs: list[ragie_sync.LocalDoc], *, seed: int, repeat: int) -> dict[str, Any]:
+    remote_docs = synthetic_remote_docs(local_docs, seed=seed)
+    local_by_external = {doc.external_id: doc for doc in local_docs}
+
+    def group() -> dict[str, list[dict[str, Any]]]:
+        grouped: dict[str, list[dict[str, Any]]] = {}
+        for doc in remote_docs:
+            grouped.setdefault(str(doc.get("external_id") or ""), []).append(doc)
+        return grouped
+
+    grouped = group()
+    latest = [ragie_sync.pick_latest_doc(docs)[0] for docs in grouped.values()]
+    pairs = [
+        (doc["metadata"], local_by_external[doc["external_id"]].metadata)
+        for doc in latest
+        if doc["external_id"] in local_by_external
+    ]
+
+    def build_plan() -> ragie_sync.SyncPlan:
+        return ragie_sync.build_sync_plan(local_docs=local_docs, managed_remote_docs=remote_docs, partial_sync=False)
+
+    plan = build_plan()
+    return {
+        "pages": len(local_docs),
+        "remote_docs": len(remote_docs),
+        "operations": len(ragie_sync.plan_operations(plan)),
+        "group_seconds": round(time_per_call(group, repeat=repeat), 5),
+        "pick_latest_doc_seconds": round(
+            time_per_call(lambda: [ragie_sync.pick_latest_doc(docs) for docs in grouped.values()], repeat=repeat), 5
+        ),
+        "compare_metadata_patch_seconds": round(
+            time_per_call(lambda: [ragie_sync.compare_metadata_patch(r, d) for r, d in pairs], repeat=repeat), 5
+        ),
+        "build_sync_plan_seconds": round(time_per_call(build_plan, repeat=repeat), 5),
+        "plan_operations_seconds": round(time_per_call(lambda: ragie_sync.plan_operations(plan), repeat=repeat), 5),
+    }
+
+
+@contextlib.contextmanager
+def fake_ragie_server(*, latency_ms: float, seed: int) -> Iterator[str]:
+    """Run scripts/ragie_fake_server.py in a subprocess (so it does not share our GIL); yields its base URL."""
+    process = subprocess.Popen(
+        [sys.executable, str(FAKE_SERVER), "--port", "0", "--latency-ms", str(latency_ms), "--seed", str(seed)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert process.stdout is not None
+        line = process.stdout.readline()
+        if "listening on" not in line:
+            raise ragie_sync.SyncError(f"Fake Ragie server did not start: {line!r}")
+        yield line.rsplit(" ", 1)[-1].strip()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def touch_docs(local_docs: list[ragie_sync.LocalDoc], *, fraction: float) -> list[ragie_sync.LocalDoc]:
+    """Copy of local_docs with the content of every 1/fraction-th doc changed."""
+    step = max(1, round(1 / fraction))
+    touched = []
+    for index, doc in enumerate(local_docs):
+        if index % step == 0:
+            content = doc.content + "\n\nEdited."
+            content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            metadata = {**doc.metadata, "content_hash": content_hash}
+            metadata["metadata_fingerprint"] = ragie_sync.metadata_fingerprint(
+                metadata, volatile_keys=ragie_sync.DEFAULT_VOLATILE_METADATA_KEYS
+            )
+            doc = ragie_sync.LocalDoc(
+                ref=doc.ref,
+                path=doc.path,
+                name=doc.name,
+                external_id=doc.external_id,
+                content=content,
+                content_hash=content_hash,
+                metadata=metadata,
+            )
+        touched.append(doc)
+    return touched
+
+
+def bench_sync(
+    local_docs: list[ragie_sync.LocalDoc], *, latency_ms: float, concurrency: int, seed: int
+) -> dict[str, Any]:
+    """Initial sync, no-op resync and a 10%-edited resync against a fresh fake server."""
+    options = ragie_sync.SyncOptions(
+        source="bench",
+        repo_name="bench",
+        partial_sync=False,
+        dry_run=False,
+        concurrency=concurrency,
+        poll_timeout=600,
+        poll_interval=0.05,
+        allow_indexed=False,
+        poll_concurrency=concurrency,
+    )
+    result: dict[str, Any] = {"pages": len(local_docs), "latency_ms": latency_ms, "concurrency": concurrency}
+    with fake_ragie_server(latency_ms=latency_ms, seed=seed) as base_url:
+        metrics = ragie_sync.SyncMetrics()
+        with ragie_sync.RagieClient(
+            api_key="bench",
+            base_url=base_url,
+            timeout=30,
+            max_retries=3,
+            retry_base_delay=0.05,
+            pool_size=concurrency,
+            metrics=metrics,
+        ) as client:
+            edited = touch_docs(local_docs, fraction=0.1)
+            for stage, docs in (("initial", local_docs), ("noop", local_docs), ("edit_10pct", edited)):
+                before = sum(stats.requests for stats in metrics.endpoints.values())
+                started = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ragie_sync.sync_documents(client=client, partition="shared_docs", local_docs=docs, options=options)
+                result[f"{stage}_seconds"] = round(time.perf_counter() - started, 3)
+                result[f"{stage}_requests"] = sum(stats.requests for stats in metrics.endpoints.values()) - before
+    return result
+
+
+def result_key(stage: str, row: dict[str, Any]) -> str:
+    params = [f"{name}={row[name]}" for name in ("pages", "jobs", "latency_ms", "concurrency") if name in row]
+    return f"{stage}[{','.join(params)}]"
+
+
+# Timing differences below this are scheduler noise, whatever the ratio.
+NOISE_FLOOR_SECONDS = 0.005
+
+
+def compare_to_baseline(report: dict[str, Any], baseline: dict[str, Any], *, max_regression: float) -> list[str]:
+    """Print per-metric ratios against a baseline report; returns the metrics that regressed."""
+    previous = {
+        result_key(stage, row): row for stage, rows in baseline.get("results", {}).items() for row in rows
+    }
+    regressions = []
+    for stage, rows in report["results"].items():
+        for row in rows:
+            key = result_key(stage, row)
+            old = previous.get(key)
+            if old is None:
+                continue
+            for metric, value in row.items():
+                if not (metric.endswith("seconds") or metric == "peak_mb") or not old.get(metric):
+                    continue
+                ratio = value / old[metric]
+                noise = metric.endswith("seconds") and value - old[metric] < NOISE_FLOOR_SECONDS
+                flag = "REGRESSION" if ratio > 1 + max_regression and not noise else "ok"
+                print(f"[COMPARE] {key} {metric}: {old[metric]} -> {value} ({ratio:.2f}x) {flag}")
+                if flag == "REGRESSION":
+                    regressions.append(f"{key} {metric}")
+    return regressions
+
+
+def bench_scale(args: argparse.Namespace) -> int:
+    report: dict[str, Any] = {
+        "benchmark": "scale",
+        "commit": ragie_sync.run_git("rev-parse", "HEAD") or "",
+        "python": platform.python_version(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "results": {"build_local_docs": [], "plan": [], "sync": []},
+    }
+    results = report["results"]
+
+    for pages in args.pages:
+        with synthetic_repo(pages=pages, seed=args.seed) as refs, contextlib.redirect_stdout(io.StringIO()):
+            build = bench_build(refs, jobs=args.jobs, repeat=args.repeat)
+            plan = bench_plan(build_docs(refs, jobs=args.jobs), seed=args.seed, repeat=args.repeat)
+        results["build_local_docs"].append(build)
+        results["plan"].append(plan)
+        print(
+            f"[BENCH] build_local_docs pages={pages:<6} {build['seconds'] * 1000:9.1f} ms  "
+            f"{build['pages_per_second']:8.0f} pages/s  peak={build['peak_mb']:.1f} MB"
+        )
+        print(
+            f"[BENCH] plan             pages={pages:<6} "
+            f"build_sync_plan={plan['build_sync_plan_seconds'] * 1000:7.1f} ms  "
+            f"compare_metadata_patch={plan['compare_metadata_patch_seconds'] * 1000:6.1f} ms  "
+            f"pick_latest_doc={plan['pick_latest_doc_seconds'] * 1000:6.1f} ms  ops={plan['operations']}"
+        )
+
+    if args.sync_pages:
+        # Docs load their content from the tree when written, so it stays in place for the syncs.
+        with synthetic_repo(pages=args.sync_pages, seed=args.seed) as refs:
+            with contextlib.redirect_stdout(io.StringIO()):
+                local_docs = build_docs(refs, jobs=args.jobs)
+            for latency_ms in args.latency_ms:
+                for concurrency in args.concurrency:
+                    row = bench_sync(local_docs, latency_ms=latency_ms, concurrency=concurrency, seed=args.seed)
+                    results["sync"].append(row)
+                    print(
+                        f"[BENCH] sync pages={row['pages']} latency={latency_ms:g}ms concurrency={concurrency:<3} "
+                        f"initial={row['initial_seconds']:.2f}s ({row['initial_requests']} req)  "
+                        f"noop={row['noop_seconds']:.2f}s ({row['noop_requests']} req)  "
+                        f"edit_10pct={row['edit_10pct_seconds']:.2f}s ({row['edit_10pct_requests']} req)"
+                    )
+
+    if args.output:
+        ragie_sync.write_json_atomic(Path(args.output), report)
+        print(f"[INFO] Wrote results to {args.output}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_to_baseline(report, baseline, max_regression=args.max_regression)
+        if regressions:
+            print(
+                f"[FAIL] {len(regressions)} metric(s) regressed more than {args.max_regression:.0%} vs {args.baseline}"
+            )
+            return 2
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks for ragie_sync.py")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    normalize = subparsers.add_parser("normalize", help="MDX tokenizer vs regex chain")
+    normalize.add_argument("--repeat", type=int, default=5, help="Timed runs per implementation (best is reported)")
+    normalize.add_argument(
+        "--adversarial-size",
+        type=int,
+        default=5000,
+        help="Repetitions of each adversarial snippet (the regex chain is quadratic in this)",
+    )
+    normalize.set_defaults(run=bench_normalize)
+
+    scale = subparsers.add_parser("scale", help="Synthetic docs trees: build, plan and end-to-end sync")
+    scale.add_argument(
+        "--pages", type=parse_int_list, default=[1000, 10000, 50000], help="Tree sizes for build/plan (comma-separated)"
+    )
+    scale.add_argument(
+        "--sync-pages", type=int, default=1000, help="Tree size for end-to-end syncs against the fake API (0 = skip)"
+    )
+    scale.add_argument("--latency-ms", type=parse_float_list, default=[0.0, 20.0], help="Fake API latencies to sync at")
+    scale.add_argument("--concurrency", type=parse_int_list, default=[4, 16], help="Sync concurrencies to run at")
+    scale.add_argument("--jobs", type=int, default=1, help="--jobs passed to build_local_docs")
+    scale.add_argument("--repeat", type=int, default=3, help="Timed runs per build/plan measurement (best is reported)")
+    scale.add_argument("--seed", type=int, default=1, help="Seed for the synthetic tree, remote drift and fake API")
+    scale.add_argument("--output", default="", help="Write results as JSON to this path")
+    scale.add_argument("--baseline", default="", help="Results JSON from another commit to compare against")
+    scale.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.25,
+        help="Fraction a timing may grow over --baseline before the run exits 2",
+    )
+    scale.set_defaults(run=bench_scale)
+
+    args = parser.parse_args()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,1708 @@
+#!/usr/bin/env python3
+"""
+Offline tests for scripts/ragie_sync.py.
+
+These run against a local stand-in HTTP server and never touch the Ragie API.
+
+Usage:
+    pytest tests/test_ragie_sync.py -v
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+import ragie_fake_server  # noqa: E402
+import ragie_sync  # noqa: E402
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002
+        pass
+
+    def _reply(self, status, body, headers=None):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        with server.lock:
+            server.requests.append((self.command, self.path, self.client_address[1], body))
+            status = server.statuses.pop(0) if server.statuses else 200
+        headers = {}
+        if isinstance(status, tuple):
+            status, headers = status
+        if status >= 400:
+            self._reply(status, {"detail": f"injected {status}"}, headers)
+        else:
+            self._reply(status, {"id": "doc-1", "status": "ready", "documents": [], "path": self.path})
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _handle
+
+
+@pytest.fixture()
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = []
+    server.statuses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client_options(server, **overrides):
+    options = {
+        "api_key": "test-key",
+        "base_url": f"http://127.0.0.1:{server.server_address[1]}",
+        "timeout": 5,
+        "max_retries": 2,
+        "retry_base_delay": 0.0,
+        "pool_size": 4,
+    }
+    options.update(overrides)
+    return options
+
+
+def make_client(server, **overrides):
+    return ragie_sync.RagieClient(**client_options(server, **overrides))
+
+
+class TestConnectionPool:
+    def test_sequential_requests_reuse_one_connection(self, stub_server):
+        with make_client(stub_server) as client:
+            for _ in range(5):
+                client.get_document(partition="shared_docs", document_id="doc-1")
+
+        client_ports = {port for _, _, port, _ in stub_server.requests}
+        assert len(stub_server.requests) == 5
+        assert len(client_ports) == 1
+        assert client._pool.connections_opened == 1
+
+    def test_concurrent_requests_bounded_by_pool_size(self, stub_server):
+        client = make_client(stub_server, pool_size=2)
+        threads = [
+            threading.Thread(
+                target=client.get_document,
+                kwargs={"partition": "shared_docs", "document_id": f"doc-{i}"},
+            )
+            for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.close()
+
+        assert len(stub_server.requests) == 8
+        assert client._pool.connections_opened <= 2
+
+    def test_retryable_status_is_retried_on_pooled_connection(self, stub_server):
+        stub_server.statuses = [503, 502]
+        with make_client(stub_server) as client:
+            result = client.get_document(partition="shared_docs", document_id="doc-1")
+
+        assert result["id"] == "doc-1"
+        assert len(stub_server.requests) == 3
+
+    def test_non_retryable_status_raises_sync_error(self, stub_server):
+        stub_server.statuses = [404]
+        with make_client(stub_server) as client:
+            with pytest.raises(ragie_sync.SyncError, match="Ragie API error 404 for GET /documents/missing"):
+                client.get_document(partition="shared_docs", document_id="missing")
+
+
+def make_local_doc(ref, content="body"):
+    content_hash = ragie_sync.sha256_text(content)
+    return ragie_sync.LocalDoc(
+        ref=ref,
+        path=REPO_ROOT / f"{ref}.mdx",
+        name=ref,
+        external_id=f"repo:test|partition:shared_docs|ref:{ref}",
+        content=content,
+        content_hash=content_hash,
+        metadata={"source": "test", "repo": "test", "docs_ref": ref, "content_hash": content_hash},
+    )
+
+
+class RecordingClient:
+    """In-memory stand-in for RagieClient write calls."""
+
+    def __init__(self, fail_on=None, delay=0.0):
+        self.calls = []
+        self.patches = []
+        self.lock = threading.Lock()
+        self.fail_on = fail_on
+        self.delay = delay
+
+    def _record(self, name, doc_id):
+        if self.delay:
+            threading.Event().wait(self.delay)
+        with self.lock:
+            self.calls.append((name, doc_id))
+        if self.fail_on == (name, doc_id):
+            raise ragie_sync.SyncError(f"injected failure for {name} {doc_id}")
+
+    def create_document_raw(self, *, partition, name, external_id, metadata, data):
+        doc_id = f"new-{name}"
+        self._record("create", doc_id)
+        return {"id": doc_id}
+
+    def update_document_raw(self, *, partition, document_id, data):
+        self._record("update_raw", document_id)
+        return {}
+
+    def patch_document_metadata(self, *, partition, document_id, metadata_patch):
+        self._record("patch_metadata", document_id)
+        self.patches.append((document_id, metadata_patch))
+        return {}
+
+    def delete_document(self, *, partition, document_id, async_delete):
+        self._record("delete", document_id)
+        return {}
+
+
+class TestExecuteOperations:
+    def make_plan(self, count=6):
+        plan = ragie_sync.SyncPlan()
+        for i in range(count):
+            local = make_local_doc(f"docs/page-{i}")
+            remote = {"id": f"doc-{i}"}
+            plan.update_raw_docs.append((local, remote))
+            plan.patch_metadata_docs.append((local, remote, {"title": "new"}))
+        plan.create_docs.append(make_local_doc("docs/new-page"))
+        plan.stale_docs.append({"id": "stale-1"})
+        return plan
+
+    @pytest.mark.parametrize("concurrency", [1, 4])
+    def test_replace_patches_metadata_before_raw_update_per_document(self, concurrency):
+        client = RecordingClient(delay=0.005)
+        applied = ragie_sync.execute_operations(
+            client=client,
+            partition="shared_docs",
+            operations=ragie_sync.plan_operations(self.make_plan()),
+            concurrency=concurrency,
+        )
+        changed = ragie_sync.changed_document_ids_of(applied)
+
+        for i in range(6):
+            doc_calls = [name for name, doc_id in client.calls if doc_id == f"doc-{i}"]
+            assert doc_calls == ["update_raw", "patch_metadata"]
+        assert sorted(changed) == sorted([f"doc-{i}" for i in range(6)] + ["new-docs/new-page"])
+        assert ("delete", "stale-1") in client.calls
+
+    def test_first_failure_stops_remaining_work(self):
+        plan = ragie_sync.SyncPlan()
+        for i in range(50):
+            plan.update_raw_docs.append((make_local_doc(f"docs/page-{i}"), {"id": f"doc-{i}"}))
+        client = RecordingClient(fail_on=("update_raw", "doc-0"), delay=0.01)
+
+        with pytest.raises(ragie_sync.SyncError, match="injected failure"):
+            ragie_sync.execute_operations(
+                client=client,
+                partition="shared_docs",
+                operations=ragie_sync.plan_operations(plan),
+                concurrency=2,
+            )
+        assert len(client.calls) < 50
+
+
+class TestReplaceOperations:
+    def make_plan(self):
+        plan = ragie_sync.SyncPlan()
+        edited, patched = make_local_doc("docs/edited", "new body"), make_local_doc("docs/patched")
+        remote = {"id": "doc-e", "metadata": {"content_hash": "old", "metadata_fingerprint": "fp-old", "title": "t"}}
+        plan.update_raw_docs.append((edited, remote))
+        plan.update_raw_docs.append((make_local_doc("docs/raw-only", "x"), {"id": "doc-r"}))
+        plan.patch_metadata_docs.append((edited, remote, {"content_hash": edited.content_hash, "title": None}))
+        plan.patch_metadata_docs.append((patched, {"id": "doc-p"}, {"title": "new"}))
+        return plan
+
+    def test_content_and_metadata_changes_merge_into_one_replace(self):
+        operations = ragie_sync.plan_operations(self.make_plan())
+
+        assert [(op.kind, op.doc_id) for op in operations] == [
+            ("REPLACE", "doc-e"),
+            ("UPDATE_RAW", "doc-r"),
+            ("PATCH_METADATA", "doc-p"),
+        ]
+        assert operations[0].metadata_patch == {"content_hash": operations[0].local.content_hash, "title": None}
+
+    def test_replace_is_a_raw_update_then_one_metadata_patch(self):
+        operation = ragie_sync.plan_operations(self.make_plan())[0]
+        client = RecordingClient()
+
+        ragie_sync.apply_operation(client=client, partition="shared_docs", operation=operation)
+
+        assert client.calls == [("update_raw", "doc-e"), ("patch_metadata", "doc-e")]
+        assert client.patches == [("doc-e", {"content_hash": operation.local.content_hash, "title": None})]
+
+    def test_write_calls_are_counted_from_the_issued_operations(self):
+        operations = ragie_sync.plan_operations(self.make_plan())
+        assert ragie_sync.plan_write_calls(operations) == (4, 0)
+
+        operations[0] = dataclasses.replace(operations[0], metadata_patch={})
+        assert ragie_sync.plan_write_calls(operations) == (3, 1)
+
+    def test_failed_raw_update_leaves_the_remote_content_hash_alone(self):
+        operation = ragie_sync.plan_operations(self.make_plan())[0]
+        client = RecordingClient(fail_on=("update_raw", "doc-e"))
+
+        with pytest.raises(ragie_sync.SyncError, match="injected failure"):
+            ragie_sync.apply_operation(client=client, partition="shared_docs", operation=operation)
+
+        assert client.calls == [("update_raw", "doc-e")]
+        assert client.patches == []
+
+    def test_replace_against_the_api(self, fake_ragie):
+        local = make_local_doc("docs/edited", "new body")
+        doc_id = fake_ragie.state.new_document(
+            partition="shared_docs",
+            body={"name": "docs/edited", "external_id": local.external_id, "data": "old", "metadata": {"title": "t"}},
+        )["id"]
+        remote = {"id": doc_id, "metadata": {"title": "t"}}
+        plan = ragie_sync.SyncPlan()
+        plan.update_raw_docs.append((local, remote))
+        plan.patch_metadata_docs.append((local, remote, {"content_hash": local.content_hash, "title": None}))
+        fake_ragie.state.request_log.clear()
+
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            (operation,) = ragie_sync.plan_operations(plan)
+            assert ragie_sync.apply_operation(client=client, partition="shared_docs", operation=operation) == doc_id
+
+        assert [method for method, _ in fake_ragie.state.request_log] == ["PUT", "PATCH"]
+        stored = fake_ragie.state.documents[doc_id]
+        assert stored["data"] == "new body"
+        assert stored["metadata"] == {"content_hash": local.content_hash}
+
+
+class ReadyClient(RecordingClient):
+    def get_document(self, *, partition, document_id):
+        self._record("get", document_id)
+        return {"id": document_id, "status": "ready"}
+
+
+class TestOperationJournal:
+    def options(self):
+        return ragie_sync.SyncOptions(
+            source="test",
+            repo_name="test",
+            partial_sync=False,
+            dry_run=False,
+            concurrency=1,
+            poll_timeout=5,
+            poll_interval=0.01,
+            allow_indexed=False,
+        )
+
+    def result(self, count=4):
+        local_docs = [make_local_doc(f"docs/page-{i}") for i in range(count)]
+        plan = ragie_sync.build_sync_plan(local_docs=local_docs, managed_remote_docs=[], partial_sync=False)
+        return ragie_sync.SyncResult(managed_remote_docs=[], plan=plan)
+
+    def test_resume_skips_completed_writes_and_polls_every_doc(self, tmp_path):
+        path = tmp_path / "shared_docs.journal.jsonl"
+        journal = ragie_sync.OperationJournal(path, context={"partition": "shared_docs", "commit_sha": "abc"})
+        crashing = ReadyClient(fail_on=("create", "new-docs/page-2"))
+        with pytest.raises(ragie_sync.SyncError, match="injected failure"):
+            ragie_sync.execute_sync_plan(
+                client=crashing, partition="shared_docs", result=self.result(), options=self.options(), journal=journal
+            )
+        with path.open("a", encoding="utf-8") as handle:
+            handle.write('{"event":"done","op":"CRE')  # torn append
+
+        resumed = ragie_sync.OperationJournal.load(path)
+        assert resumed.header["commit_sha"] == "abc"
+        assert len(resumed.completed) == 2 and len(resumed.in_doubt) == 1
+
+        client = ReadyClient()
+        result = ragie_sync.SyncResult(
+            managed_remote_docs=[], plan=ragie_sync.sync_plan_from_json(resumed.header["plan"])
+        )
+        ragie_sync.execute_sync_plan(
+            client=client, partition="shared_docs", result=result, options=self.options(), journal=resumed
+        )
+
+        assert [call for call in client.calls if call[0] == "create"] == [
+            ("create", "new-docs/page-2"),
+            ("create", "new-docs/page-3"),
+        ]
+        assert sorted(doc_id for name, doc_id in client.calls if name == "get") == [
+            f"new-docs/page-{i}" for i in range(4)
+        ]
+        assert len(result.applied) == 4
+
+        resumed.complete()
+        assert not path.exists()
+        assert ragie_sync.OperationJournal.load(path) is None
+
+
+class StatusClient:
+    """Stand-in for RagieClient.get_document that walks each doc through a status script."""
+
+    def __init__(self, scripts):
+        self.scripts = {doc_id: list(statuses) for doc_id, statuses in scripts.items()}
+        self.polls = []
+        self.lock = threading.Lock()
+
+    def get_document(self, *, partition, document_id):
+        with self.lock:
+            self.polls.append(document_id)
+            statuses = self.scripts[document_id]
+            status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        return {"id": document_id, "status": status, "errors": ["bad pdf"] if status == "failed" else []}
+
+
+class TestIngestionPolling:
+    def poll(self, client, **overrides):
+        options = {
+            "client": client,
+            "partition": "shared_docs",
+            "document_ids": sorted(client.scripts),
+            "timeout_seconds": 5,
+            "interval_seconds": 0.01,
+            "allow_indexed": False,
+            "concurrency": 4,
+        }
+        options.update(overrides)
+        return ragie_sync.poll_changed_documents(**options)
+
+    def test_next_poll_delay_favours_docs_near_ready(self):
+        fresh = ragie_sync.next_poll_delay("pending", interval=2.0, unchanged_polls=0)
+        nearly = ragie_sync.next_poll_delay("keyword_indexed", interval=2.0, unchanged_polls=0)
+        stuck = ragie_sync.next_poll_delay("pending", interval=2.0, unchanged_polls=5)
+
+        assert nearly < 2.0 < fresh
+        assert stuck == 8.0
+
+    def test_records_time_to_ready_per_document(self):
+        client = StatusClient({"a": ["pending", "chunked", "ready"], "b": ["ready"]})
+
+        tracker = self.poll(client, labels={"a": "guides/a"})
+
+        assert set(tracker.time_to_ready) == {"a", "b"}
+        assert tracker.time_to_ready["b"] <= tracker.time_to_ready["a"]
+        assert client.polls.count("a") == 3
+        assert client.polls.count("b") == 1
+
+    def test_aggregates_failures_and_timeouts(self):
+        client = StatusClient({"a": ["failed"], "b": ["ready"]})
+        with pytest.raises(ragie_sync.SyncError, match="a: bad pdf"):
+            self.poll(client)
+
+        client = StatusClient({"a": ["pending"]})
+        with pytest.raises(ragie_sync.SyncError, match="Timed out .*: a"):
+            self.poll(client, timeout_seconds=0.1)
+
+    def test_pipelined_polling_starts_before_writes_finish(self):
+        class PipelineClient(RecordingClient):
+            def get_document(self, *, partition, document_id):
+                self._record("get", document_id)
+                return {"id": document_id, "status": "ready"}
+
+        client = PipelineClient(delay=0.05)
+        local_docs = [make_local_doc(f"docs/page-{i}") for i in range(6)]
+        plan = ragie_sync.build_sync_plan(local_docs=local_docs, managed_remote_docs=[], partial_sync=False)
+        options = ragie_sync.SyncOptions(
+            source="test",
+            repo_name="test",
+            partial_sync=False,
+            dry_run=False,
+            concurrency=1,
+            poll_timeout=5,
+            poll_interval=0.01,
+            allow_indexed=False,
+            pipeline_polling=True,
+        )
+
+        applied, tracker = ragie_sync.execute_and_poll_operations(
+            client=client,
+            partition="shared_docs",
+            operations=ragie_sync.plan_operations(plan),
+            options=options,
+        )
+
+        names = [name for name, _ in client.calls]
+        assert len(applied) == 6
+        assert len(tracker.time_to_ready) == 6
+        assert names.index("get") < len(names) - 1 - names[::-1].index("create")
+
+
+class TestAsyncRagieClient:
+    def test_requests_reuse_connection_and_retry(self, stub_server):
+        stub_server.statuses = [429, 200, 200]
+
+        async def scenario():
+            async with ragie_sync.AsyncRagieClient(**client_options(stub_server)) as client:
+                first = await client.get_document(partition="shared_docs", document_id="doc-1")
+                await client.delete_document(partition="shared_docs", document_id="doc-1", async_delete=True)
+                return first, client._client._pool.connections_opened
+
+        first, connections_opened = asyncio.run(scenario())
+
+        assert first["status"] == "ready"
+        assert [(method, path) for method, path, _, _ in stub_server.requests] == [
+            ("GET", "/documents/doc-1"),
+            ("GET", "/documents/doc-1"),
+            ("DELETE", "/documents/doc-1?async=true"),
+        ]
+        assert connections_opened == 1
+
+    def test_borrowed_client_shares_its_pool_and_stays_open(self, stub_server):
+        async def scenario(sync_client):
+            async with ragie_sync.AsyncRagieClient(client=sync_client) as client:
+                await client.get_document(partition="shared_docs", document_id="doc-1")
+                return client._executor._max_workers
+
+        with make_client(stub_server) as sync_client:
+            max_workers = asyncio.run(scenario(sync_client))
+            sync_client.get_document(partition="shared_docs", document_id="doc-1")
+            connections_opened = sync_client._pool.connections_opened
+
+        assert max_workers == sync_client.pool_size
+        assert connections_opened == 1
+
+    def test_errors_match_sync_client(self, stub_server):
+        stub_server.statuses = [404]
+
+        async def scenario():
+            async with ragie_sync.AsyncRagieClient(**client_options(stub_server)) as client:
+                await client.get_document(partition="shared_docs", document_id="missing")
+
+        with pytest.raises(ragie_sync.SyncError, match="Ragie API error 404 for GET /documents/missing"):
+            asyncio.run(scenario())
+
+    def test_async_sync_documents_creates_and_polls(self, stub_server):
+        local_docs = [make_local_doc(f"docs/page-{i}") for i in range(3)]
+        options = ragie_sync.SyncOptions(
+            source="test",
+            repo_name="test",
+            partial_sync=False,
+            dry_run=False,
+            concurrency=3,
+            poll_timeout=5,
+            poll_interval=0.01,
+            allow_indexed=False,
+        )
+
+        async def scenario():
+            async with ragie_sync.AsyncRagieClient(**client_options(stub_server)) as client:
+                return await ragie_sync.async_sync_documents(
+                    client=client,
+                    partition="shared_docs",
+                    local_docs=local_docs,
+                    options=options,
+                )
+
+        result = asyncio.run(scenario())
+
+        methods = [method for method, _, _, _ in stub_server.requests]
+        assert result.changed_document_ids == ["doc-1"]
+        assert methods.count("POST") == 3
+        assert methods[-1] == "GET"
+
+
+class TestRunMetrics:
+    def test_path_template_groups_ids(self):
+        assert ragie_sync.path_template("/documents/doc-1/metadata") == "/documents/{id}/metadata"
+        assert ragie_sync.path_template("/documents/raw?async=true") == "/documents/raw"
+        assert ragie_sync.path_template("/documents?page_size=100") == "/documents"
+
+    def test_client_records_latency_retries_and_errors(self, stub_server):
+        stub_server.statuses = [503, 200, 404]
+        metrics = ragie_sync.SyncMetrics()
+        with make_client(stub_server, metrics=metrics) as client:
+            client.get_document(partition="shared_docs", document_id="doc-1")
+            with pytest.raises(ragie_sync.SyncError):
+                client.get_document(partition="shared_docs", document_id="doc-2")
+
+        report = metrics.report(exit_code=1)
+        (endpoint,) = report["requests"]["endpoints"]
+        assert (endpoint["method"], endpoint["path"]) == ("GET", "/documents/{id}")
+        assert endpoint["requests"] == 3
+        assert endpoint["errors"] == 2
+        assert endpoint["retries"] == 1
+        assert sum(endpoint["buckets"].values()) == 3
+        assert report["exit_code"] == 1
+
+    def test_phases_and_prometheus_output(self):
+        metrics = ragie_sync.SyncMetrics()
+        token = ragie_sync._METRICS.set(metrics)
+        try:
+            for _ in range(2):
+                with ragie_sync.timed_phase("plan", partition="shared_docs"):
+                    pass
+        finally:
+            ragie_sync._METRICS.reset(token)
+        metrics.observe_request("GET", "/documents", status=200, seconds=0.02, bytes_sent=0, bytes_received=10)
+
+        (phase,) = metrics.report(exit_code=0)["phases"]
+        assert (phase["partition"], phase["phase"], phase["count"]) == ("shared_docs", "plan", 2)
+        text = metrics.prometheus(exit_code=0)
+        assert 'ragie_sync_phase_seconds{partition="shared_docs",phase="plan"}' in text
+        assert 'ragie_sync_request_duration_seconds_bucket{method="GET",path="/documents",le="+Inf"} 1' in text
+        assert "ragie_sync_run_success 1" in text
+
+
+@pytest.fixture
+def fake_ragie():
+    server = ragie_fake_server.FakeRagieServer(("127.0.0.1", 0)).start_background()
+    yield server
+    server.stop()
+
+
+def fake_sync_options(**overrides):
+    options = {
+        "source": "test",
+        "repo_name": "test",
+        "partial_sync": False,
+        "dry_run": False,
+        "concurrency": 4,
+        "poll_timeout": 5,
+        "poll_interval": 0.01,
+        "allow_indexed": False,
+    }
+    options.update(overrides)
+    return ragie_sync.SyncOptions(**options)
+
+
+class TestFakeRagieServer:
+    def test_sync_converges_and_second_run_is_a_no_op(self, fake_ragie):
+        local_docs = [make_local_doc(f"docs/page-{i}", content=f"body {i}") for i in range(5)]
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            first = ragie_sync.sync_documents(
+                client=client, partition="shared_docs", local_docs=local_docs, options=fake_sync_options()
+            )
+            second = ragie_sync.sync_documents(
+                client=client, partition="shared_docs", local_docs=local_docs, options=fake_sync_options()
+            )
+
+        assert len(first.applied) == 5
+        assert len(first.time_to_ready) == 5
+        assert {doc["status"] for doc in fake_ragie.state.documents.values()} == {"ready"}
+        assert ragie_sync.plan_operations(second.plan) == []
+
+    def test_listing_follows_cursor_pagination(self, fake_ragie):
+        for i in range(150):
+            fake_ragie.state.new_document(partition="shared_docs", body={"external_id": f"doc-{i}"})
+        fake_ragie.state.new_document(partition="other", body={"external_id": "elsewhere"})
+
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            docs = client.list_documents("shared_docs")
+
+        assert len(docs) == 150
+        assert fake_ragie.state.request_log == [("GET", "/documents"), ("GET", "/documents")]
+
+    def test_injected_errors_are_retried(self, fake_ragie):
+        fake_ragie.state.config.error_rate = 0.2
+        fake_ragie.state.config.throttle_rate = 0.2
+        fake_ragie.state.random.seed(7)
+        local_docs = [make_local_doc(f"docs/page-{i}") for i in range(4)]
+
+        with ragie_sync.RagieClient(
+            **client_options(fake_ragie, base_url=fake_ragie.base_url, max_retries=10)
+        ) as client:
+            result = ragie_sync.sync_documents(
+                client=client,
+                partition="shared_docs",
+                local_docs=local_docs,
+                options=fake_sync_options(concurrency=1),
+            )
+
+        assert len(result.applied) == 4
+        assert len(fake_ragie.state.documents) == 4
+        assert len(fake_ragie.state.request_log) > 4 + 1 + 4
+
+
+class TestPartitionLookups:
+    def ensure(self, client, partition, lookups):
+        ragie_sync.ensure_partition_configuration(
+            client=client,
+            partition=partition,
+            description=ragie_sync.default_partition_description(partition),
+            metadata_schema=ragie_sync.build_partition_metadata_schema(),
+            dry_run=False,
+            lookups=lookups,
+        )
+        return ragie_sync.ensure_entity_instruction(
+            client=client,
+            partition=partition,
+            source="test",
+            repo_name="test",
+            instruction_name=ragie_sync.default_entity_instruction_name(partition),
+            scope="document",
+            dry_run=False,
+            lookups=lookups,
+        )
+
+    def test_ensuring_partitions_probes_each_by_name_and_lists_instructions_once(self, fake_ragie):
+        partitions = ["shared_docs", "tenant_a", "tenant_b"]
+        lookups = ragie_sync.RagieLookupCache()
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            created = [self.ensure(client, partition, lookups) for partition in partitions]
+
+        log = fake_ragie.state.request_log
+        assert created == [True, True, True]
+        assert ("GET", "/partitions") not in log
+        assert log.count(("GET", "/instructions")) == 1
+        assert sorted(fake_ragie.state.partitions) == partitions
+        assert all(item["context_aware"] for item in fake_ragie.state.partitions.values())
+
+        fake_ragie.state.request_log.clear()
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            created = [self.ensure(client, partition, lookups) for partition in partitions]
+
+        assert created == [False, False, False]
+        assert [method for method, _ in fake_ragie.state.request_log] == ["GET"] * len(partitions)
+
+    def test_async_ensure_matches_the_sync_lookups(self, fake_ragie):
+        partitions = ["shared_docs", "tenant_a", "tenant_b"]
+        lookups = ragie_sync.RagieLookupCache()
+
+        async def ensure(client, partition):
+            await ragie_sync.async_ensure_partition_configuration(
+                client=client,
+                partition=partition,
+                description=ragie_sync.default_partition_description(partition),
+                metadata_schema=ragie_sync.build_partition_metadata_schema(),
+                dry_run=False,
+                lookups=lookups,
+            )
+            return await ragie_sync.async_ensure_entity_instruction(
+                client=client,
+                partition=partition,
+                source="test",
+                repo_name="test",
+                instruction_name=ragie_sync.default_entity_instruction_name(partition),
+                scope="document",
+                dry_run=False,
+                lookups=lookups,
+            )
+
+        async def scenario():
+            options = client_options(fake_ragie, base_url=fake_ragie.base_url)
+            async with ragie_sync.AsyncRagieClient(**options) as client:
+                return await asyncio.gather(*(ensure(client, partition) for partition in partitions))
+
+        assert asyncio.run(scenario()) == [True, True, True]
+        log = fake_ragie.state.request_log
+        assert ("GET", "/partitions") not in log
+        assert log.count(("GET", "/instructions")) == 1
+        assert sorted(fake_ragie.state.partitions) == partitions
+        assert all(item["context_aware"] for item in fake_ragie.state.partitions.values())
+
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            assert [self.ensure(client, partition, lookups) for partition in partitions] == [False, False, False]
+
+    def test_probe_errors_other_than_not_found_propagate(self, fake_ragie):
+        fake_ragie.state.config.error_rate = 1.0
+        options = client_options(fake_ragie, base_url=fake_ragie.base_url, max_retries=0)
+        with ragie_sync.RagieClient(**options) as client:
+            with pytest.raises(ragie_sync.RagieAPIError) as excinfo:
+                ragie_sync.RagieLookupCache().partition(client, "shared_docs")
+        assert excinfo.value.status != 404
+
+
+class TestStreamingListing:
+    def test_slim_remote_doc_keeps_only_planning_fields(self):
+        doc = {
+            "id": "doc-1",
+            "external_id": "ext-1",
+            "updated_at": "2025-01-01",
+            "name": "page",
+            "status": "ready",
+            "chunk_count": 12,
+            "metadata": {"source": "test", "content_hash": "abc", "owner_note": "x" * 1000},
+        }
+
+        assert ragie_sync.slim_remote_doc(doc) == {
+            "id": "doc-1",
+            "external_id": "ext-1",
+            "updated_at": "2025-01-01",
+            "metadata": {"source": "test", "content_hash": "abc"},
+        }
+
+    def test_pages_are_fetched_lazily(self, fake_ragie):
+        for i in range(250):
+            fake_ragie.state.new_document(partition="shared_docs", body={"external_id": f"doc-{i}"})
+
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            docs = client.iter_documents("shared_docs")
+            first_page = [next(docs) for _ in range(100)]
+            requests_after_first_page = len(fake_ragie.state.request_log)
+            rest = list(docs)
+
+        assert requests_after_first_page == 1
+        assert len(first_page) + len(rest) == 250
+        assert len(fake_ragie.state.request_log) == 3
+
+    def test_streamed_plan_ignores_unmanaged_docs(self, fake_ragie):
+        local_docs = [make_local_doc(f"docs/page-{i}") for i in range(3)]
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            ragie_sync.sync_documents(
+                client=client, partition="shared_docs", local_docs=local_docs, options=fake_sync_options()
+            )
+        fake_ragie.state.new_document(partition="shared_docs", body={"external_id": "theirs", "metadata": {}})
+
+        async def scenario():
+            async with ragie_sync.AsyncRagieClient(
+                **client_options(fake_ragie, base_url=fake_ragie.base_url)
+            ) as client:
+                return await ragie_sync.async_sync_documents(
+                    client=client,
+                    partition="shared_docs",
+                    local_docs=local_docs[:2],
+                    options=fake_sync_options(),
+                )
+
+        result = asyncio.run(scenario())
+
+        assert len(result.managed_remote_docs) == 3
+        assert [op.kind for op in ragie_sync.plan_operations(result.plan)] == ["DELETE_STALE"]
+        assert len(fake_ragie.state.documents) == 3
+
+
+class TestDeleteStage:
+    def seed_partition(self, fake_ragie, local_docs):
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            ragie_sync.sync_documents(
+                client=client, partition="shared_docs", local_docs=local_docs, options=fake_sync_options()
+            )
+        fake_ragie.state.request_log.clear()
+
+    def test_deletes_run_after_upserts_and_are_verified(self, fake_ragie):
+        self.seed_partition(fake_ragie, [make_local_doc(f"docs/page-{i}") for i in range(5)])
+        local_docs = [make_local_doc(f"docs/page-{i}") for i in range(2)] + [make_local_doc("docs/new")]
+
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            result = ragie_sync.sync_documents(
+                client=client,
+                partition="shared_docs",
+                local_docs=local_docs,
+                options=fake_sync_options(delete_concurrency=3, verify_deletes=True),
+            )
+
+        methods = [method for method, _ in fake_ragie.state.request_log]
+        assert methods.index("DELETE") > methods.index("POST")
+        assert methods.count("DELETE") == 3
+        stats = result.deletes.to_json()
+        assert (stats["requested"], stats["deleted"], stats["concurrency"]) == (3, 3, 3)
+        assert stats["verified"] and stats["unconfirmed"] == 0
+        assert len(fake_ragie.state.documents) == 3
+
+    def test_async_verification_reports_docs_still_listed(self, fake_ragie):
+        self.seed_partition(fake_ragie, [make_local_doc(f"docs/page-{i}") for i in range(4)])
+        fake_ragie.state.config.delete_lag_seconds = 60
+
+        async def scenario():
+            async with ragie_sync.AsyncRagieClient(
+                **client_options(fake_ragie, base_url=fake_ragie.base_url)
+            ) as client:
+                return await ragie_sync.async_sync_documents(
+                    client=client,
+                    partition="shared_docs",
+                    local_docs=[make_local_doc("docs/page-0")],
+                    options=fake_sync_options(verify_deletes=True),
+                )
+
+        result = asyncio.run(scenario())
+
+        assert result.deletes.deleted == 3
+        assert sorted(result.deletes.unconfirmed) == sorted(
+            doc_id for doc_id, doc in fake_ragie.state.documents.items() if doc["status"] == "deleting"
+        )
+        assert result.deletes.to_json()["unconfirmed"] == 3
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveRateLimiter:
+    def test_token_bucket_paces_after_burst(self):
+        clock = FakeClock()
+        limiter = ragie_sync.AdaptiveRateLimiter(max_rate=10, burst=2, clock=clock)
+
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == 0
+        assert limiter.reserve() == pytest.approx(0.1)
+        clock.now += 1.0
+        assert limiter.reserve() == 0
+
+    def test_aimd_decrease_on_throttle_and_recover_on_success(self):
+        clock = FakeClock()
+        limiter = ragie_sync.AdaptiveRateLimiter(max_rate=8, increase_step=1, increase_after=2, clock=clock)
+
+        limiter.on_throttle()
+        limiter.on_throttle()
+        assert limiter.rate == 2
+        assert limiter.throttle_count == 2
+
+        for _ in range(4):
+            limiter.on_success()
+        assert limiter.rate == 4
+        for _ in range(20):
+            limiter.on_success()
+        assert limiter.rate == 8
+
+    def test_retry_after_blocks_every_caller(self):
+        clock = FakeClock()
+        limiter = ragie_sync.AdaptiveRateLimiter(max_rate=100, clock=clock)
+
+        limiter.on_throttle(retry_after=3.0)
+        assert limiter.reserve() == pytest.approx(3.0)
+        clock.now += 3.0
+        assert limiter.reserve() < 1.0
+
+    @pytest.mark.parametrize(
+        ("header", "expected"),
+        [
+            (None, None),
+            ("2", 2.0),
+            ("0.5", 0.5),
+            ("not-a-date", None),
+            ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+            ("inf", None),
+            ("nan", None),
+            ("86400", ragie_sync.MAX_RETRY_AFTER_SECONDS),
+            ("Fri, 01 Jan 9999 00:00:00 GMT", ragie_sync.MAX_RETRY_AFTER_SECONDS),
+        ],
+    )
+    def test_parse_retry_after(self, header, expected):
+        assert ragie_sync.parse_retry_after(header) == expected
+
+    def test_backoff_delay_is_jittered_and_respects_retry_after(self):
+        delays = {ragie_sync.backoff_delay(3, 1.0) for _ in range(20)}
+        assert len(delays) > 1
+        assert all(0 <= delay <= 8.0 for delay in delays)
+        assert ragie_sync.backoff_delay(0, 1.0, retry_after=5.0) >= 5.0
+
+    def test_client_reports_429_to_limiter(self, stub_server):
+        stub_server.statuses = [(429, {"Retry-After": "0"}), 200]
+        limiter = ragie_sync.AdaptiveRateLimiter(max_rate=50)
+        with make_client(stub_server, rate_limiter=limiter) as client:
+            client.get_document(partition="shared_docs", document_id="doc-1")
+
+        assert limiter.throttle_count == 1
+        assert limiter.requests == 2
+        assert limiter.rate == 25
+
+
+@pytest.fixture()
+def docs_repo(tmp_path, monkeypatch):
+    """A throwaway git repo laid out like this one, with REPO_ROOT pointed at it."""
+    import subprocess
+
+    def git(*args):
+        subprocess.run(["git", *args], cwd=tmp_path, check=True, capture_output=True)
+
+    def write(rel, text):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+    write("docs.json", json.dumps({"navigation": {"pages": ["guides/a", "guides/b", "guides/c"]}}))
+    for name in "abc":
+        write(f"guides/{name}.mdx", f"---\ntitle: {name}\n---\nBody {name}\n")
+    git("init", "-q")
+    git("-c", "user.email=t@example.com", "-c", "user.name=t", "commit", "-q", "--allow-empty", "-m", "root")
+    git("add", "-A")
+    git("-c", "user.email=t@example.com", "-c", "user.name=t", "commit", "-q", "-m", "base")
+
+    monkeypatch.setattr(ragie_sync, "REPO_ROOT", tmp_path)
+    monkeypatch.setattr(ragie_sync, "DOCS_JSON", tmp_path / "docs.json")
+    return tmp_path, write, git
+
+
+class TestIncrementalScope:
+    def test_changed_added_and_removed_refs(self, docs_repo):
+        root, write, git = docs_repo
+        base = ragie_sync.current_git_commit()
+
+        write("guides/a.mdx", "---\ntitle: a\n---\nBody a, edited\n")
+        write("guides/d.mdx", "---\ntitle: d\n---\nBody d\n")
+        (root / "guides/c.mdx").unlink()
+        write("docs.json", json.dumps({"navigation": {"pages": ["guides/a", "guides/b", "guides/d"]}}))
+
+        refs = ragie_sync.load_docs_refs()
+        scope = ragie_sync.resolve_incremental_scope(base_commit=base, refs=refs, partition="shared_docs")
+
+        assert scope.changed_refs == {"guides/a", "guides/d"}
+        assert scope.removed_refs == {"guides/c"}
+
+    def test_unknown_base_falls_back_to_full(self, docs_repo):
+        scope = ragie_sync.resolve_incremental_scope(
+            base_commit="0" * 40,
+            refs=ragie_sync.load_docs_refs(),
+            partition="shared_docs",
+        )
+        assert scope is None
+
+    def test_sync_script_change_falls_back_to_full(self, docs_repo):
+        _, write, _ = docs_repo
+        base = ragie_sync.current_git_commit()
+
+        write(ragie_sync.SYNC_SCRIPT_PATH, "# normalizer changed\n")
+        scope = ragie_sync.resolve_incremental_scope(
+            base_commit=base,
+            refs=ragie_sync.load_docs_refs(),
+            partition="shared_docs",
+        )
+        assert scope is None
+
+    def test_removed_refs_become_targeted_stale_deletes(self):
+        kept = make_local_doc("guides/a")
+        removed_id = "repo:test|partition:shared_docs|ref:guides/c"
+        remote = [
+            {"id": "r-a", "external_id": kept.external_id, "metadata": dict(kept.metadata, content_hash=kept.content_hash)},
+            {"id": "r-c", "external_id": removed_id, "metadata": {}},
+            {"id": "r-z", "external_id": "repo:test|partition:shared_docs|ref:guides/z", "metadata": {}},
+        ]
+
+        plan = ragie_sync.build_sync_plan(
+            local_docs=[kept],
+            managed_remote_docs=remote,
+            partial_sync=True,
+            removed_external_ids=frozenset({removed_id}),
+        )
+
+        assert [doc["id"] for doc in plan.stale_docs] == ["r-c"]
+        assert not plan.create_docs and not plan.update_raw_docs
+
+
+class TestSnippetImports:
+    def write_snippets(self, write, git):
+        write("snippets/note.mdx", "---\ntitle: note\n---\nShared note. <Inner />\nimport Inner from '/snippets/inner.mdx'\n")
+        write("snippets/inner.mdx", "Inner text\n")
+        write(
+            "guides/a.mdx",
+            "---\ntitle: a\n---\nimport Note from '/snippets/note.mdx'\n\nBody a\n\n<Note />\n\n"
+            "```mdx\nimport Other from '/snippets/other.mdx'\n<Note />\n```\n",
+        )
+        git("add", "-A")
+        git("-c", "user.email=t@example.com", "-c", "user.name=t", "commit", "-q", "-m", "snippets")
+
+    def test_import_graph_is_transitive_and_ignores_code_samples(self, docs_repo):
+        _, write, git = docs_repo
+        self.write_snippets(write, git)
+
+        graph, ref_by_path = ragie_sync.build_import_graph(ragie_sync.load_docs_refs())
+
+        assert graph.imports["guides/a.mdx"] == {"snippets/note.mdx": "Note"}
+        assert graph.dependencies("guides/a.mdx") == ["snippets/inner.mdx", "snippets/note.mdx"]
+        assert graph.dependents({"snippets/inner.mdx"}) == {"snippets/note.mdx", "guides/a.mdx"}
+        assert ref_by_path["guides/a.mdx"] == "guides/a"
+
+    def test_snippet_content_is_inlined(self, docs_repo):
+        _, write, git = docs_repo
+        self.write_snippets(write, git)
+
+        docs = ragie_sync.build_local_docs(
+            refs=["guides/a"],
+            partition="shared_docs",
+            docs_base_url="https://docs.example.com",
+            repo_name="test",
+            source="test",
+            commit_sha="",
+        )
+
+        content = docs[0].content
+        assert "Shared note." in content and "Inner text" in content
+        assert "```mdx\nimport Other from '/snippets/other.mdx'\n<Note />\n```" in content
+
+    def test_snippet_edit_rescopes_only_dependent_pages(self, docs_repo):
+        _, write, git = docs_repo
+        self.write_snippets(write, git)
+        base = ragie_sync.current_git_commit()
+
+        write("snippets/inner.mdx", "Inner text, edited\n")
+        scope = ragie_sync.resolve_incremental_scope(
+            base_commit=base,
+            refs=ragie_sync.load_docs_refs(),
+            partition="shared_docs",
+        )
+
+        assert scope.changed_refs == {"guides/a"}
+        assert not scope.removed_refs
+
+    def test_saved_import_graph_reads_only_changed_files(self, docs_repo):
+        _, write, git = docs_repo
+        self.write_snippets(write, git)
+        base = ragie_sync.current_git_commit()
+        saved, _ = ragie_sync.build_import_graph(ragie_sync.load_docs_refs())
+        state = {"import_graph": {"commit": base, "imports": json.loads(json.dumps(saved.imports))}}
+
+        write("snippets/inner.mdx", "Inner text, edited\n")
+        graph = ragie_sync.load_import_graph(state, commit=base)
+        scope = ragie_sync.resolve_incremental_scope(
+            base_commit=base,
+            refs=ragie_sync.load_docs_refs(),
+            partition="shared_docs",
+            graph=graph,
+        )
+
+        assert scope.changed_refs == {"guides/a"}
+        assert set(graph.sources) == {"snippets/inner.mdx"}
+        assert ragie_sync.load_import_graph(state, commit="other") is None
+
+    def test_updated_import_graph_follows_dropped_imports(self, docs_repo):
+        _, write, git = docs_repo
+        self.write_snippets(write, git)
+        graph, _ = ragie_sync.build_import_graph(ragie_sync.load_docs_refs())
+
+        write("guides/a.mdx", "---\ntitle: a\n---\nNo snippets any more\n")
+        ragie_sync.update_import_graph(
+            graph, ragie_sync.load_docs_refs(), changed_paths={"guides/a.mdx"}, removed_paths=set()
+        )
+
+        assert graph.imports["guides/a.mdx"] == {}
+        assert graph.dependents({"snippets/inner.mdx"}) == {"snippets/note.mdx"}
+
+    def test_snippet_edit_invalidates_cached_page(self, docs_repo, tmp_path):
+        _, write, git = docs_repo
+        self.write_snippets(write, git)
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        options = {
+            "refs": ["guides/a", "guides/b"],
+            "partition": "shared_docs",
+            "docs_base_url": "https://docs.example.com",
+            "repo_name": "test",
+            "source": "test",
+            "commit_sha": "",
+            "cache": cache,
+        }
+        ragie_sync.build_local_docs(**options)
+
+        write("snippets/inner.mdx", "Inner text, edited\n")
+        docs = ragie_sync.build_local_docs(**options)
+
+        assert "Inner text, edited" in docs[0].content
+        assert (cache.hits, cache.misses) == (1, 3)
+
+
+class TestLazyLocalDocs:
+    def build(self, refs, cache=None):
+        return ragie_sync.build_local_docs(
+            refs=refs,
+            partition="shared_docs",
+            docs_base_url="https://docs.example.com",
+            repo_name="test",
+            source="test",
+            commit_sha="abc",
+            cache=cache,
+        )
+
+    def test_docs_rebuild_content_and_metadata_on_demand(self, docs_repo):
+        _, write, git = docs_repo
+        TestSnippetImports().write_snippets(write, git)
+
+        (doc,) = self.build(["guides/a"])
+
+        assert not hasattr(doc, "__dict__")
+        assert "Shared note." in doc.content and "Inner text" in doc.content
+        assert ragie_sync.sha256_text(doc.content) == doc.content_hash
+        assert doc.metadata["title"] == "a" and doc.metadata["commit_sha"] == "abc"
+        assert doc.metadata["metadata_fingerprint"] == doc.metadata_fingerprint
+        assert self.build(["guides/a"]) == [doc]
+
+    def test_content_comes_from_the_cache_after_the_file_changes(self, docs_repo, tmp_path):
+        _, write, _ = docs_repo
+        write("guides/a.mdx", "---\ntitle: a\n---\nOriginal body\n")
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        (doc,) = self.build(["guides/a"], cache=cache)
+
+        write("guides/a.mdx", "---\ntitle: a\n---\nEdited body\n")
+
+        assert "Original body" in doc.content
+        assert (cache.hits, cache.misses) == (0, 1)
+
+    def test_page_edited_after_planning_is_rejected_without_a_cache(self, docs_repo):
+        _, write, _ = docs_repo
+        write("guides/a.mdx", "---\ntitle: a\n---\nOriginal body\n")
+        (doc,) = self.build(["guides/a"])
+
+        write("guides/a.mdx", "---\ntitle: a\n---\nEdited body\n")
+
+        with pytest.raises(ragie_sync.SyncError, match="changed on disk"):
+            doc.content
+
+
+class PlanCheckClient:
+    """Stand-in for RagieClient's document reads over a fixed set of remote docs (missing ids are 404s)."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get_document(self, *, partition, document_id):
+        if document_id not in self.docs:
+            raise ragie_sync.RagieAPIError(f"Ragie API error 404 for GET /documents/{document_id}", status=404)
+        return self.docs[document_id]
+
+    def iter_documents(self, partition):
+        return iter(self.docs.values())
+
+
+class TestPlanArtifact:
+    def remote(self, doc_id, local, **metadata):
+        return {"id": doc_id, "external_id": local.external_id, "metadata": {**local.metadata, **metadata}}
+
+    def make_plan(self):
+        plan = ragie_sync.SyncPlan()
+        edited, patched = make_local_doc("guides/a", "new body"), make_local_doc("guides/b")
+        plan.create_docs.append(make_local_doc("guides/new"))
+        plan.update_raw_docs.append((edited, self.remote("doc-a", edited, content_hash="old")))
+        plan.patch_metadata_docs.append(
+            (edited, self.remote("doc-a", edited, content_hash="old"), {"content_hash": edited.content_hash})
+        )
+        plan.patch_metadata_docs.append((patched, self.remote("doc-b", patched, title="old"), {"title": None}))
+        plan.stale_docs.append({"id": "doc-stale", "external_id": "repo:test|partition:shared_docs|ref:gone"})
+        return plan
+
+    def test_plan_round_trips_through_json(self):
+        plan = self.make_plan()
+
+        payload = json.loads(json.dumps(ragie_sync.sync_plan_to_json(plan)))
+        loaded = ragie_sync.sync_plan_from_json(payload)
+
+        assert len(payload["documents"]) == 3
+        assert payload["update_raw"][0]["remote"]["content_hash"] == "old"
+        assert ragie_sync.plan_operations(loaded) == ragie_sync.plan_operations(plan)
+
+    def test_conflict_check_drops_applied_work_and_rejects_drift(self):
+        plan = ragie_sync.sync_plan_from_json(ragie_sync.sync_plan_to_json(self.make_plan()))
+        edited, patched = plan.update_raw_docs[0][0], plan.patch_metadata_docs[1][0]
+        client = PlanCheckClient(
+            {
+                "doc-a": self.remote("doc-a", edited, content_hash="old"),
+                "doc-b": {"id": "doc-b", "metadata": dict(patched.metadata)},
+            }
+        )
+
+        checked = ragie_sync.check_plan_conflicts(client=client, partition="shared_docs", plan=plan, concurrency=2)
+
+        assert [op.kind for op in ragie_sync.plan_operations(checked)] == ["CREATE", "REPLACE"]
+
+        client.docs["doc-a"] = self.remote("doc-a", edited, content_hash="someone-else")
+        with pytest.raises(ragie_sync.SyncError, match="changed since the plan was built"):
+            ragie_sync.check_plan_conflicts(client=client, partition="shared_docs", plan=plan, concurrency=2)
+
+    def test_conflict_check_drops_creates_that_already_landed(self):
+        plan = ragie_sync.sync_plan_from_json(ragie_sync.sync_plan_to_json(self.make_plan()))
+        new = plan.create_docs[0]
+        edited, patched = plan.update_raw_docs[0][0], plan.patch_metadata_docs[1][0]
+        client = PlanCheckClient(
+            {
+                "doc-a": self.remote("doc-a", edited, content_hash="old"),
+                "doc-b": {"id": "doc-b", "metadata": dict(patched.metadata)},
+                "doc-new": self.remote("doc-new", new),
+            }
+        )
+
+        checked = ragie_sync.check_plan_conflicts(client=client, partition="shared_docs", plan=plan, concurrency=2)
+
+        assert [op.kind for op in ragie_sync.plan_operations(checked)] == ["REPLACE"]
+
+        client.docs["doc-new"] = self.remote("doc-new", new, content_hash="someone-else")
+        with pytest.raises(ragie_sync.SyncError, match="changed since the plan was built"):
+            ragie_sync.check_plan_conflicts(client=client, partition="shared_docs", plan=plan, concurrency=2)
+
+    def test_rejects_unknown_plan_format(self, tmp_path):
+        path = tmp_path / "plan.json"
+        path.write_text(json.dumps({"version": 999, "partitions": []}), encoding="utf-8")
+
+        with pytest.raises(ragie_sync.SyncError, match="format version"):
+            ragie_sync.read_plan_file(path)
+
+    def test_conflict_check_keeps_a_replace_interrupted_after_its_raw_update(self):
+        edited = make_local_doc("guides/a", "new body")
+        planned = self.remote("doc-a", edited, content_hash="old", title="old")
+        plan = ragie_sync.SyncPlan()
+        plan.update_raw_docs.append((edited, planned))
+        plan.patch_metadata_docs.append(
+            (edited, planned, ragie_sync.compare_metadata_patch(planned["metadata"], edited.metadata))
+        )
+        plan = ragie_sync.sync_plan_from_json(ragie_sync.sync_plan_to_json(plan))
+        client = PlanCheckClient({"doc-a": planned})
+
+        checked = ragie_sync.check_plan_conflicts(client=client, partition="shared_docs", plan=plan, concurrency=1)
+
+        assert [op.kind for op in ragie_sync.plan_operations(checked)] == ["REPLACE"]
+
+
+class TestMetadataFingerprint:
+    def local_doc(self, ref, *, commit_sha, title="Title", volatile=ragie_sync.DEFAULT_VOLATILE_METADATA_KEYS):
+        doc = make_local_doc(ref)
+        doc.metadata.update({"title": title, "commit_sha": commit_sha})
+        doc.metadata["metadata_fingerprint"] = ragie_sync.metadata_fingerprint(doc.metadata, volatile_keys=volatile)
+        return doc
+
+    def remote_from(self, doc):
+        return {"id": "r-1", "external_id": doc.external_id, "updated_at": "2026-01-01", "metadata": dict(doc.metadata)}
+
+    def test_volatile_key_change_alone_plans_nothing(self, monkeypatch):
+        remote = self.remote_from(self.local_doc("guides/a", commit_sha="old"))
+        calls = []
+        monkeypatch.setattr(ragie_sync, "compare_metadata_patch", lambda *args: calls.append(args) or {})
+
+        plan = ragie_sync.build_sync_plan(
+            local_docs=[self.local_doc("guides/a", commit_sha="new")], managed_remote_docs=[remote], partial_sync=False
+        )
+
+        assert ragie_sync.plan_operations(plan) == []
+        assert calls == []
+
+    def test_significant_change_patches_volatile_keys_too(self):
+        remote = self.remote_from(self.local_doc("guides/a", commit_sha="old"))
+        local = self.local_doc("guides/a", commit_sha="new", title="Renamed")
+
+        plan = ragie_sync.build_sync_plan(local_docs=[local], managed_remote_docs=[remote], partial_sync=False)
+
+        ((_, _, patch),) = plan.patch_metadata_docs
+        assert patch["title"] == "Renamed"
+        assert patch["commit_sha"] == "new"
+        assert patch["metadata_fingerprint"] == local.metadata["metadata_fingerprint"]
+
+    def test_without_volatile_keys_every_commit_patches(self):
+        remote = self.remote_from(self.local_doc("guides/a", commit_sha="old", volatile=frozenset()))
+        local = self.local_doc("guides/a", commit_sha="new", volatile=frozenset())
+
+        plan = ragie_sync.build_sync_plan(local_docs=[local], managed_remote_docs=[remote], partial_sync=False)
+
+        assert [patch for _, _, patch in plan.patch_metadata_docs] == [
+            {"commit_sha": "new", "metadata_fingerprint": local.metadata["metadata_fingerprint"]}
+        ]
+
+
+class TestManifest:
+    def remote_doc(self, doc_id, ref, updated_at, content_hash="h1"):
+        return {
+            "id": doc_id,
+            "external_id": f"repo:test|partition:shared_docs|ref:{ref}",
+            "updated_at": updated_at,
+            "metadata": {"source": "test", "repo": "test", "docs_ref": ref, "content_hash": content_hash, "extra": 1},
+        }
+
+    def test_round_trip_through_planner_matches_remote_listing(self):
+        local = make_local_doc("guides/a", content="new body")
+        remote = [
+            self.remote_doc("r-a-old", "guides/a", "2026-01-01"),
+            self.remote_doc("r-a", "guides/a", "2026-02-01"),
+            self.remote_doc("r-b", "guides/b", "2026-02-01"),
+        ]
+        documents = ragie_sync.manifest_from_remote_docs(remote)
+
+        assert set(documents) == {remote[0]["external_id"], remote[2]["external_id"]}
+        assert documents[remote[1]["external_id"]]["id"] == "r-a"
+        assert "extra" not in documents[remote[1]["external_id"]]["metadata"]
+
+        from_manifest = ragie_sync.build_sync_plan(
+            local_docs=[local],
+            managed_remote_docs=ragie_sync.manifest_remote_docs(documents),
+            partial_sync=False,
+        )
+        from_remote = ragie_sync.build_sync_plan(local_docs=[local], managed_remote_docs=remote, partial_sync=False)
+
+        assert [r["id"] for _, r in from_manifest.update_raw_docs] == [r["id"] for _, r in from_remote.update_raw_docs]
+        assert [d["id"] for d in from_manifest.stale_docs] == [d["id"] for d in from_remote.stale_docs] == ["r-b"]
+
+    def test_apply_results_tracks_creates_updates_and_deletes(self):
+        created = make_local_doc("guides/new")
+        updated = make_local_doc("guides/a", content="changed")
+        documents = ragie_sync.manifest_from_remote_docs(
+            [self.remote_doc("r-a", "guides/a", "2026-01-01"), self.remote_doc("r-b", "guides/b", "2026-01-01")]
+        )
+        applied = [
+            (ragie_sync.SyncOperation(kind="CREATE", key=created.external_id, local=created), "r-new"),
+            (ragie_sync.SyncOperation(kind="UPDATE_RAW", key="r-a", doc_id="r-a", local=updated), "r-a"),
+            (ragie_sync.SyncOperation(kind="DELETE_STALE", key="r-b", doc_id="r-b"), None),
+        ]
+
+        result = ragie_sync.apply_results_to_manifest(documents, applied)
+
+        assert result[created.external_id]["id"] == "r-new"
+        assert result[updated.external_id]["content_hash"] == updated.content_hash
+        assert all(entry["id"] != "r-b" for entry in result.values())
+
+    def test_load_manifest_respects_owner_and_age(self):
+        fresh = {
+            "manifest": {
+                "source": "test",
+                "repo": "test",
+                "verified_at": ragie_sync.datetime.now(ragie_sync.timezone.utc).isoformat(),
+                "documents": {"ext": {"id": "r"}},
+            }
+        }
+        stale = {"manifest": dict(fresh["manifest"], verified_at="2020-01-01T00:00:00+00:00")}
+
+        assert ragie_sync.load_manifest(fresh, source="test", repo_name="test", max_age_hours=24) == {"ext": {"id": "r"}}
+        assert ragie_sync.load_manifest(fresh, source="other", repo_name="test", max_age_hours=24) is None
+        assert ragie_sync.load_manifest(stale, source="test", repo_name="test", max_age_hours=24) is None
+        assert ragie_sync.load_manifest(stale, source="test", repo_name="test", max_age_hours=0) is not None
+
+    def test_failed_sync_discards_manifest_but_keeps_last_synced_commit(self, tmp_path):
+        state = {"last_synced_commit": "abc", "manifest": {"source": "test", "repo": "test", "documents": {}}}
+        job = ragie_sync.PartitionJob(partition="shared_docs", state_path=tmp_path / "state.json", state=state)
+
+        ragie_sync.discard_failed_manifest(job, args=argparse.Namespace(dry_run=False))
+
+        assert ragie_sync.load_sync_state(job.state_path) == {"last_synced_commit": "abc"}
+
+    def test_manifest_drift(self):
+        manifest = ragie_sync.manifest_from_remote_docs(
+            [self.remote_doc("r-a", "guides/a", "1"), self.remote_doc("r-b", "guides/b", "1")]
+        )
+        remote = ragie_sync.manifest_from_remote_docs(
+            [self.remote_doc("r-a", "guides/a", "1", content_hash="h2"), self.remote_doc("r-c", "guides/c", "1")]
+        )
+
+        drift = ragie_sync.manifest_drift(manifest, remote, ignore=set())
+
+        assert [len(drift[k]) for k in ("missing_remote", "untracked_remote", "changed")] == [1, 1, 1]
+
+
+class TestPartitionOrchestrator:
+    @pytest.fixture()
+    def tenants_repo(self, docs_repo):
+        root, write, git = docs_repo
+        write("tenants/acme/intro.mdx", "---\ntitle: Acme\n---\nAcme body\n")
+        write("tenants/beta.mdx", "---\ntitle: Beta\n---\nBeta body\n")
+        write("tenants/README.md", "# Tenants\n")
+        write("tenants/empty/logo.txt", "not a doc\n")
+        return root
+
+    def parse(self, monkeypatch, *argv):
+        monkeypatch.setattr(sys, "argv", ["ragie_sync.py", *argv])
+        return ragie_sync.parse_args()
+
+    def test_discovers_tenant_slugs(self, tenants_repo):
+        assert ragie_sync.discover_tenant_slugs() == ["acme", "beta"]
+
+    def test_resolves_target_partitions(self, tenants_repo, monkeypatch):
+        args = self.parse(monkeypatch, "--all-partitions")
+        assert ragie_sync.resolve_target_partitions(args) == ["shared_docs", "tenant_acme", "tenant_beta"]
+
+        args = self.parse(monkeypatch, "--partitions", "shared_docs, Tenant_Acme,shared_docs")
+        assert ragie_sync.resolve_target_partitions(args) == ["shared_docs", "tenant_acme"]
+
+        args = self.parse(monkeypatch, "--partitions", "shared_docs,tenant_acme", "--doc-ref", "guides/a")
+        with pytest.raises(ragie_sync.SyncError, match="--doc-ref"):
+            ragie_sync.resolve_target_partitions(args)
+
+    def test_syncs_all_partitions_over_one_client(self, tenants_repo, stub_server, monkeypatch, tmp_path):
+        state_dir = tmp_path / "state"
+        args = self.parse(
+            monkeypatch,
+            "--all-partitions",
+            "--mode",
+            "full",
+            "--state-dir",
+            str(state_dir),
+            "--poll-interval",
+            "0.01",
+        )
+
+        jobs = ragie_sync.run_partition_jobs(
+            args=args,
+            partitions=ragie_sync.resolve_target_partitions(args),
+            docs_refs=ragie_sync.load_docs_refs(),
+            commit_sha="",
+            head_commit="abc123",
+            client_options=client_options(stub_server),
+        )
+
+        assert [job.partition for job in jobs] == ["shared_docs", "tenant_acme", "tenant_beta"]
+        assert all(job.error is None for job in jobs)
+        assert [len(job.result.plan.create_docs) for job in jobs] == [3, 1, 1]
+        assert sorted(path.name for path in state_dir.iterdir()) == [
+            "shared_docs.json",
+            "tenant_acme.json",
+            "tenant_beta.json",
+        ]
+        ports = {port for _, _, port, _ in stub_server.requests}
+        assert len(ports) <= 4
+
+    def test_async_io_sets_up_partitions_over_the_shared_client(self, tenants_repo, fake_ragie, monkeypatch, tmp_path):
+        args = self.parse(
+            monkeypatch,
+            "--all-partitions",
+            "--mode",
+            "full",
+            "--async-io",
+            "--ensure-partition-context-aware",
+            "--ensure-entity-instruction",
+            "--state-dir",
+            str(tmp_path / "state"),
+            "--poll-interval",
+            "0.01",
+        )
+
+        with ragie_sync.RagieClient(**client_options(fake_ragie, base_url=fake_ragie.base_url)) as client:
+            jobs = ragie_sync.run_partition_jobs(
+                args=args,
+                partitions=ragie_sync.resolve_target_partitions(args),
+                docs_refs=ragie_sync.load_docs_refs(),
+                commit_sha="",
+                head_commit="abc123",
+                client_options={},
+                client=client,
+            )
+            connections_opened = client._pool.connections_opened
+
+        assert all(job.error is None for job in jobs)
+        assert [job.created_instruction for job in jobs] == [True, True, True]
+        assert sorted(fake_ragie.state.partitions) == ["shared_docs", "tenant_acme", "tenant_beta"]
+        assert [len(job.result.plan.create_docs) for job in jobs] == [3, 1, 1]
+        assert connections_opened <= client.pool_size
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.02)
+
+
+class TestWatchMode:
+    def test_watcher_debounces_a_burst_into_one_change_set(self, tmp_path):
+        (tmp_path / "docs.json").write_text("{}", encoding="utf-8")
+        (tmp_path / "a.mdx").write_text("a", encoding="utf-8")
+        watcher = ragie_sync.DocsTreeWatcher(tmp_path, interval=0.01, debounce=0.15)
+
+        def burst():
+            for i in range(5):
+                (tmp_path / f"new-{i}.mdx").write_text("x", encoding="utf-8")
+                time.sleep(0.03)
+            (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+            (tmp_path / ".git").mkdir()
+            (tmp_path / ".git" / "ignored.mdx").write_text("ignored", encoding="utf-8")
+            (tmp_path / "docs.json").unlink()
+
+        writer = threading.Thread(target=burst)
+        writer.start()
+        changed, removed = watcher.wait()
+        writer.join()
+
+        assert changed == {f"new-{i}.mdx" for i in range(5)}
+        assert removed == {"docs.json"}
+        stop = threading.Event()
+        stop.set()
+        assert watcher.wait(stop) is None
+
+    def test_watch_resyncs_only_edited_and_removed_pages(self, docs_repo, fake_ragie, monkeypatch, tmp_path):
+        root, write, _ = docs_repo
+        monkeypatch.setenv("RAGIE_API_KEY", "dev")
+        monkeypatch.setattr(
+            sys,
+            "argv",
+            [
+                "ragie_sync.py",
+                "--partition",
+                "shared_docs",
+                "--watch",
+                "--watch-interval",
+                "0.02",
+                "--watch-debounce",
+                "0.05",
+                "--base-url",
+                fake_ragie.base_url,
+                "--state-dir",
+                str(tmp_path / "state"),
+                "--poll-interval",
+                "0.01",
+            ],
+        )
+        args = ragie_sync.parse_args()
+        docs = fake_ragie.state.documents
+
+        def data_of(ref):
+            return [doc["data"] for doc in docs.values() if doc["external_id"].endswith(f"ref:{ref}")]
+
+        stop = threading.Event()
+        outcome = []
+        watcher = threading.Thread(
+            target=lambda: outcome.append(
+                ragie_sync.watch_partitions(
+                    args,
+                    partitions=["shared_docs"],
+                    docs_refs=ragie_sync.load_docs_refs(),
+                    commit_sha="",
+                    cache=None,
+                    stop=stop,
+                )
+            )
+        )
+        watcher.start()
+        try:
+            wait_until(lambda: len(docs) == 3 and all(doc["status"] == "ready" for doc in docs.values()))
+            untouched_id = next(doc["id"] for doc in docs.values() if doc["external_id"].endswith("ref:guides/b"))
+            fake_ragie.state.request_log.clear()
+
+            write("guides/a.mdx", "---\ntitle: a\n---\nBody a, edited\n")
+            (root / "guides" / "c.mdx").unlink()
+            wait_until(lambda: not data_of("guides/c") and "edited" in "".join(data_of("guides/a")))
+        finally:
+            stop.set()
+            watcher.join(timeout=10)
+
+        assert outcome == [0]
+        assert ("GET", "/documents") not in fake_ragie.state.request_log
+        assert not [path for _, path in fake_ragie.state.request_log if untouched_id in path]
+        state = ragie_sync.load_sync_state(ragie_sync.sync_state_path(tmp_path / "state", "shared_docs"))
+        assert "last_synced_commit" not in state and state["last_sync_mode"] == "watch"
+
+    def test_watch_rejects_one_shot_options(self, monkeypatch):
+        monkeypatch.setenv("RAGIE_API_KEY", "dev")
+        argv = ["ragie_sync.py", "--partition", "shared_docs", "--watch", "--plan-out", "x.json"]
+        monkeypatch.setattr(sys, "argv", argv)
+        args = ragie_sync.parse_args()
+
+        with pytest.raises(ragie_sync.SyncError, match="--watch cannot be combined with --plan-out"):
+            ragie_sync.watch_partitions(args, partitions=["shared_docs"], docs_refs=[], commit_sha="", cache=None)
+
+
+class TestBuildLocalDocs:
+    def test_parallel_normalization_matches_serial(self):
+        refs = ragie_sync.load_docs_refs()
+        options = {
+            "refs": refs,
+            "partition": "shared_docs",
+            "docs_base_url": "https://docs.example.com",
+            "repo_name": "test",
+            "source": "test",
+            "commit_sha": "abc123",
+        }
+
+        serial = ragie_sync.build_local_docs(**options)
+        parallel = ragie_sync.build_local_docs(**options, jobs=2)
+
+        assert len(serial) > 100
+        assert parallel == serial
+
+
+class TestNormalizationCache:
+    def build(self, cache=None):
+        return ragie_sync.build_local_docs(
+            refs=ragie_sync.load_docs_refs(),
+            partition="shared_docs",
+            docs_base_url="https://docs.example.com",
+            repo_name="test",
+            source="test",
+            commit_sha="abc123",
+            cache=cache,
+        )
+
+    def test_cached_docs_match_fresh_normalization(self, docs_repo, tmp_path):
+        root, write, _ = docs_repo
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        assert self.build(cache) == self.build()
+        cache.save()
+
+        write("guides/a.mdx", "---\ntitle: a\n---\nBody a, edited\n")
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        docs = self.build(cache)
+
+        assert docs == self.build()
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    def test_version_change_discards_entries(self, docs_repo, tmp_path, monkeypatch):
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        self.build(cache)
+        cache.save()
+
+        monkeypatch.setattr(ragie_sync, "SYNC_SCRIPT_DIGEST", "test-next")
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        self.build(cache)
+
+        assert (cache.hits, cache.misses) == (0, 3)
+
+    def test_cached_entries_are_not_shared_with_callers(self, tmp_path):
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        doc = ragie_sync.normalize_doc_source("---\ntitle: a\ntags: [x]\n---\nBody\n", "guides/a")
+        cache.put("guides/a", b"raw", doc)
+        doc.frontmatter["tags"].append("from-put")
+
+        first = cache.get("guides/a", b"raw")
+        first.frontmatter["tags"].append("from-get")
+        first.taxonomy["doc_domain"] = "changed"
+
+        second = cache.peek(cache.key("guides/a", b"raw"))
+        assert second.frontmatter["tags"] == ["x"]
+        assert second.taxonomy["doc_domain"] != "changed"
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        for index in range(3):
+            ref = f"guides/{index}"
+            cache.put(ref, b"raw", ragie_sync.normalize_doc_source(f"Body {index}", ref))
+        cache.get("guides/0", b"raw")
+        cache.max_bytes = sum(entry["size"] for entry in cache._entries.values()) - 1
+        cache.save()
+
+        reloaded = ragie_sync.NormalizationCache(tmp_path / "cache", max_bytes=1 << 20)
+        assert cache.evicted == 1
+        assert reloaded.get("guides/1", b"raw") is None
+        assert reloaded.get("guides/0", b"raw") is not None
+
+
+def docs_page_refs():
+    refs = ragie_sync.load_docs_refs()
+    for slug in ragie_sync.discover_tenant_slugs():
+        refs.extend(ragie_sync.discover_tenant_refs(slug))
+    return sorted({ref for ref in refs if ragie_sync.resolve_ref_path(ref) is not None})
+
+
+class TestMDXTokenizer:
+    @pytest.mark.parametrize("ref", docs_page_refs())
+    def test_matches_regex_chain_on_every_page(self, ref):
+        raw = ragie_sync.resolve_ref_path(ref).read_text(encoding="utf-8", errors="ignore")
+
+        assert ragie_sync.normalize_doc_text(raw, ref) == ragie_sync._normalize_doc_text_regex(raw, ref)
+
+    def test_callouts_tags_and_statements(self):
+        raw = (
+            "---\ntitle: T\n---\n"
+            "import Foo from '/snippets/foo.mdx'\n\n"
+            "Intro <b>bold</b> {props.name} {/* hidden */}\n\n"
+            "<Tip title=\"x\">\n  Use <code>a</code>\n  <Info>nested</Info>\n</Tip>\n\n"
+            "```sql\nselect <b>1</b>\n```\n"
+        )
+
+        content, _ = ragie_sync.normalize_doc_text(raw, "fallback")
+
+        assert content == "# T\n\nIntro bold \n\nTip: Use a\n Info: nested\n\n```sql\nselect <b>1</b>\n```\n"
+
+    def test_unbalanced_markup_stays_linear(self):
+        raw = "<Info>x" * 20000 + "{/*" * 20000 + "<a" * 20000
+
+        started = time.perf_counter()
+        ragie_sync.normalize_doc_text(raw, "fallback")
+
+        assert time.perf_counter() - started < 2.0